@@ -27,6 +27,7 @@ from models import Base
 from auth import models as auth_models
 from rustfs import models as rustfs_models
 from knowledgebase import models as kb_models
+from llm_usage import models as llm_usage_models
 
 target_metadata = Base.metadata
 
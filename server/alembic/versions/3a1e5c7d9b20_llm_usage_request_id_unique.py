@@ -0,0 +1,38 @@
+"""llm_usage request_id unique
+
+Revision ID: 3a1e5c7d9b20
+Revises: 2d4c9d1f8a7b
+Create Date: 2026-02-06 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3a1e5c7d9b20"
+down_revision: Union[str, Sequence[str], None] = "2d4c9d1f8a7b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 清理历史重复记录 (同一次调用曾被记录两次)，保留最早一条
+    op.execute(
+        """
+        DELETE FROM llm_usage a
+        USING llm_usage b
+        WHERE a.request_id IS NOT NULL
+          AND a.request_id = b.request_id
+          AND a.ctid > b.ctid
+        """
+    )
+    op.create_index(op.f("ix_llm_usage_request_id"), "llm_usage", ["request_id"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_llm_usage_request_id"), table_name="llm_usage")
@@ -0,0 +1,63 @@
+"""llm_usage hourly rollup
+
+Revision ID: 5b7f2e8c4a61
+Revises: 3a1e5c7d9b20
+Create Date: 2026-02-08 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b7f2e8c4a61"
+down_revision: Union[str, Sequence[str], None] = "3a1e5c7d9b20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "llm_usage_hourly",
+        sa.Column("user_id", sa.UUID(), nullable=False, comment="用户ID"),
+        sa.Column("model_name", sa.String(length=100), nullable=False, comment="模型名称"),
+        sa.Column("bucket", sa.DateTime(timezone=True), nullable=False, comment="小时起点 (UTC)"),
+        sa.Column("request_count", sa.Integer(), nullable=False, comment="调用次数"),
+        sa.Column("prompt_tokens", sa.BigInteger(), nullable=False, comment="输入Token"),
+        sa.Column("completion_tokens", sa.BigInteger(), nullable=False, comment="输出Token"),
+        sa.Column("total_tokens", sa.BigInteger(), nullable=False, comment="总Token"),
+        sa.ForeignKeyConstraint(
+            ["user_id"], ["users.id"], name=op.f("fk_llm_usage_hourly_user_id_users"), ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("user_id", "model_name", "bucket", name=op.f("pk_llm_usage_hourly")),
+    )
+    # 回填历史明细
+    op.execute(
+        """
+        INSERT INTO llm_usage_hourly
+            (user_id, model_name, bucket, request_count, prompt_tokens, completion_tokens, total_tokens)
+        SELECT user_id,
+               model_name,
+               date_trunc('hour', created_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+               count(*),
+               coalesce(sum(prompt_tokens), 0),
+               coalesce(sum(completion_tokens), 0),
+               coalesce(sum(total_tokens), 0)
+        FROM llm_usage
+        GROUP BY 1, 2, 3
+        """
+    )
+
+    op.create_index("ix_llm_usage_user_id_created_at", "llm_usage", ["user_id", "created_at"], unique=False)
+    # 复合索引前缀已覆盖 user_id 过滤
+    op.drop_index(op.f("ix_llm_usage_user_id"), table_name="llm_usage")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f("ix_llm_usage_user_id"), "llm_usage", ["user_id"], unique=False)
+    op.drop_index("ix_llm_usage_user_id_created_at", table_name="llm_usage")
+    op.drop_table("llm_usage_hourly")
@@ -0,0 +1,40 @@
+"""keyset pagination indexes
+
+Revision ID: 7c3d9a1e5f42
+Revises: 5b7f2e8c4a61
+Create Date: 2026-02-10 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3d9a1e5f42"
+down_revision: Union[str, Sequence[str], None] = "5b7f2e8c4a61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_knowledge_bases_user_id_created_at_id",
+        "knowledge_bases",
+        ["user_id", "created_at", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_kb_documents_kb_id_created_at_id",
+        "kb_documents",
+        ["kb_id", "created_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_kb_documents_kb_id_created_at_id", table_name="kb_documents")
+    op.drop_index("ix_knowledge_bases_user_id_created_at_id", table_name="knowledge_bases")
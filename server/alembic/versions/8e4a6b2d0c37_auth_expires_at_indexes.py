@@ -0,0 +1,30 @@
+"""auth expires_at indexes
+
+Revision ID: 8e4a6b2d0c37
+Revises: 7c3d9a1e5f42
+Create Date: 2026-02-12 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8e4a6b2d0c37"
+down_revision: Union[str, Sequence[str], None] = "7c3d9a1e5f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f("ix_revoked_tokens_expires_at"), "revoked_tokens", ["expires_at"], unique=False)
+    op.create_index(op.f("ix_otp_codes_expires_at"), "otp_codes", ["expires_at"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_otp_codes_expires_at"), table_name="otp_codes")
+    op.drop_index(op.f("ix_revoked_tokens_expires_at"), table_name="revoked_tokens")
@@ -0,0 +1,45 @@
+"""kb content-hash dedup
+
+Revision ID: 9f1b3d5e7a24
+Revises: 8e4a6b2d0c37
+Create Date: 2026-02-14 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9f1b3d5e7a24"
+down_revision: Union[str, Sequence[str], None] = "8e4a6b2d0c37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "kb_blobs",
+        sa.Column("sha256", sa.String(length=64), nullable=False, comment="文件内容SHA-256"),
+        sa.Column("file_key", sa.String(length=500), nullable=False, comment="RustFS文件路径"),
+        sa.Column("file_size", sa.BigInteger(), nullable=False, comment="文件大小(字节)"),
+        sa.Column("ref_count", sa.Integer(), nullable=False, comment="引用文档数"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="创建时间"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="更新时间"),
+        sa.PrimaryKeyConstraint("sha256", name=op.f("pk_kb_blobs")),
+    )
+    # 已有文档不回填哈希 (需要重新下载计算)，仅新上传的文档参与去重
+    op.add_column(
+        "kb_documents",
+        sa.Column("content_hash", sa.String(length=64), nullable=True, comment="文件内容SHA-256"),
+    )
+    op.create_index(op.f("ix_kb_documents_content_hash"), "kb_documents", ["content_hash"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_kb_documents_content_hash"), table_name="kb_documents")
+    op.drop_column("kb_documents", "content_hash")
+    op.drop_table("kb_blobs")
@@ -0,0 +1,72 @@
+"""kb reembed jobs
+
+Revision ID: a4c6e8f0b213
+Revises: 9f1b3d5e7a24
+Create Date: 2026-03-02 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c6e8f0b213"
+down_revision: Union[str, Sequence[str], None] = "9f1b3d5e7a24"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 已有知识库都在共享集合中
+    op.add_column(
+        "knowledge_bases",
+        sa.Column(
+            "vector_collection",
+            sa.String(length=100),
+            server_default="axiom_kb_vectors",
+            nullable=False,
+            comment="PGVector集合名称",
+        ),
+    )
+    op.create_table(
+        "kb_reembed_jobs",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("kb_id", sa.UUID(), nullable=False, comment="所属知识库ID"),
+        sa.Column("source_model", sa.String(length=100), nullable=False, comment="原Embedding模型"),
+        sa.Column("source_collection", sa.String(length=100), nullable=False, comment="原PGVector集合"),
+        sa.Column("target_model", sa.String(length=100), nullable=False, comment="目标Embedding模型"),
+        sa.Column("target_collection", sa.String(length=100), nullable=False, comment="目标PGVector集合"),
+        sa.Column(
+            "status",
+            sa.Enum("PENDING", "RUNNING", "PAUSED", "COMPLETED", "FAILED", "CANCELLED", name="reembedstatus", native_enum=False),
+            nullable=False,
+            comment="任务状态",
+        ),
+        sa.Column("cursor", sa.String(length=64), nullable=True, comment="已处理的最后一个向量ID"),
+        sa.Column("processed", sa.Integer(), nullable=False, comment="已回填分块数"),
+        sa.Column("total", sa.Integer(), nullable=False, comment="开始时的分块总数"),
+        sa.Column("error_msg", sa.Text(), nullable=True, comment="错误信息"),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="创建时间"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False, comment="更新时间"),
+        sa.ForeignKeyConstraint(["kb_id"], ["knowledge_bases.id"], name=op.f("fk_kb_reembed_jobs_kb_id_knowledge_bases"), ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id", name=op.f("pk_kb_reembed_jobs")),
+    )
+    op.create_index(op.f("ix_kb_reembed_jobs_kb_id"), "kb_reembed_jobs", ["kb_id"], unique=False)
+    op.create_index(
+        "uq_kb_reembed_jobs_kb_id_active",
+        "kb_reembed_jobs",
+        ["kb_id"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('PENDING', 'RUNNING', 'PAUSED', 'FAILED')"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_kb_reembed_jobs_kb_id_active", table_name="kb_reembed_jobs")
+    op.drop_index(op.f("ix_kb_reembed_jobs_kb_id"), table_name="kb_reembed_jobs")
+    op.drop_table("kb_reembed_jobs")
+    op.drop_column("knowledge_bases", "vector_collection")
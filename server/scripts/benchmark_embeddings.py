@@ -0,0 +1,101 @@
+"""
+Embedding 运行时参数基准测试
+
+对 kb.embedding_profiles 中的每个参数组合测量吞吐 (docs/s)，
+并以参考参数 (默认 worker，非量化) 的检索结果为基准计算 recall@k，
+用于评估量化模型与线程/批大小设置对速度和召回的影响。
+
+执行命令:
+    cd server
+    uv run python scripts/benchmark_embeddings.py [--profiles api worker api-int8] [--corpus docs.txt] [--k 10]
+
+--corpus 为每行一段文本的文件，未指定时使用内置的合成语料；
+语料前 --queries 行同时作为查询。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import numpy as np
+
+from config import settings
+from knowledgebase.core.embedding import EmbeddingService
+
+
+TOPICS = ["发票报销", "年假申请", "服务器扩容", "数据库备份", "合同审批", "绩效考核", "差旅标准", "安全培训"]
+ACTIONS = ["流程说明", "常见问题", "注意事项", "负责人与联系方式", "时间节点", "所需材料"]
+
+
+def synthetic_corpus(size: int) -> list[str]:
+    texts = []
+    for i in range(size):
+        topic = TOPICS[i % len(TOPICS)]
+        action = ACTIONS[(i // len(TOPICS)) % len(ACTIONS)]
+        texts.append(f"{topic}的{action}（第 {i} 条）：请按照公司{topic}制度办理，{action}以最新通知为准。")
+    return texts
+
+
+def load_corpus(path: str | None, size: int) -> list[str]:
+    if not path:
+        return synthetic_corpus(size)
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()][:size]
+
+
+def normalize(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def top_k(docs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+
+
+def run_profile(name: str, texts: list[str], queries: list[str]) -> tuple[float, np.ndarray, np.ndarray]:
+    embeddings = EmbeddingService.get_embeddings(profile=name)
+    # 首次调用包含模型加载，不计入吞吐
+    embeddings.embed_documents(texts[:1])
+    started = time.perf_counter()
+    docs = normalize(embeddings.embed_documents(texts))
+    elapsed = time.perf_counter() - started
+    query_vectors = normalize([embeddings.embed_query(q) for q in queries])
+    return len(texts) / elapsed, docs, query_vectors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=list(settings.kb.embedding_profiles))
+    parser.add_argument("--reference", default=settings.kb.worker_embedding_profile)
+    parser.add_argument("--corpus")
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus, args.size)
+    queries = texts[:args.queries]
+    print(f"模型: {settings.kb.embedding_model}  语料: {len(texts)} 条  查询: {len(queries)} 条  k={args.k}")
+
+    _, ref_docs, ref_queries = run_profile(args.reference, texts, queries)
+    expected = top_k(ref_docs, ref_queries, args.k)
+
+    print(f"{'profile':<12}{'docs/s':>10}{'recall@k':>10}")
+    for name in args.profiles:
+        try:
+            rate, docs, query_vectors = run_profile(name, texts, queries)
+        except Exception as e:
+            print(f"{name:<12}失败: {e}")
+            continue
+        found = top_k(docs, query_vectors, args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, expected)])
+        print(f"{name:<12}{rate:>10.1f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+向量索引召回率 / 延迟基准测试
+
+从 langchain_pg_embedding 随机抽取已存储的向量作为查询，
+以全精度顺序扫描 (kb.vector_index = none) 的 top-k 为基准，
+对已建索引的每种模式测量 recall@k 与 p50/p95 延迟，并输出索引大小。
+
+执行命令:
+    cd server
+    uv run python scripts/benchmark_vector_index.py [--queries 200] [--k 20] [--rerank-factor 4]
+
+先用 scripts/migrate_vector_index.py 建好要对比的索引 (同一维度可同时存在 halfvec 与 binary 索引)。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import numpy as np
+from sqlalchemy import text
+
+from config import settings
+from knowledgebase.core import vector_index
+from knowledgebase.services.vector_store import VectorStoreService
+
+
+async def sample_queries(n: int) -> list[list[float]]:
+    store = VectorStoreService.get_vector_store()
+    async with store._make_async_session() as session:
+        rows = await session.execute(
+            text(
+                f"SELECT embedding::text FROM {vector_index.TABLE} "
+                f"WHERE vector_dims(embedding) = :dim ORDER BY random() LIMIT :n"
+            ),
+            {"dim": await model_dim(session), "n": n},
+        )
+        return [[float(v) for v in row[0].strip("[]").split(",")] for row in rows]
+
+
+async def model_dim(session) -> int:
+    return (await session.execute(text(f"SELECT vector_dims(embedding) FROM {vector_index.TABLE} LIMIT 1"))).scalar()
+
+
+async def existing_modes(dim: int) -> dict[str, str]:
+    store = VectorStoreService.get_vector_store()
+    async with store._make_async_session() as session:
+        modes = {}
+        for mode in vector_index.QUANTIZED_MODES:
+            size = (
+                await session.execute(
+                    text("SELECT pg_size_pretty(pg_relation_size(to_regclass(:name)))"),
+                    {"name": vector_index.index_name(mode, dim)},
+                )
+            ).scalar()
+            if size:
+                modes[mode] = size
+        return modes
+
+
+async def run_mode(mode: str, queries: list[list[float]], k: int) -> tuple[list[set], list[float]]:
+    settings.kb.vector_index = mode
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        docs, _, _ = await VectorStoreService.fetch_candidates(query, {}, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append({doc.id for doc in docs})
+    return results, latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--rerank-factor", type=int, default=settings.kb.rerank_factor)
+    parser.add_argument("--ef-search", type=int, default=settings.kb.hnsw_ef_search)
+    args = parser.parse_args()
+
+    settings.kb.rerank_factor = args.rerank_factor
+    settings.kb.hnsw_ef_search = args.ef_search
+    queries = await sample_queries(args.queries)
+    if not queries:
+        raise SystemExit(f"{vector_index.TABLE} is empty")
+    dim = len(queries[0])
+    modes = await existing_modes(dim)
+
+    expected, exact_latencies = await run_mode(vector_index.MODE_NONE, queries, args.k)
+    print(f"dim={dim} queries={len(queries)} k={args.k} rerank_factor={args.rerank_factor} ef_search={args.ef_search}")
+    print(f"{'mode':<10}{'index':>10}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    print(f"{'none':<10}{'-':>10}{1.0:>10.3f}{np.percentile(exact_latencies, 50):>10.1f}{np.percentile(exact_latencies, 95):>10.1f}")
+    for mode, size in modes.items():
+        found, latencies = await run_mode(mode, queries, args.k)
+        recall = np.mean([len(a & b) / max(len(b), 1) for a, b in zip(found, expected)])
+        print(f"{mode:<10}{size:>10}{recall:>10.3f}{np.percentile(latencies, 50):>10.1f}{np.percentile(latencies, 95):>10.1f}")
+    if not modes:
+        print("No quantized index found, run scripts/migrate_vector_index.py first")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+向量 ANN 索引迁移工具
+
+在 langchain_pg_embedding 上创建 halfvec / binary 量化 HNSW 索引 (CREATE INDEX CONCURRENTLY，不阻塞写入)，
+并删除同维度的其他模式索引；--mode none 删除全部量化索引回到顺序扫描。
+索引建成后再把 kb.vector_index 改为对应模式，切换前后查询都可用。
+
+执行命令:
+    cd server
+    uv run python scripts/migrate_vector_index.py --mode halfvec [--dim 512] [--m 16] [--ef-construction 64]
+"""
+
+import argparse
+import os
+import sys
+
+# 添加 src 目录到 Python 路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from sqlalchemy import create_engine, text
+
+from knowledgebase.core import vector_index
+from knowledgebase.services.vector_store import get_kb_connection_string
+
+
+MIN_PGVECTOR = (0, 7)
+
+
+def pgvector_version(conn) -> tuple:
+    version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    if version is None:
+        raise SystemExit("pgvector extension is not installed in axiom_kb")
+    return tuple(int(part) for part in version.split(".")[:2])
+
+
+def detect_dims(conn) -> list[int]:
+    rows = conn.execute(text(f"SELECT DISTINCT vector_dims(embedding) FROM {vector_index.TABLE}")).scalars()
+    return sorted(rows)
+
+
+def index_size(conn, name: str) -> str:
+    size = conn.execute(
+        text("SELECT pg_size_pretty(pg_relation_size(to_regclass(:name)))"), {"name": name}
+    ).scalar()
+    return size or "-"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", required=True, choices=[vector_index.MODE_NONE, *vector_index.QUANTIZED_MODES])
+    parser.add_argument("--dim", type=int, action="append", help="向量维度，可重复；默认表中已有的全部维度")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="建索引时的 maintenance_work_mem")
+    args = parser.parse_args()
+
+    # CREATE/DROP INDEX CONCURRENTLY 不能在事务中执行
+    engine = create_engine(get_kb_connection_string(), isolation_level="AUTOCOMMIT")
+    with engine.connect() as conn:
+        if args.mode != vector_index.MODE_NONE and pgvector_version(conn) < MIN_PGVECTOR:
+            raise SystemExit("halfvec / binary_quantize require pgvector >= 0.7")
+        dims = args.dim or detect_dims(conn)
+        if not dims:
+            raise SystemExit(f"{vector_index.TABLE} is empty, pass --dim explicitly")
+
+        conn.execute(text(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'"))
+        for dim in dims:
+            if args.mode != vector_index.MODE_NONE:
+                name = vector_index.index_name(args.mode, dim)
+                print(f"Creating {name} ...")
+                conn.execute(text(vector_index.create_index_sql(args.mode, dim, args.m, args.ef_construction)))
+                print(f"  - {name}: {index_size(conn, name)}")
+            for mode in vector_index.QUANTIZED_MODES:
+                if mode != args.mode:
+                    print(f"Dropping {vector_index.index_name(mode, dim)} (if exists)")
+                    conn.execute(text(vector_index.drop_index_sql(mode, dim)))
+
+        table_size = conn.execute(
+            text(f"SELECT pg_size_pretty(pg_total_relation_size('{vector_index.TABLE}'))")
+        ).scalar()
+    print(f"\nDone. {vector_index.TABLE} total size: {table_size}")
+    print(f"Set kb.vector_index = \"{args.mode}\" in src/config.py to use it.")
+
+
+if __name__ == "__main__":
+    main()
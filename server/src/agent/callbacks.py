@@ -0,0 +1,96 @@
+"""
+Agent 回调处理器
+
+通过 LangChain 回调在模型调用结束时采集 usage，
+替代在事件流中逐个扫描 on_chat_model_end 事件
+"""
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from llm_usage.service import record_usage
+from services.logging_service import logger
+
+
+def _usage_to_dict(raw_usage: Any) -> dict | None:
+    """CompletionUsage 等对象转换为字典"""
+    if raw_usage is None:
+        return None
+    if isinstance(raw_usage, dict):
+        return raw_usage
+    if hasattr(raw_usage, "model_dump"):
+        return raw_usage.model_dump()
+    return {
+        "prompt_tokens": getattr(raw_usage, "prompt_tokens", 0),
+        "completion_tokens": getattr(raw_usage, "completion_tokens", 0),
+        "total_tokens": getattr(raw_usage, "total_tokens", 0),
+    }
+
+
+def extract_usage(response: LLMResult) -> dict | None:
+    """从 LLMResult 中提取 usage (流式时位于消息 response_metadata)"""
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            metadata = getattr(message, "response_metadata", None) or {}
+            raw_usage = metadata.get("usage") or metadata.get("token_usage")
+            if raw_usage is None and generation.generation_info:
+                raw_usage = generation.generation_info.get("usage")
+            if raw_usage is not None:
+                return _usage_to_dict(raw_usage)
+
+    llm_output = response.llm_output or {}
+    return _usage_to_dict(llm_output.get("token_usage"))
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    """在每次 Chat Model 调用结束时记录 LLM 用量"""
+
+    def __init__(self, user_id: str, default_model: str = "deepseek-chat"):
+        self.user_id = user_id
+        self.default_model = default_model
+        self._models: Dict[UUID, str] = {}
+
+    async def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        model_name = (metadata or {}).get("ls_model_name")
+        if model_name:
+            self._models[run_id] = model_name
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._models.pop(run_id, None)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        model_name = self._models.pop(run_id, self.default_model)
+        if not self.user_id:
+            return
+
+        try:
+            usage = extract_usage(response)
+        except Exception as exc:
+            logger.warning(f"UsageCallbackHandler: extract usage failed: {exc}")
+            return
+
+        if not usage:
+            logger.debug(f"UsageCallbackHandler: no usage for run {run_id}")
+            return
+
+        try:
+            # run_id 作为 request_id，保证同一次调用只记录一次
+            await record_usage(
+                user_id=self.user_id,
+                model_name=model_name,
+                usage=usage,
+                request_id=str(run_id),
+            )
+        except Exception as exc:
+            logger.warning(f"Failed to record LLM usage: {exc}")
@@ -0,0 +1,18 @@
+"""
+Agent 模块常量
+"""
+
+# 前端消费的事件类型，其余事件在服务端直接丢弃
+STREAM_EVENT_KINDS = frozenset({"on_chat_model_stream", "on_tool_start", "on_tool_end", "on_custom_event"})
+
+# astream_events 只订阅的 Runnable 类型
+STREAM_INCLUDE_TYPES = ["chat_model", "tool"]
+
+# SQL 查询结果表格帧 (自定义事件名)
+SQL_TABLE_EVENT = "sql_table"
+
+# astream_events 额外订阅的自定义事件 (由图节点派发，不属于上述 Runnable 类型)
+STREAM_INCLUDE_NAMES = [SQL_TABLE_EVENT]
+
+# 带此标签的 LLM 调用 (如检索改写) 不向前端流式输出
+NOSTREAM_TAG = "nostream"
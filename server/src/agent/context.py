@@ -0,0 +1,207 @@
+"""
+RAG 上下文打包模块
+
+按 Token 预算将检索片段打包为 Prompt 上下文：
+1. 同一 doc_id / page 下的重叠片段去重，相邻片段合并
+2. 按相关度分数贪心填充 Token 预算
+3. 超长片段在句子边界截断，避免截断在句子中间
+"""
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from langchain_core.documents import Document
+
+
+# 句子边界（中英文）
+SENTENCE_DELIMITERS = ("\n", "。", "！", "？", "；", ". ", "! ", "? ")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 Token 数 (无法使用模型分词器时的兜底)
+
+    CJK 字符按 1 Token 计，其余字符按 4 字符 1 Token 计
+    """
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _overlap_length(left: str, right: str, min_overlap: int) -> int:
+    """返回 left 后缀与 right 前缀的最长重叠长度，不足 min_overlap 时返回 0"""
+    if min(len(left), len(right)) < min_overlap:
+        return 0
+
+    probe = right[:min_overlap]
+    start = max(0, len(left) - len(right))
+    pos = left.find(probe, start)
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+@dataclass
+class ContextBlock:
+    """打包后的上下文片段"""
+    text: str
+    score: float
+    metadata: dict = field(default_factory=dict)
+    start: Optional[int] = None
+    tokens: int = 0
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+
+class ContextPacker:
+    """
+    Token 感知的上下文打包器
+
+    Args:
+        token_counter: Token 计数函数，通常使用目标模型的分词器
+        token_budget: 上下文 Token 预算
+        min_overlap: 判定两个片段文本重叠的最小字符数
+    """
+
+    def __init__(
+        self,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        token_budget: int = 3000,
+        min_overlap: int = 20,
+    ):
+        self.token_counter = token_counter
+        self.token_budget = token_budget
+        self.min_overlap = min_overlap
+
+    @staticmethod
+    def _group_key(doc: Document) -> tuple:
+        metadata = doc.metadata or {}
+        return metadata.get("doc_id"), metadata.get("page")
+
+    @staticmethod
+    def _score(doc: Document, rank: int) -> float:
+        """优先使用检索分数，缺失时按检索排名递减"""
+        score = (doc.metadata or {}).get("score")
+        if isinstance(score, (int, float)):
+            return float(score)
+        return 1.0 / (rank + 1)
+
+    def _try_merge(self, a: ContextBlock, b: ContextBlock) -> Optional[ContextBlock]:
+        """尝试合并两个同组片段，无法合并时返回 None"""
+        score = max(a.score, b.score)
+
+        # 有 start_index 时按区间判断重叠或相邻
+        if a.start is not None and b.start is not None:
+            first, second = (a, b) if a.start <= b.start else (b, a)
+            if second.start > first.end:
+                return None
+            tail = second.text[first.end - second.start:] if second.end > first.end else ""
+            return ContextBlock(
+                text=first.text + tail,
+                score=score,
+                metadata=first.metadata,
+                start=first.start,
+            )
+
+        # 否则按文本包含 / 首尾重叠判断
+        if b.text in a.text:
+            return ContextBlock(text=a.text, score=score, metadata=a.metadata, start=a.start)
+        if a.text in b.text:
+            return ContextBlock(text=b.text, score=score, metadata=b.metadata, start=b.start)
+
+        overlap = _overlap_length(a.text, b.text, self.min_overlap)
+        if overlap:
+            return ContextBlock(text=a.text + b.text[overlap:], score=score, metadata=a.metadata)
+        overlap = _overlap_length(b.text, a.text, self.min_overlap)
+        if overlap:
+            return ContextBlock(text=b.text + a.text[overlap:], score=score, metadata=b.metadata)
+        return None
+
+    def _merge_group(self, blocks: List[ContextBlock]) -> List[ContextBlock]:
+        merged = list(blocks)
+        changed = True
+        while changed:
+            changed = False
+            for i in range(len(merged)):
+                for j in range(i + 1, len(merged)):
+                    combined = self._try_merge(merged[i], merged[j])
+                    if combined is not None:
+                        merged[i] = combined
+                        del merged[j]
+                        changed = True
+                        break
+                if changed:
+                    break
+        return merged
+
+    def _truncate(self, block: ContextBlock, budget: int) -> Optional[ContextBlock]:
+        """在句子边界截断片段以适配剩余预算"""
+        text = block.text
+        while text:
+            cut = max(text.rfind(d, 0, len(text) - 1) for d in SENTENCE_DELIMITERS)
+            if cut <= 0:
+                return None
+            text = text[:cut + 1].rstrip()
+            tokens = self.token_counter(text)
+            if tokens <= budget:
+                return ContextBlock(
+                    text=text,
+                    score=block.score,
+                    metadata=block.metadata,
+                    start=block.start,
+                    tokens=tokens,
+                )
+        return None
+
+    def pack(self, documents: List[Document]) -> List[ContextBlock]:
+        """
+        打包检索结果
+
+        Args:
+            documents: 检索返回的文档列表 (按相关度排序)
+
+        Returns:
+            在 Token 预算内、按相关度排序的上下文片段
+        """
+        groups: dict[tuple, List[ContextBlock]] = {}
+        for rank, doc in enumerate(documents):
+            text = (doc.page_content or "").strip()
+            if not text:
+                continue
+            metadata = doc.metadata or {}
+            start = metadata.get("start_index")
+            groups.setdefault(self._group_key(doc), []).append(
+                ContextBlock(
+                    text=text,
+                    score=self._score(doc, rank),
+                    metadata=metadata,
+                    start=start if isinstance(start, int) else None,
+                )
+            )
+
+        candidates: List[ContextBlock] = []
+        for key, blocks in groups.items():
+            # 缺少 doc_id 的片段无法确认来源，不做合并
+            if key[0] is None:
+                candidates.extend(blocks)
+            else:
+                candidates.extend(self._merge_group(blocks))
+
+        candidates.sort(key=lambda b: b.score, reverse=True)
+
+        packed: List[ContextBlock] = []
+        remaining = self.token_budget
+        for block in candidates:
+            block.tokens = self.token_counter(block.text)
+            if block.tokens <= remaining:
+                packed.append(block)
+                remaining -= block.tokens
+            elif not packed:
+                # 最相关的片段单独超出预算时，截断到句子边界
+                truncated = self._truncate(block, remaining)
+                if truncated is not None:
+                    packed.append(truncated)
+                    remaining -= truncated.tokens
+        return packed
@@ -3,6 +3,9 @@ from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.store.postgres import PostgresStore
 from psycopg_pool import AsyncConnectionPool
 from config import settings
+from connection_budget import connection_budget, psycopg_probe
+from database import get_psycopg_pool_kwargs
+from .sql import sql_executor
 
 # 全局实例
 checkpointer: Optional[AsyncPostgresSaver] = None
@@ -48,8 +51,15 @@ async def init_agent_dependencies():
     # 让我们先尝试分别为它们创建合适的连接池。
     
     # 1. Checkpointer (Async)
-    _pool = AsyncConnectionPool(conninfo=db_uri, max_size=20, open=False, kwargs={"autocommit": True})
+    _pool = AsyncConnectionPool(
+        conninfo=db_uri,
+        min_size=1,
+        max_size=connection_budget.limit("agent"),
+        open=False,
+        kwargs=get_psycopg_pool_kwargs(),
+    )
     await _pool.open()
+    connection_budget.register("agent", psycopg_probe(_pool))
     checkpointer = AsyncPostgresSaver(_pool)
     await checkpointer.setup()
     
@@ -67,8 +77,15 @@ async def init_agent_dependencies():
     # 为了解决这个问题，我们为 Store 创建一个同步池。
     from psycopg_pool import ConnectionPool
     global _sync_pool
-    _sync_pool = ConnectionPool(conninfo=db_uri, max_size=20, open=False, kwargs={"autocommit": True})
+    _sync_pool = ConnectionPool(
+        conninfo=db_uri,
+        min_size=1,
+        max_size=connection_budget.limit("agent_store"),
+        open=False,
+        kwargs=get_psycopg_pool_kwargs(),
+    )
     _sync_pool.open()
+    connection_budget.register("agent_store", psycopg_probe(_sync_pool))
     store = PostgresStore(_sync_pool)
     store.setup()
     
@@ -81,6 +98,7 @@ async def close_agent_dependencies():
         await _pool.close()
     if _sync_pool:
         _sync_pool.close()
+    await sql_executor.close()
 
 def get_checkpointer() -> AsyncPostgresSaver:
     if checkpointer is None:
@@ -0,0 +1,7 @@
+"""
+Agent 模块异常
+"""
+
+
+class SQLValidationError(ValueError):
+    """生成的 SQL 未通过安全校验 (错误信息会回传给 LLM 重新生成)"""
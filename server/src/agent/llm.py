@@ -105,56 +105,59 @@ class DeepSeekChat(ChatOpenAI):
         payload["stream"] = True
         
         response = await self.async_client.create(**payload)
-        
-        async for chunk in response:
-            if not chunk.choices:
-                continue
+
+        try:
+            async for chunk in response:
+                if not chunk.choices:
+                    continue
                 
-            delta = chunk.choices[0].delta
+                delta = chunk.choices[0].delta
             
-            # 构建 additional_kwargs，包含 reasoning_content
-            additional_kwargs = {}
-            if hasattr(delta, "reasoning_content") and delta.reasoning_content:
-                additional_kwargs["reasoning_content"] = delta.reasoning_content
-            if hasattr(delta, "tool_calls") and delta.tool_calls:
-                additional_kwargs["tool_calls"] = [
-                    {
-                        "index": tc.index,
-                        "id": tc.id,
-                        "function": {
-                            "name": tc.function.name if tc.function else None,
-                            "arguments": tc.function.arguments if tc.function else None,
-                        },
-                        "type": tc.type,
-                    }
-                    for tc in delta.tool_calls
-                ]
+                # 构建 additional_kwargs，包含 reasoning_content
+                additional_kwargs = {}
+                if hasattr(delta, "reasoning_content") and delta.reasoning_content:
+                    additional_kwargs["reasoning_content"] = delta.reasoning_content
+                if hasattr(delta, "tool_calls") and delta.tool_calls:
+                    additional_kwargs["tool_calls"] = [
+                        {
+                            "index": tc.index,
+                            "id": tc.id,
+                            "function": {
+                                "name": tc.function.name if tc.function else None,
+                                "arguments": tc.function.arguments if tc.function else None,
+                            },
+                            "type": tc.type,
+                        }
+                        for tc in delta.tool_calls
+                    ]
             
-            # 创建 AIMessageChunk
-            message_chunk = AIMessageChunk(
-                content=delta.content or "",
-                additional_kwargs=additional_kwargs,
-            )
-
-            # 创建 ChatGenerationChunk
-            # 保留usage信息以供LLM usage记录使用
-            generation_info = {}
-            if chunk.choices[0].finish_reason:
-                generation_info["finish_reason"] = chunk.choices[0].finish_reason
-            if hasattr(chunk, 'usage') and chunk.usage:
-                generation_info["usage"] = chunk.usage
+                # 创建 AIMessageChunk
+                message_chunk = AIMessageChunk(
+                    content=delta.content or "",
+                    additional_kwargs=additional_kwargs,
+                )
 
-            gen_chunk = ChatGenerationChunk(
-                message=message_chunk,
-                generation_info=generation_info if generation_info else None,
-            )
+                # 创建 ChatGenerationChunk
+                # 保留usage信息以供LLM usage记录使用
+                generation_info = {}
+                if chunk.choices[0].finish_reason:
+                    generation_info["finish_reason"] = chunk.choices[0].finish_reason
+                if hasattr(chunk, 'usage') and chunk.usage:
+                    generation_info["usage"] = chunk.usage
 
-            if run_manager:
-                await run_manager.on_llm_new_token(
-                    gen_chunk.text,
-                    chunk=gen_chunk,
+                gen_chunk = ChatGenerationChunk(
+                    message=message_chunk,
+                    generation_info=generation_info if generation_info else None,
                 )
 
-            yield gen_chunk
+                if run_manager:
+                    await run_manager.on_llm_new_token(
+                        gen_chunk.text,
+                        chunk=gen_chunk,
+                    )
 
+                yield gen_chunk
+        finally:
+            # 下游取消 (如客户端断开) 时关闭上游 HTTP 流，终止 DeepSeek 生成
+            await response.close()
 
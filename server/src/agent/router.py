@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from functools import lru_cache
 from typing import Annotated
 
 from auth.dependencies import get_current_active_user
 from auth.models import User
+from config import settings
 from .schemas import AgentRequest
 from .service import AgentService
 
@@ -28,6 +29,7 @@ async def chat_endpoint(
 @router.post("/chat/stream")
 async def chat_stream_endpoint(
     request: AgentRequest,
+    http_request: Request,
     current_user: Annotated[User, Depends(get_current_active_user)],
     service: AgentService = Depends(get_agent_service),
 ):
@@ -42,7 +44,47 @@ async def chat_stream_endpoint(
     
     # 传递 user_id 到 service (通过 metadata)
     return StreamingResponse(
-        service.chat_stream(request.query, request.chat_history, session_id, user_id=user_id, kb_id=request.kb_id),
+        service.chat_stream(
+            request.query,
+            request.chat_history,
+            session_id,
+            user_id=user_id,
+            kb_id=request.kb_id,
+            debug=request.debug,
+            is_disconnected=http_request.is_disconnected,
+        ),
+        media_type="text/event-stream",
+        headers={"X-Vercel-AI-Data-Stream": "v1"}
+    )
+
+@router.post("/chat/stream/debug")
+async def chat_stream_debug_endpoint(
+    request: AgentRequest,
+    http_request: Request,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    service: AgentService = Depends(get_agent_service),
+):
+    """
+    SSE 调试接口 (webtest 使用)
+
+    在协议帧之外附带 e: 原始事件帧
+    """
+    if not settings.agent.sse_debug_allowed:
+        raise HTTPException(status_code=403, detail="SSE debug channel disabled")
+
+    session_id = request.session_id or "default-session"
+    user_id = str(current_user.id)
+
+    return StreamingResponse(
+        service.chat_stream(
+            request.query,
+            request.chat_history,
+            session_id,
+            user_id=user_id,
+            kb_id=request.kb_id,
+            debug=True,
+            is_disconnected=http_request.is_disconnected,
+        ),
         media_type="text/event-stream",
         headers={"X-Vercel-AI-Data-Stream": "v1"}
     )
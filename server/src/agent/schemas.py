@@ -12,3 +12,4 @@ class AgentRequest(BaseModel):
     session_id: Optional[str] = None
     kb_id: Optional[str] = None
     chat_history: List[ChatMessage] = []
+    debug: bool = False  # 是否输出 e: 调试帧
@@ -6,17 +6,20 @@ Agent Service - Agent 服务层
 - 然后调用对应子 Agent
 - 确保 store 和 checkpointer 正确传递
 """
-from typing import List, AsyncGenerator
+from typing import List, AsyncGenerator, Awaitable, Callable, Optional
 
 from langchain_core.messages import HumanMessage, AIMessage
 
-from .utils import convert_to_vercel_sse
+from .utils import should_emit_debug
+from .stream import SSEStreamWriter
+from .callbacks import UsageCallbackHandler
+from .constants import NOSTREAM_TAG, STREAM_EVENT_KINDS, STREAM_INCLUDE_NAMES, STREAM_INCLUDE_TYPES
 from .schemas import ChatMessage
 from .dependencies import get_checkpointer, get_store
 from .subagents import QAAgent, RAGAgent, SQLAgent
 from .router_graph import route_by_llm
+from config import settings
 from services.logging_service import logger
-from llm_usage.service import record_usage
 
 
 class AgentService:
@@ -40,13 +43,17 @@ class AgentService:
 
         self._qa_agent = QAAgent()
         self._rag_agent = RAGAgent()
-        self._sql_agent = SQLAgent()
 
         self._apps = {
             "qa": self._qa_agent.compile(checkpointer=checkpointer, store=store),
             "rag": self._rag_agent.compile(checkpointer=checkpointer, store=store),
-            "sql": self._sql_agent.compile(checkpointer=checkpointer, store=store),
         }
+        # 未配置可查询的表时不启用 SQL Agent，sql 路由回退到 qa
+        if settings.sql_agent.allowed_tables:
+            self._sql_agent = SQLAgent()
+            self._apps["sql"] = self._sql_agent.compile(checkpointer=checkpointer, store=store)
+        else:
+            logger.info("AgentService: SQL agent disabled (sql_agent.allowed_tables is empty)")
 
         logger.info("AgentService: SubAgents initialized successfully")
 
@@ -86,6 +93,7 @@ class AgentService:
         config = {
             "configurable": {"thread_id": session_id},
             "metadata": {"user_id": session_id, "kb_id": kb_id},
+            "callbacks": [UsageCallbackHandler(user_id=session_id)],
         }
 
         result = await app.ainvoke({"messages": input_messages}, config=config)
@@ -98,7 +106,10 @@ class AgentService:
         session_id: str,
         user_id: str = "default_user",
         kb_id: str | None = None,
+        debug: bool = False,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
     ) -> AsyncGenerator[str, None]:
+        emit_debug = should_emit_debug(debug)
         route = await self._decide_route(query=query, history=history, user_id=user_id)
         app = self._get_app(route)
 
@@ -106,69 +117,39 @@ class AgentService:
         config = {
             "configurable": {"thread_id": session_id},
             "metadata": {"user_id": user_id, "kb_id": kb_id},
+            "callbacks": [UsageCallbackHandler(user_id=user_id)],
         }
 
-        # 用于收集最终的usage信息
-        final_usage = None
-        final_model_name = None
+        events = self._iter_events(app, input_messages, config, full=emit_debug)
+        writer = SSEStreamWriter(is_disconnected=is_disconnected, debug=emit_debug)
+        async for chunk in writer.stream(events):
+            yield chunk
+
+    async def _iter_events(
+        self,
+        app,
+        input_messages: list,
+        config: dict,
+        full: bool = False,
+    ) -> AsyncGenerator[dict, None]:
+        """
+        遍历 Agent 事件流
+
+        只订阅 chat_model / tool 类型的 Runnable，并丢弃前端不消费的事件，
+        usage 由 UsageCallbackHandler 采集。full=True (调试通道) 时透传全部事件。
+        """
+        if full:
+            async for event in app.astream_events({"messages": input_messages}, config=config, version="v2"):
+                yield event
+            return
 
         async for event in app.astream_events(
             {"messages": input_messages},
             config=config,
             version="v2",
+            include_types=STREAM_INCLUDE_TYPES,
+            include_names=STREAM_INCLUDE_NAMES,
+            exclude_tags=[NOSTREAM_TAG],
         ):
-            try:
-                event_name = event.get('event')
-                logger.debug(f"Agent event: {event_name} name={event.get('name')}")
-
-                # 监听模型输出结束事件，记录usage
-                if event_name == "on_chat_model_end":
-                    event_data = event.get('data', {})
-                    output = event_data.get('output')
-
-                    # 提取usage信息
-                    final_usage = None
-                    final_model_name = 'deepseek-chat'
-
-                    if output and hasattr(output, 'response_metadata') and output.response_metadata:
-                        raw_usage = output.response_metadata.get('usage')
-
-                        if raw_usage:
-                            # CompletionUsage对象需要转换为字典
-                            logger.info(f"Found raw usage: {raw_usage}")
-                            try:
-                                # 转换CompletionUsage为简单字典
-                                if hasattr(raw_usage, 'model_dump'):
-                                    final_usage = raw_usage.model_dump()
-                                else:
-                                    # 手动提取字段
-                                    final_usage = {
-                                        "prompt_tokens": getattr(raw_usage, 'prompt_tokens', 0),
-                                        "completion_tokens": getattr(raw_usage, 'completion_tokens', 0),
-                                        "total_tokens": getattr(raw_usage, 'total_tokens', 0),
-                                    }
-                                logger.info(f"Converted usage to dict: {final_usage}")
-                            except Exception as e:
-                                logger.warning(f"Failed to convert usage to dict: {e}")
-                    else:
-                        logger.warning("No response_metadata found on AIMessage")
-
-                    # 记录到数据库
-                    if final_usage and user_id:
-                        try:
-                            logger.info(f"Recording LLM usage for user_id={user_id}, model={final_model_name}")
-                            await record_usage(
-                                user_id=user_id,
-                                model_name=final_model_name,
-                                usage=final_usage,
-                            )
-                            logger.info("✓ LLM usage record saved successfully")
-                        except Exception as exc:
-                            logger.warning(f"Failed to record LLM usage: {exc}")
-
-            except Exception as exc:
-                logger.warning(f"log agent event failed: {exc}")
-
-            chunk = convert_to_vercel_sse(event)
-            if chunk:
-                yield chunk
+            if event.get("event") in STREAM_EVENT_KINDS:
+                yield event
@@ -0,0 +1,20 @@
+"""
+SQL Agent 基础组件
+
+- guard: 基于 sqlglot 的只读查询校验
+- executor: 只读连接池与分批执行
+- schema: 表结构知识层 (表/列/外键/示例值的向量索引)
+"""
+from .executor import SQLExecutor, sql_executor
+from .guard import SQLGuard
+from .schema import SchemaCache, SchemaSnapshot, TableInfo, schema_cache
+
+__all__ = [
+    "SQLExecutor",
+    "SQLGuard",
+    "SchemaCache",
+    "SchemaSnapshot",
+    "TableInfo",
+    "schema_cache",
+    "sql_executor",
+]
@@ -0,0 +1,113 @@
+"""
+SQL 查询执行
+
+独立的 asyncpg 连接池，所有会话默认只读并设置语句超时，查询在只读事务中执行。
+结果通过服务端游标分批读取，调用方可以边读边推送，不必等待完整结果。
+
+执行计划缓存: asyncpg 按 SQL 文本在每个连接上缓存预编译语句 (statement_cache_size)，
+SQLGuard 输出的规范化 SQL 保证相同查询命中同一预编译语句，无参数语句在
+PostgreSQL 中复用首次生成的计划，重复报表不再重新解析与规划。
+
+经 PgBouncer 事务池连接时 (db.pgbouncer)，只读与语句超时不能作为会话启动参数，
+改为在每个只读事务开始时 SET LOCAL。
+"""
+import asyncio
+from typing import Any, AsyncIterator, List, Optional
+
+import asyncpg
+
+from config import settings
+from connection_budget import asyncpg_probe, connection_budget
+from database import asyncpg_statement_args
+from services.logging_service import logger
+
+
+def get_sql_agent_dsn() -> str:
+    """asyncpg 不识别 SQLAlchemy 的驱动后缀"""
+    return settings.sql_agent.uri.replace("+asyncpg", "")
+
+
+class SQLExecutor:
+    """只读查询执行器 (懒加载连接池)"""
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn or get_sql_agent_dsn()
+        self._pool: Optional[asyncpg.Pool] = None
+        self._lock = asyncio.Lock()
+
+    async def get_pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    conf = settings.sql_agent
+                    max_size = connection_budget.limit("sql_agent", conf.pool_max_size)
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=min(conf.pool_min_size, max_size),
+                        max_size=max_size,
+                        server_settings=self._server_settings(),
+                        **asyncpg_statement_args(conf.plan_cache_size),
+                    )
+                    connection_budget.register("sql_agent", asyncpg_probe(self._pool))
+                    logger.info(f"SQLExecutor: pool created (max_size={max_size})")
+        return self._pool
+
+    @staticmethod
+    def _server_settings() -> dict[str, str]:
+        if settings.db.pgbouncer:
+            # PgBouncer 只转发其跟踪的启动参数
+            return {"application_name": "axiom-sql-agent"}
+        return {
+            "default_transaction_read_only": "on",
+            "statement_timeout": str(settings.sql_agent.statement_timeout_ms),
+            "application_name": "axiom-sql-agent",
+        }
+
+    @staticmethod
+    async def _begin(conn: asyncpg.Connection) -> None:
+        """事务级设置 (事务池模式下替代会话参数)"""
+        if settings.db.pgbouncer:
+            await conn.execute(f"SET LOCAL statement_timeout = {int(settings.sql_agent.statement_timeout_ms)}")
+
+    async def fetch(self, sql: str, *args: Any) -> List[asyncpg.Record]:
+        """执行内部元数据查询 (如 information_schema)"""
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                await self._begin(conn)
+                return await conn.fetch(sql, *args)
+
+    async def stream(self, sql: str, batch_rows: Optional[int] = None) -> AsyncIterator[tuple[List[str], List[list]]]:
+        """
+        分批执行查询
+
+        Args:
+            sql: 已通过 SQLGuard 校验的 SQL
+            batch_rows: 每批行数
+
+        Yields:
+            (列名, 本批行)，最后一批可能为空
+        """
+        batch_rows = batch_rows or settings.sql_agent.stream_batch_rows
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                await self._begin(conn)
+                columns: List[str] = []
+                batch: List[list] = []
+                async for record in conn.cursor(sql, prefetch=batch_rows):
+                    if not columns:
+                        columns = list(record.keys())
+                    batch.append(list(record.values()))
+                    if len(batch) >= batch_rows:
+                        yield columns, batch
+                        batch = []
+                yield columns, batch
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+sql_executor = SQLExecutor()
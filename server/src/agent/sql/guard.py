@@ -0,0 +1,267 @@
+"""
+SQL 安全校验
+
+使用 sqlglot 解析 LLM 生成的 SQL，只放行单条只读查询:
+1. 仅允许 SELECT / UNION / WITH ... SELECT，拒绝任何写入、DDL、加锁和 SELECT INTO
+2. 只能访问表结构快照中的表 (已按白名单/黑名单过滤)
+3. 只允许白名单中的标量、聚合与窗口函数
+4. 自动追加或收紧 LIMIT
+
+输出统一格式化后的 SQL，相同查询得到相同文本，便于连接上的预编译语句 (执行计划) 复用。
+"""
+from collections import OrderedDict
+from typing import Iterable
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+from ..exceptions import SQLValidationError
+
+
+DIALECT = "postgres"
+
+_FORBIDDEN_NODES = (
+    exp.Insert,
+    exp.Update,
+    exp.Delete,
+    exp.Merge,
+    exp.Create,
+    exp.Drop,
+    exp.Alter,
+    exp.Copy,
+    exp.Command,
+    exp.Set,
+    exp.Into,
+    exp.Lock,
+)
+
+# 函数白名单: sqlglot 识别的函数/运算符按表达式类型放行，其余 (Anonymous) 按函数名放行；
+# 不在白名单中的函数一律拒绝 (如 *_to_xml 整库导出、advisory lock、大对象读取)
+_ALLOWED_EXPRESSIONS = (
+    # 运算符与语法结构
+    exp.Connector,
+    exp.Case,
+    exp.If,
+    exp.Cast,
+    exp.Exists,
+    exp.Array,
+    exp.ArrayContainsAll,
+    exp.ArrayContainedBy,
+    exp.ArrayOverlaps,
+    exp.JSONExtract,
+    exp.JSONExtractScalar,
+    exp.JSONBExtract,
+    exp.JSONBExtractScalar,
+    # 聚合
+    exp.Count,
+    exp.Sum,
+    exp.Avg,
+    exp.Min,
+    exp.Max,
+    exp.ArrayAgg,
+    exp.GroupConcat,
+    exp.LogicalAnd,
+    exp.LogicalOr,
+    exp.Stddev,
+    exp.StddevPop,
+    exp.StddevSamp,
+    exp.Variance,
+    exp.VariancePop,
+    exp.Corr,
+    exp.CovarPop,
+    exp.CovarSamp,
+    exp.PercentileCont,
+    exp.PercentileDisc,
+    exp.Mode,
+    # 窗口
+    exp.RowNumber,
+    exp.Rank,
+    exp.DenseRank,
+    exp.PercentRank,
+    exp.CumeDist,
+    exp.Ntile,
+    exp.Lag,
+    exp.Lead,
+    exp.FirstValue,
+    exp.LastValue,
+    exp.NthValue,
+    # 条件
+    exp.Coalesce,
+    exp.Nullif,
+    exp.Greatest,
+    exp.Least,
+    # 字符串
+    exp.Lower,
+    exp.Upper,
+    exp.Length,
+    exp.Substring,
+    exp.Trim,
+    exp.Concat,
+    exp.ConcatWs,
+    exp.Left,
+    exp.Right,
+    exp.Replace,
+    exp.Reverse,
+    exp.Initcap,
+    exp.Pad,
+    exp.SplitPart,
+    exp.StrPosition,
+    exp.StartsWith,
+    exp.RegexpLike,
+    exp.RegexpReplace,
+    exp.Format,
+    exp.ArrayToString,
+    exp.MD5,
+    # 数学
+    exp.Abs,
+    exp.Ceil,
+    exp.Floor,
+    exp.Round,
+    exp.Trunc,
+    exp.Sign,
+    exp.Sqrt,
+    exp.Pow,
+    exp.Exp,
+    exp.Ln,
+    exp.Log,
+    exp.WidthBucket,
+    exp.ToNumber,
+    # 日期时间
+    exp.CurrentDate,
+    exp.CurrentTime,
+    exp.CurrentTimestamp,
+    exp.Extract,
+    exp.DateTrunc,
+    exp.TimestampTrunc,
+    exp.DateBin,
+    exp.DateAdd,
+    exp.Date,
+    exp.TimeToStr,
+    exp.StrToDate,
+    exp.StrToTime,
+    exp.UnixToTime,
+)
+
+_ALLOWED_FUNCTIONS = frozenset({
+    "age",
+    "date_part",
+    "make_date",
+    "make_timestamp",
+    "make_interval",
+    "justify_interval",
+    "char_length",
+    "octet_length",
+    "strpos",
+    "regexp_match",
+    "every",
+    "jsonb_agg",
+    "json_agg",
+    "jsonb_build_object",
+    "json_build_object",
+    "jsonb_array_length",
+    "json_array_length",
+    "jsonb_extract_path_text",
+    "json_extract_path_text",
+    "jsonb_typeof",
+    "array_length",
+    "cardinality",
+    "div",
+    "mod",
+})
+
+
+def _function_name(node: exp.Func) -> str:
+    if isinstance(node, exp.Anonymous):
+        return str(node.name).lower()
+    return node.sql_name().lower()
+
+
+def _function_allowed(node: exp.Func) -> bool:
+    # 带 schema 前缀的调用可能解析到同名的用户函数
+    if isinstance(node.parent, exp.Dot):
+        return False
+    if isinstance(node, exp.Anonymous):
+        return _function_name(node) in _ALLOWED_FUNCTIONS
+    return isinstance(node, _ALLOWED_EXPRESSIONS)
+
+
+class SQLGuard:
+    """
+    只读查询校验器
+
+    Args:
+        tables: 允许访问的表 (schema, table)
+        max_rows: 结果行数上限 (自动 LIMIT)
+        cache_size: 校验结果缓存条数
+    """
+
+    def __init__(self, tables: Iterable[tuple[str, str]], max_rows: int, cache_size: int = 256):
+        self.tables = {(schema.lower(), name.lower()) for schema, name in tables}
+        self._names = {name for _, name in self.tables}
+        self.max_rows = max_rows
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def validate(self, sql: str) -> str:
+        """
+        校验并规范化 SQL
+
+        Returns:
+            带 LIMIT 的规范化 SQL
+
+        Raises:
+            SQLValidationError: 不是单条只读查询或访问了不允许的表/函数
+        """
+        cached = self._cache.get(sql)
+        if cached is not None:
+            self._cache.move_to_end(sql)
+            return cached
+
+        normalized = self._validate(sql)
+        self._cache[sql] = normalized
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return normalized
+
+    def _validate(self, sql: str) -> str:
+        try:
+            statements = [s for s in sqlglot.parse(sql, read=DIALECT) if s is not None]
+        except ParseError as e:
+            raise SQLValidationError(f"SQL 解析失败: {e}") from e
+        if len(statements) != 1:
+            raise SQLValidationError("只允许一条查询语句")
+
+        tree = statements[0]
+        if not isinstance(tree, exp.Query):
+            raise SQLValidationError("只允许 SELECT 查询")
+
+        for node in tree.walk():
+            if isinstance(node, _FORBIDDEN_NODES):
+                raise SQLValidationError(f"不允许的语法: {node.key.upper()}")
+            if isinstance(node, exp.Func) and not _function_allowed(node):
+                raise SQLValidationError(f"不允许的函数: {_function_name(node)}")
+
+        cte_names = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+        for table in tree.find_all(exp.Table):
+            name = table.name.lower()
+            if not name:
+                raise SQLValidationError("不允许的表表达式")
+            schema = table.db.lower()
+            if schema:
+                allowed = (schema, name) in self.tables
+            else:
+                allowed = name in cte_names or name in self._names
+            if not allowed:
+                raise SQLValidationError(f"不允许访问的表: {table.sql(dialect=DIALECT)}")
+
+        tree = self._apply_limit(tree)
+        return tree.sql(dialect=DIALECT)
+
+    def _apply_limit(self, tree: exp.Query) -> exp.Query:
+        limit = tree.args.get("limit")
+        if limit is not None:
+            value = limit.expression
+            if isinstance(value, exp.Literal) and not value.is_string and int(value.this) <= self.max_rows:
+                return tree
+        return tree.limit(self.max_rows)
@@ -0,0 +1,279 @@
+"""
+数据库表结构知识层
+
+从 information_schema / pg_catalog 读取允许访问的表、列、外键，以及 pg_stats 中的
+高频取值作为示例值，每张表渲染为一段描述并用 EmbeddingService 向量化，
+生成 SQL 时只把与问题相关的表 (及其外键相邻表) 注入提示词。
+
+刷新策略 (按 DSN 缓存):
+- 每 schema_check_interval 秒检查一次 alembic_version，迁移版本变化即重新读取
+- 超过 schema_cache_ttl 无论版本是否变化都重新读取 (兜底非迁移的 DDL)
+- 重新读取后只对描述发生变化的表重新向量化
+"""
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import asyncpg
+import numpy as np
+
+from config import settings
+from knowledgebase.core.embedding import EmbeddingService
+from services.logging_service import logger
+from .executor import SQLExecutor
+from .guard import SQLGuard
+
+
+TableKey = Tuple[str, str]
+
+_COLUMNS_SQL = """
+SELECT c.table_schema, c.table_name, c.column_name, c.data_type
+FROM information_schema.columns c
+JOIN information_schema.tables t
+  ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+WHERE c.table_schema = ANY($1::text[]) AND t.table_type IN ('BASE TABLE', 'VIEW')
+ORDER BY c.table_schema, c.table_name, c.ordinal_position
+"""
+
+# information_schema.constraint_column_usage 只对表属主可见，只读角色读不到被引用列，
+# 外键改从 pg_constraint 读取
+_FOREIGN_KEYS_SQL = """
+SELECT ns.nspname AS table_schema, cl.relname AS table_name, att.attname AS column_name,
+       rns.nspname AS ref_schema, rcl.relname AS ref_table, ratt.attname AS ref_column
+FROM pg_constraint con
+CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(col, ref_col)
+JOIN pg_class cl ON cl.oid = con.conrelid
+JOIN pg_namespace ns ON ns.oid = cl.relnamespace
+JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = k.col
+JOIN pg_class rcl ON rcl.oid = con.confrelid
+JOIN pg_namespace rns ON rns.oid = rcl.relnamespace
+JOIN pg_attribute ratt ON ratt.attrelid = con.confrelid AND ratt.attnum = k.ref_col
+WHERE con.contype = 'f' AND ns.nspname = ANY($1::text[])
+"""
+
+# 示例值取自 ANALYZE 统计的高频值，不扫描业务表
+_SAMPLES_SQL = """
+SELECT schemaname, tablename, attname, (most_common_vals::text)::text[] AS vals
+FROM pg_stats
+WHERE schemaname = ANY($1::text[]) AND most_common_vals IS NOT NULL
+"""
+
+_VERSION_SQL = "SELECT version_num FROM alembic_version"
+
+_SAMPLE_TYPES = frozenset({"text", "character varying", "character", "USER-DEFINED"})
+
+
+def _table_allowed(schema: str, name: str) -> bool:
+    conf = settings.sql_agent
+    qualified = f"{schema}.{name}"
+    if name in conf.denied_tables or qualified in conf.denied_tables:
+        return False
+    return name in conf.allowed_tables or qualified in conf.allowed_tables
+
+
+def _display_name(schema: str, name: str) -> str:
+    return name if schema == "public" else f"{schema}.{name}"
+
+
+@dataclass
+class TableInfo:
+    """单张表的结构描述"""
+    schema: str
+    name: str
+    columns: List[Tuple[str, str]] = field(default_factory=list)
+    # (列, 被引用表, 被引用列)
+    foreign_keys: List[Tuple[str, TableKey, str]] = field(default_factory=list)
+    samples: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def key(self) -> TableKey:
+        return self.schema, self.name
+
+    def render(self) -> str:
+        cols = ", ".join(f"{col} {data_type}" for col, data_type in self.columns)
+        lines = [f"{_display_name(self.schema, self.name)}({cols})"]
+        for col, ref, ref_col in self.foreign_keys:
+            lines.append(f"  FK: {col} -> {_display_name(*ref)}.{ref_col}")
+        for col, values in self.samples.items():
+            lines.append(f"  示例值 {col}: {', '.join(values)}")
+        return "\n".join(lines)
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha1(self.render().encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SchemaSnapshot:
+    """某一迁移版本下的表结构与向量索引"""
+    tables: Dict[TableKey, TableInfo]
+    version: Optional[str] = None
+    loaded_at: float = field(default_factory=time.monotonic)
+    checked_at: float = field(default_factory=time.monotonic)
+    # 与 tables 顺序一致的单位向量矩阵，未向量化时为 None
+    vectors: Optional[np.ndarray] = field(default=None, repr=False)
+    _guard: Optional[SQLGuard] = field(default=None, repr=False)
+
+    @property
+    def guard(self) -> SQLGuard:
+        """基于本快照表集合的校验器 (随快照一起失效)"""
+        if self._guard is None:
+            conf = settings.sql_agent
+            self._guard = SQLGuard(self.tables.keys(), max_rows=conf.max_rows, cache_size=conf.plan_cache_size)
+        return self._guard
+
+    def render(self, keys: Optional[Iterable[TableKey]] = None) -> str:
+        """渲染为提示词中的表结构描述，默认全部表"""
+        selected = self.tables.keys() if keys is None else keys
+        return "\n".join(self.tables[key].render() for key in selected if key in self.tables)
+
+    def with_neighbours(self, keys: List[TableKey]) -> List[TableKey]:
+        """补充外键直接关联的表，保证可以生成 JOIN"""
+        result = list(keys)
+        selected = set(keys)
+        for info in self.tables.values():
+            for _, ref, _ in info.foreign_keys:
+                if info.key in selected and ref not in result and ref in self.tables:
+                    result.append(ref)
+                elif ref in selected and info.key not in result:
+                    result.append(info.key)
+        return result
+
+
+class SchemaCache:
+    """按 DSN 缓存表结构，迁移版本变化时增量刷新"""
+
+    def __init__(self, ttl: Optional[float] = None, check_interval: Optional[float] = None):
+        conf = settings.sql_agent
+        self.ttl = conf.schema_cache_ttl if ttl is None else ttl
+        self.check_interval = conf.schema_check_interval if check_interval is None else check_interval
+        self._items: Dict[str, SchemaSnapshot] = {}
+        # DSN -> (表描述指纹 -> 单位向量)，跨刷新复用，只为变化的表重新向量化
+        self._vectors: Dict[str, Dict[str, np.ndarray]] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, executor: SQLExecutor) -> SchemaSnapshot:
+        snapshot = self._items.get(executor.dsn)
+        if snapshot is not None and time.monotonic() - snapshot.checked_at < self.check_interval:
+            return snapshot
+        async with self._lock:
+            snapshot = self._items.get(executor.dsn)
+            now = time.monotonic()
+            if snapshot is not None and now - snapshot.checked_at < self.check_interval:
+                return snapshot
+            if snapshot is not None and now - snapshot.loaded_at < self.ttl:
+                version = await self._load_version(executor)
+                if version == snapshot.version:
+                    snapshot.checked_at = now
+                    return snapshot
+                logger.info(f"SchemaCache: migration {snapshot.version} -> {version}, refreshing")
+            snapshot = await self._load(executor)
+            await self._index(executor.dsn, snapshot)
+            self._items[executor.dsn] = snapshot
+        return snapshot
+
+    async def relevant_schema(self, executor: SQLExecutor, question: str, top_k: Optional[int] = None) -> str:
+        """与问题相关的表结构描述"""
+        snapshot = await self.get(executor)
+        keys = await self.select_tables(snapshot, question, top_k)
+        return snapshot.render(keys)
+
+    async def select_tables(
+        self,
+        snapshot: SchemaSnapshot,
+        question: str,
+        top_k: Optional[int] = None,
+    ) -> List[TableKey]:
+        """按问题向量相似度选出 top_k 张表并补充外键相邻表；表较少或向量不可用时返回全部"""
+        top_k = top_k or settings.sql_agent.schema_top_k
+        keys = list(snapshot.tables.keys())
+        if len(keys) <= top_k or snapshot.vectors is None or not question:
+            return keys
+        try:
+            query = np.asarray(await EmbeddingService.embed_query(question, self._model()), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"SchemaCache: embed question failed, using full schema: {e}")
+            return keys
+        scores = snapshot.vectors @ (query / (np.linalg.norm(query) or 1.0))
+        best = [keys[i] for i in np.argsort(-scores)[:top_k]]
+        return snapshot.with_neighbours(best)
+
+    def invalidate(self, dsn: Optional[str] = None) -> None:
+        if dsn is None:
+            self._items.clear()
+            self._vectors.clear()
+        else:
+            self._items.pop(dsn, None)
+            self._vectors.pop(dsn, None)
+
+    @staticmethod
+    def _model() -> str:
+        return settings.sql_agent.schema_embedding_model or settings.kb.embedding_model
+
+    async def _index(self, dsn: str, snapshot: SchemaSnapshot) -> None:
+        """向量化快照中的表描述 (仅处理该 DSN 下指纹未缓存的表)"""
+        infos = list(snapshot.tables.values())
+        if len(infos) <= settings.sql_agent.schema_top_k:
+            return
+        cached = self._vectors.get(dsn, {})
+        fingerprints = [info.fingerprint for info in infos]
+        pending = [(fp, info) for fp, info in zip(fingerprints, infos) if fp not in cached]
+        if pending:
+            try:
+                vectors = await EmbeddingService.embed_documents([info.render() for _, info in pending], self._model())
+            except Exception as e:
+                logger.warning(f"SchemaCache: embed schema failed, using full schema: {e}")
+                return
+            for (fp, _), vector in zip(pending, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                cached[fp] = vector / (np.linalg.norm(vector) or 1.0)
+            logger.info(f"SchemaCache: embedded {len(pending)}/{len(infos)} tables")
+        # 只保留该 DSN 当前快照用到的向量，其他 DSN 的缓存不受影响
+        self._vectors[dsn] = {fp: cached[fp] for fp in fingerprints}
+        snapshot.vectors = np.stack([self._vectors[dsn][fp] for fp in fingerprints])
+
+    @staticmethod
+    async def _load_version(executor: SQLExecutor) -> Optional[str]:
+        try:
+            rows = await executor.fetch(_VERSION_SQL)
+        except asyncpg.PostgresError:
+            return None
+        return ",".join(sorted(row["version_num"] for row in rows)) or None
+
+    @classmethod
+    async def _load(cls, executor: SQLExecutor) -> SchemaSnapshot:
+        conf = settings.sql_agent
+        schemas = conf.allowed_schemas
+        version = await cls._load_version(executor)
+
+        tables: Dict[TableKey, TableInfo] = {}
+        types: Dict[Tuple[str, str, str], str] = {}
+        for row in await executor.fetch(_COLUMNS_SQL, schemas):
+            schema, name = row["table_schema"], row["table_name"]
+            if not _table_allowed(schema, name):
+                continue
+            info = tables.setdefault((schema, name), TableInfo(schema=schema, name=name))
+            info.columns.append((row["column_name"], row["data_type"]))
+            types[(schema, name, row["column_name"])] = row["data_type"]
+
+        for row in await executor.fetch(_FOREIGN_KEYS_SQL, schemas):
+            info = tables.get((row["table_schema"], row["table_name"]))
+            ref = (row["ref_schema"], row["ref_table"])
+            if info is not None and ref in tables:
+                info.foreign_keys.append((row["column_name"], ref, row["ref_column"]))
+
+        if conf.sample_values > 0:
+            for row in await executor.fetch(_SAMPLES_SQL, schemas):
+                info = tables.get((row["schemaname"], row["tablename"]))
+                column = row["attname"]
+                if info is None or types.get((info.schema, info.name, column)) not in _SAMPLE_TYPES:
+                    continue
+                info.samples[column] = [str(v)[:50] for v in (row["vals"] or [])[:conf.sample_values]]
+
+        logger.info(f"SchemaCache: loaded {len(tables)} tables (version={version})")
+        return SchemaSnapshot(tables=tables, version=version)
+
+
+schema_cache = SchemaCache()
@@ -0,0 +1,177 @@
+"""
+SSE 流写入器
+
+在 LangGraph 事件流与 HTTP 响应之间加一层缓冲：
+1. 按时间窗口 / 字节数将连续的文本 Token 合并为一个协议帧，减少小包写入
+2. 有界队列：客户端消费慢时生产者阻塞，反压到上游 LLM 流
+3. 检测客户端断开并取消上游任务，停止为已放弃的生成付费
+"""
+import asyncio
+import time
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, List, Optional
+
+from config import settings
+from services.logging_service import logger
+from .utils import convert_to_vercel_sse, encode_text_frame, extract_stream_delta
+
+
+_END = object()
+
+
+class ClientDisconnected(Exception):
+    """客户端已断开连接"""
+
+
+class SSEStreamWriter:
+    """
+    合并 Token 并带反压的 SSE 写入器
+
+    Args:
+        flush_interval: 文本缓冲最长停留时间 (秒)
+        max_buffer_bytes: 文本缓冲达到该字节数时立即输出
+        queue_size: 事件队列容量，满时阻塞上游
+        is_disconnected: 检测客户端断开的回调 (通常为 Request.is_disconnected)
+        disconnect_check_interval: 断开检测间隔 (秒)
+        debug: 是否输出 e: 调试帧 (调试模式下不合并 Token)
+    """
+
+    def __init__(
+        self,
+        flush_interval: float | None = None,
+        max_buffer_bytes: int | None = None,
+        queue_size: int | None = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        disconnect_check_interval: float | None = None,
+        debug: bool = False,
+    ):
+        conf = settings.agent
+        self.flush_interval = conf.stream_flush_interval_ms / 1000 if flush_interval is None else flush_interval
+        self.max_buffer_bytes = conf.stream_max_buffer_bytes if max_buffer_bytes is None else max_buffer_bytes
+        self.queue_size = conf.stream_queue_size if queue_size is None else queue_size
+        self.is_disconnected = is_disconnected
+        self.disconnect_check_interval = (
+            conf.stream_disconnect_check_interval
+            if disconnect_check_interval is None
+            else disconnect_check_interval
+        )
+        self.debug = debug
+
+        self._buf_code: str | None = None
+        self._buf_parts: List[str] = []
+        self._buf_bytes = 0
+        self._buf_since = 0.0
+
+    def _flush(self) -> str:
+        if not self._buf_parts:
+            return ""
+        frame = encode_text_frame(self._buf_code, "".join(self._buf_parts))
+        self._buf_code = None
+        self._buf_parts = []
+        self._buf_bytes = 0
+        return frame
+
+    def _append(self, code: str, text: str) -> str:
+        """追加文本到缓冲，类型切换或超出字节上限时返回需输出的帧"""
+        output = ""
+        if self._buf_code is not None and self._buf_code != code:
+            output += self._flush()
+        if not self._buf_parts:
+            self._buf_since = time.monotonic()
+        self._buf_code = code
+        self._buf_parts.append(text)
+        self._buf_bytes += len(text.encode("utf-8"))
+        if self._buf_bytes >= self.max_buffer_bytes:
+            output += self._flush()
+        return output
+
+    def _handle(self, event: dict) -> str:
+        if self.debug:
+            return convert_to_vercel_sse(event, debug=True)
+
+        if event.get("event") == "on_chat_model_stream":
+            reasoning, content = extract_stream_delta(event)
+            output = ""
+            if reasoning:
+                output += self._append("2", reasoning)
+            if content:
+                output += self._append("0", content)
+            return output
+
+        # 非文本帧先输出缓冲，保证帧顺序
+        return self._flush() + convert_to_vercel_sse(event)
+
+    async def _produce(self, events: AsyncIterator[dict], queue: asyncio.Queue) -> None:
+        try:
+            async for event in events:
+                # 队列满时在此阻塞，不再从上游拉取
+                await queue.put(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await queue.put(exc)
+            return
+        await queue.put(_END)
+
+    def _next_timeout(self, last_check: float) -> float | None:
+        now = time.monotonic()
+        timeouts = []
+        if self._buf_parts:
+            timeouts.append(max(0.0, self._buf_since + self.flush_interval - now))
+        if self.is_disconnected is not None:
+            timeouts.append(max(0.0, last_check + self.disconnect_check_interval - now))
+        return min(timeouts) if timeouts else None
+
+    async def stream(self, events: AsyncIterator[dict]) -> AsyncGenerator[str, None]:
+        """
+        消费事件流并输出 SSE 帧
+
+        客户端断开或响应被取消时，上游事件流任务一并取消
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        producer = asyncio.create_task(self._produce(events, queue))
+        last_check = time.monotonic()
+
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=self._next_timeout(last_check))
+                except asyncio.TimeoutError:
+                    item = None
+
+                now = time.monotonic()
+                if self.is_disconnected is not None and now - last_check >= self.disconnect_check_interval:
+                    last_check = now
+                    if await self.is_disconnected():
+                        raise ClientDisconnected()
+
+                if item is None:
+                    if self._buf_parts and now - self._buf_since >= self.flush_interval:
+                        yield self._flush()
+                    continue
+
+                if item is _END:
+                    tail = self._flush()
+                    if tail:
+                        yield tail
+                    break
+
+                if isinstance(item, Exception):
+                    tail = self._flush()
+                    if tail:
+                        yield tail
+                    raise item
+
+                output = self._handle(item)
+                if self._buf_parts and now - self._buf_since >= self.flush_interval:
+                    output += self._flush()
+                if output:
+                    yield output
+        except ClientDisconnected:
+            logger.info("SSEStreamWriter: client disconnected, cancel upstream stream")
+        finally:
+            if not producer.done():
+                producer.cancel()
+                try:
+                    await producer
+                except (asyncio.CancelledError, Exception):
+                    pass
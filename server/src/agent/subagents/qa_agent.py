@@ -21,7 +21,6 @@ from langgraph.graph.state import CompiledStateGraph
 from config import settings
 from ..llm import DeepSeekChat
 from ..tools import get_current_weather, upsert_memory
-from llm_usage.service import record_usage_from_response
 from services.logging_service import logger
 
 
@@ -38,7 +37,6 @@ class QAAgent:
     - DeepSeek Reasoner LLM
     - 工具绑定（天气、记忆）
     - 长期记忆注入
-    - usage 记录
     """
     
     def __init__(self, llm=None):
@@ -86,7 +84,6 @@ class QAAgent:
         2. 从 Store 检索记忆
         3. 构建 System Prompt（含记忆上下文）
         4. 调用 LLM
-        5. 记录 usage
         """
         messages = state["messages"]
         
@@ -147,20 +144,8 @@ You can use the `upsert_memory` tool to save new important information about the
         except Exception as exc:
             logger.warning(f"QAAgent: log response metadata failed: {exc}")
 
-        # 5. 记录 LLM 用量
-        try:
-            metadata = config.get("metadata", {})
-            user_id = metadata.get("user_id")
-            model_name = getattr(self.llm, "model_name", None) or getattr(self.llm, "model", "unknown")
-            if user_id:
-                logger.info(f"QAAgent: Recording LLM usage for user_id={user_id}, model={model_name}")
-                await record_usage_from_response(
-                    user_id=user_id,
-                    response=response,
-                    model_name=model_name,
-                )
-        except Exception as exc:
-            logger.warning(f"QAAgent: record_usage failed: {exc}")
+        # 5. LLM 用量由 AgentService 注入的 UsageCallbackHandler 统一记录，
+        #    此处不再重复写入
 
         return {"messages": [response]}
     
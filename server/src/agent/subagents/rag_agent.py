@@ -20,6 +20,8 @@ from config import settings
 from database import AsyncSessionLocal
 from knowledgebase.services.kb_service import KBService
 from knowledgebase.services.retriever_factory import RetrieverFactory
+from ..constants import NOSTREAM_TAG
+from ..context import ContextPacker, estimate_tokens
 from ..llm import DeepSeekChat
 from services.logging_service import logger
 
@@ -46,6 +48,12 @@ class RAGAgent:
         else:
             self.llm = llm
 
+        self._tokenizer_available = True
+        self.packer = ContextPacker(
+            token_counter=self._count_tokens,
+            token_budget=settings.agent.rag_context_token_budget,
+        )
+
         self.workflow = StateGraph(RAGAgentState)
         self.workflow.add_node("rewrite", self._rewrite_question)
         self.workflow.add_node("search", self._search)
@@ -65,6 +73,25 @@ class RAGAgent:
                 return getattr(msg, "content", "")
         return ""
 
+    def _count_tokens(self, text: str) -> int:
+        """使用目标模型分词器计数，分词器不可用时退回估算"""
+        if self._tokenizer_available:
+            try:
+                return self.llm.get_num_tokens(text)
+            except Exception as exc:
+                logger.warning(f"RAGAgent: tokenizer unavailable, fallback to estimate: {exc}")
+                self._tokenizer_available = False
+        return estimate_tokens(text)
+
+    @staticmethod
+    def _retrieval_kwargs() -> dict:
+        conf = settings.agent
+        return {
+            "k": conf.rag_retrieval_k,
+            "search_type": conf.rag_search_type,
+            "max_per_doc": conf.rag_max_chunks_per_doc,
+        }
+
     async def _resolve_retriever(self, user_id: str, kb_id: str | None):
         """解析检索器：优先单 KB，否则走默认可访问知识库范围"""
         if kb_id:
@@ -73,7 +100,16 @@ class RAGAgent:
             except ValueError:
                 logger.warning("RAGAgent: invalid kb_id=%s, fallback to accessible scope", kb_id)
             else:
-                return RetrieverFactory.create_retriever(kb_id=kb_uuid, k=5)
+                async with AsyncSessionLocal() as session:
+                    kb = await KBService(session).get_kb(kb_uuid)
+                if kb is not None:
+                    return RetrieverFactory.create_retriever(
+                        kb_id=kb_uuid,
+                        embedding_model=kb.embedding_model,
+                        collection_name=kb.vector_collection,
+                        **self._retrieval_kwargs(),
+                    )
+                logger.warning("RAGAgent: kb_id=%s not found, fallback to accessible scope", kb_id)
 
         try:
             user_uuid = UUID(user_id)
@@ -82,9 +118,10 @@ class RAGAgent:
 
         async with AsyncSessionLocal() as session:
             service = KBService(session)
-            kb_ids = await service.get_accessible_kb_ids(user_uuid)
+            scopes = await service.get_accessible_kb_scopes(user_uuid)
 
-        return RetrieverFactory.create_accessible_retriever(kb_ids=kb_ids, k=5)
+        # 知识库可能使用不同的 Embedding 模型 (更换模型后)，按模型分组检索再合并
+        return RetrieverFactory.create_scoped_retriever(scopes, **self._retrieval_kwargs())
 
     async def _rewrite_question(self, state: RAGAgentState, config: RunnableConfig):
         """Rewrite user question to improve retrieval accuracy."""
@@ -100,8 +137,10 @@ class RAGAgent:
         user_prompt = f"原问题：{query}\n\n改写："
 
         try:
+            # 改写结果仅用于检索，不向前端流式输出
             response = await self.llm.ainvoke(
-                [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
+                [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)],
+                config={"tags": [NOSTREAM_TAG]},
             )
             rewritten = getattr(response, "content", "").strip()
         except Exception as exc:
@@ -142,11 +181,12 @@ class RAGAgent:
         if not query:
             return {"messages": [AIMessage(content="请先输入要检索的问题。")]} 
 
-        context_blocks = []
-        for idx, doc in enumerate(docs[:5], 1):
-            snippet = (getattr(doc, "page_content", None) or "").strip()
-            if snippet:
-                context_blocks.append(f"[{idx}] {snippet[:1200]}")
+        packed = self.packer.pack(docs)
+        context_blocks = [f"[{idx}] {block.text}" for idx, block in enumerate(packed, 1)]
+        logger.debug(
+            f"RAGAgent: packed {len(docs)} docs into {len(packed)} blocks, "
+            f"tokens={sum(block.tokens for block in packed)}"
+        )
 
         if not context_blocks:
             return {"messages": [AIMessage(content="未检索到相关知识库内容，请尝试换个问法。")]} 
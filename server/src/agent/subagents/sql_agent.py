@@ -1,70 +1,214 @@
 """
-SQL Agent - 数据库查询 Agent (Stub)
+SQL Agent - 数据库查询 Agent
 
-TODO: 后续接入 SQL Agent
+流程：schema -> generate -> execute -> answer
+1. schema: 从缓存的表结构索引中检索与问题相关的表
+2. generate: LLM 生成 SQL (不向前端流式输出)
+3. execute: SQLGuard 校验 (只读、表白名单、自动 LIMIT) 后在只读连接池执行，
+   结果按批以 sql_table 自定义事件推送为表格帧；校验或执行失败时带错误信息回到 generate
+4. answer: LLM 基于查询结果作答
 """
-from typing import Annotated, List
+import re
+import uuid
+from typing import Annotated, Any, List, Optional
 from typing_extensions import TypedDict
 
-from langchain_core.messages import BaseMessage, AIMessage
+import asyncpg
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage
 from langchain_core.runnables.config import RunnableConfig
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.graph.state import CompiledStateGraph
 
+from config import settings
+from ..constants import NOSTREAM_TAG, SQL_TABLE_EVENT
+from ..exceptions import SQLValidationError
+from ..llm import DeepSeekChat
+from ..sql import SQLExecutor, SchemaCache, schema_cache, sql_executor
 from services.logging_service import logger
 
 
-class SQLAgentState(TypedDict):
+# 回答提示词中最多放入的结果行数 (完整结果已通过表格帧推送)
+PROMPT_MAX_ROWS = 50
+
+_SQL_FENCE = re.compile(r"```(?:sql)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+class SQLAgentState(TypedDict, total=False):
     """SQL Agent 状态"""
     messages: Annotated[List[BaseMessage], add_messages]
+    question: str
+    schema: str
+    sql: str
+    error: Optional[str]
+    attempts: int
+    result: str
+    row_count: int
+
+
+def extract_sql(text: str) -> str:
+    """从 LLM 输出中提取 SQL (去掉 Markdown 代码块与结尾分号)"""
+    match = _SQL_FENCE.search(text)
+    if match:
+        text = match.group(1)
+    return text.strip().rstrip(";").strip()
+
+
+def format_rows(columns: List[str], rows: List[list], limit: int = PROMPT_MAX_ROWS) -> str:
+    """把查询结果渲染为提示词中的简洁表格"""
+    lines = [" | ".join(columns)]
+    lines.extend(" | ".join("" if v is None else str(v) for v in row) for row in rows[:limit])
+    if len(rows) > limit:
+        lines.append(f"... 共 {len(rows)} 行，仅展示前 {limit} 行")
+    return "\n".join(lines)
 
 
 class SQLAgent:
-    """
-    SQL Agent - 数据库查询 (Stub 版本)
-    
-    TODO: 后续实现：
-    - SQL 生成
-    - 查询执行
-    - 结果格式化
-    - 安全校验
-    """
-    
-    def __init__(self):
+    """SQL Agent - 自然语言查询数据库"""
+
+    def __init__(
+        self,
+        llm=None,
+        executor: Optional[SQLExecutor] = None,
+        schemas: Optional[SchemaCache] = None,
+    ):
         """初始化 SQL Agent"""
-        # 构建图
+        if llm is None:
+            self.llm = DeepSeekChat(
+                model=settings.agent.deepseek_model,
+                api_key=settings.agent.deepseek_api_key,
+                base_url=settings.agent.deepseek_base_url,
+            )
+        else:
+            self.llm = llm
+        self.executor = executor or sql_executor
+        self.schemas = schemas or schema_cache
+
         self.workflow = StateGraph(SQLAgentState)
-        
-        # 添加节点
+        self.workflow.add_node("schema", self._load_schema)
+        self.workflow.add_node("generate", self._generate)
+        self.workflow.add_node("execute", self._execute)
         self.workflow.add_node("answer", self._answer)
-        
-        # 添加边
-        self.workflow.add_edge(START, "answer")
+
+        self.workflow.add_edge(START, "schema")
+        self.workflow.add_edge("schema", "generate")
+        self.workflow.add_edge("generate", "execute")
+        self.workflow.add_conditional_edges("execute", self._should_retry, ["generate", "answer"])
         self.workflow.add_edge("answer", END)
-    
+
+    @staticmethod
+    def _get_last_user_message(messages: List[BaseMessage]) -> str:
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                return msg.content
+        return ""
+
+    async def _load_schema(self, state: SQLAgentState, config: RunnableConfig):
+        question = self._get_last_user_message(state.get("messages", []))
+        schema = await self.schemas.relevant_schema(self.executor, question)
+        return {"question": question, "schema": schema, "attempts": 0, "error": None}
+
+    async def _generate(self, state: SQLAgentState, config: RunnableConfig):
+        """生成 SQL，重试时附带上次的 SQL 与错误"""
+        system_prompt = (
+            "你是 PostgreSQL 查询助手。根据表结构把用户问题转换为一条只读 SELECT 语句。"
+            "只能使用给出的表和列，只输出 SQL，不要解释。"
+        )
+        user_prompt = f"表结构：\n{state.get('schema', '')}\n\n用户问题：{state.get('question', '')}"
+        if state.get("error"):
+            user_prompt += f"\n\n上次生成的 SQL：\n{state.get('sql', '')}\n执行失败：{state['error']}\n请修正。"
+
+        # 生成的 SQL 不向前端流式输出，执行时以表格帧展示
+        response = await self.llm.ainvoke(
+            [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)],
+            config={"tags": [NOSTREAM_TAG]},
+        )
+        sql = extract_sql(getattr(response, "content", ""))
+        return {"sql": sql, "attempts": state.get("attempts", 0) + 1}
+
+    async def _execute(self, state: SQLAgentState, config: RunnableConfig):
+        """校验并执行 SQL，分批推送表格帧"""
+        snapshot = await self.schemas.get(self.executor)
+        try:
+            sql = snapshot.guard.validate(state.get("sql", ""))
+        except SQLValidationError as e:
+            logger.warning(f"SQLAgent: rejected sql: {e}")
+            return {"error": str(e)}
+
+        table_id = uuid.uuid4().hex
+        columns: List[str] = []
+        rows: List[list] = []
+        try:
+            async for batch_columns, batch in self.executor.stream(sql):
+                columns = batch_columns or columns
+                rows.extend(batch)
+                await self._emit_table(config, table_id, sql, columns, batch, len(rows), done=False)
+        except asyncpg.PostgresError as e:
+            logger.warning(f"SQLAgent: query failed: {e}")
+            await self._emit_table(config, table_id, sql, columns, [], len(rows), done=True, error=str(e))
+            return {"sql": sql, "error": str(e)}
+
+        await self._emit_table(config, table_id, sql, columns, [], len(rows), done=True)
+        logger.info(f"SQLAgent: query returned {len(rows)} rows")
+        # 状态 (检查点) 中只保留提示词所需的文本结果
+        return {"sql": sql, "error": None, "result": format_rows(columns, rows), "row_count": len(rows)}
+
+    @staticmethod
+    async def _emit_table(
+        config: RunnableConfig,
+        table_id: str,
+        sql: str,
+        columns: List[str],
+        rows: List[list],
+        row_count: int,
+        done: bool,
+        error: Optional[str] = None,
+    ) -> None:
+        """派发表格帧 (前端按 id 累加 rows)"""
+        frame: dict[str, Any] = {
+            "type": SQL_TABLE_EVENT,
+            "id": table_id,
+            "sql": sql,
+            "columns": columns,
+            "rows": rows,
+            "row_count": row_count,
+            "done": done,
+        }
+        if error is not None:
+            frame["error"] = error
+        await adispatch_custom_event(SQL_TABLE_EVENT, frame, config=config)
+
+    @staticmethod
+    def _should_retry(state: SQLAgentState) -> str:
+        if state.get("error") and state.get("attempts", 0) < settings.sql_agent.max_attempts:
+            return "generate"
+        return "answer"
+
     async def _answer(self, state: SQLAgentState, config: RunnableConfig):
-        """
-        回答节点 (Stub)
-        
-        返回固定文本，后续接入 SQL Agent
-        """
-        logger.info("SQLAgent: stub response triggered")
-        
-        stub_response = AIMessage(
-            content="(SQLAgent stub) 后续接 SQL Agent。当前 SQL 查询功能尚未实现，请稍后重试。"
+        """基于查询结果回答"""
+        if state.get("error"):
+            return {"messages": [AIMessage(content=f"查询未能完成：{state['error']}")]}
+
+        system_prompt = "你是数据分析助手。请依据 SQL 查询结果简洁地回答用户问题，不要编造结果中没有的数据。"
+        user_prompt = (
+            f"用户问题：{state.get('question', '')}\n\n"
+            f"执行的 SQL：\n{state.get('sql', '')}\n\n"
+            f"查询结果 ({state.get('row_count', 0)} 行)：\n{state.get('result', '')}"
+        )
+        response = await self.llm.ainvoke(
+            [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
         )
-        
-        return {"messages": [stub_response]}
-    
+        return {"messages": [response]}
+
     def compile(self, checkpointer=None, store=None) -> CompiledStateGraph:
         """
         编译并返回 Agent 图
-        
+
         Args:
             checkpointer: 检查点服务
             store: 存储服务
-            
+
         Returns:
             编译后的 CompiledGraph
         """
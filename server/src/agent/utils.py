@@ -1,14 +1,46 @@
 import json
+import random
 from datetime import datetime, timezone
 from typing import Any
 from loguru import logger
 
+from config import settings
+from .constants import SQL_TABLE_EVENT
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 随 fastapi[all] 安装
+    orjson = None
+
 
 def _safe_json_dumps(payload: Any) -> str:
     """Serialize payload for SSE logs while preserving non-JSON objects as strings."""
     return json.dumps(payload, ensure_ascii=False, default=str)
 
 
+def _fast_json_dumps(payload: Any) -> str:
+    """Serialize protocol frames with orjson when available (falls back to json)."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return _safe_json_dumps(payload)
+
+
+def should_emit_debug(requested: bool = False) -> bool:
+    """
+    判断本次请求是否开启 e: 调试通道
+
+    - 配置未允许 (sse_debug_allowed) 时一律关闭，采样率也不生效
+    - requested: 请求显式开启
+    - 否则按配置采样率随机开启
+    """
+    if not settings.agent.sse_debug_allowed:
+        return False
+    if requested:
+        return True
+    rate = settings.agent.sse_debug_sample_rate
+    return rate > 0 and random.random() < rate
+
+
 def _build_debug_event(event: dict) -> dict:
     """Build a rich debug payload so webtest can inspect as much signal as possible."""
     kind = event.get("event")
@@ -42,13 +74,40 @@ def _build_debug_event(event: dict) -> dict:
     return debug_event
 
 
-def convert_to_vercel_sse(event: dict) -> str:
+def extract_stream_delta(event: dict) -> tuple[str | None, str | None]:
+    """
+    提取 on_chat_model_stream 事件中的增量文本
+
+    Returns:
+        (reasoning_content, content)，事件无 chunk 时均为 None
+    """
+    chunk = (event.get("data") or {}).get("chunk")
+    if not chunk:
+        return None, None
+
+    reasoning = None
+    if hasattr(chunk, "additional_kwargs"):
+        reasoning = chunk.additional_kwargs.get("reasoning_content")
+
+    content = getattr(chunk, "content", None) or ""
+    return reasoning or "", content
+
+
+def encode_text_frame(code: str, text: str) -> str:
+    """编码文本类协议帧 (0: 正文 / 2: 推理)"""
+    return f'{code}:{_fast_json_dumps(text)}\n'
+
+
+def convert_to_vercel_sse(event: dict, debug: bool = False) -> str:
     """
     将 LangGraph 事件转换为 Vercel AI SDK Data Stream Protocol 格式
     参考: https://sdk.vercel.ai/docs/ai-sdk-ui/data-stream-protocol
 
+    生产模式只输出协议帧 (0:/2:/8:/9:/a:)；调试模式额外追加 e: 原始事件帧。
+
     Args:
         event: LangGraph astream_events 产生的事件
+        debug: 是否输出 e: 调试帧
 
     Returns:
         符合 Vercel 协议的 SSE 字符串，如果无需发送则返回空字符串
@@ -56,26 +115,22 @@ def convert_to_vercel_sse(event: dict) -> str:
     kind = event.get("event")
 
     # 调试模式：透传尽可能完整的原始事件，便于 webtest 全链路观测
-    debug_output = f'e:{_safe_json_dumps(_build_debug_event(event))}\n'
+    debug_output = f'e:{_safe_json_dumps(_build_debug_event(event))}\n' if debug else ""
 
     # 处理模型生成的文本流
     if kind == "on_chat_model_stream":
-        chunk = event.get("data", {}).get("chunk")
-        if chunk:
+        reasoning, content = extract_stream_delta(event)
+        if reasoning is not None or content is not None:
             output = ""
 
             # DeepSeek Reasoning Content
-            reasoning = None
-            if hasattr(chunk, "additional_kwargs"):
-                reasoning = chunk.additional_kwargs.get("reasoning_content")
-
             if reasoning:
-                output += f'2:{_safe_json_dumps(reasoning)}\n'
+                output += encode_text_frame("2", reasoning)
 
             # Standard Content
-            if hasattr(chunk, "content") and chunk.content:
-                logger.info(f"SSE content: {chunk.content[:50]}")
-                output += f'0:{_safe_json_dumps(chunk.content)}\n'
+            if content:
+                logger.debug(f"SSE content: {content[:50]}")
+                output += encode_text_frame("0", content)
 
             return output + debug_output
 
@@ -92,7 +147,7 @@ def convert_to_vercel_sse(event: dict) -> str:
             "args": tool_input,
         }
         logger.info(f"Tool Call Start: {tool_name} args={tool_input}")
-        return f'9:{_safe_json_dumps(tool_call_def)}\n' + debug_output
+        return f'9:{_fast_json_dumps(tool_call_def)}\n' + debug_output
 
     # 处理工具执行结果 (a: tool_result)
     elif kind == "on_tool_end":
@@ -106,8 +161,12 @@ def convert_to_vercel_sse(event: dict) -> str:
             "result": str(output),
         }
         logger.info(f"Tool Call End: {tool_name} result={output}")
-        return f'a:{_safe_json_dumps(tool_result)}\n' + debug_output
+        return f'a:{_fast_json_dumps(tool_result)}\n' + debug_output
+
+    # SQL 结果表格帧 (8: message annotations)
+    elif kind == "on_custom_event" and event.get("name") == SQL_TABLE_EVENT:
+        return f'8:{_fast_json_dumps([event.get("data")])}\n' + debug_output
 
-    # 其余事件全部透传，方便在测试页中查看完整链路
+    # 其余事件仅在调试模式下透传，方便在测试页中查看完整链路
     logger.debug(f"SSE passthrough event: {kind} name={event.get('name')}")
     return debug_output
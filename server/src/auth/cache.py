@@ -0,0 +1,215 @@
+"""
+认证缓存
+
+去掉鉴权热路径上的数据库访问:
+1. 用户缓存: 进程内 TTL 缓存，按 user_id 保存已加载的 User (只读使用)
+2. 撤销名单: Redis 键 auth:revoked:{jti}，过期时间与 Token exp 对齐，多进程共享；
+   本进程已知的撤销记录再缓存在内存中。Redis 不可用时回退查询 revoked_tokens 表，
+   保证撤销始终生效。
+
+撤销名单以数据库为准: 只有确认 Redis 与数据库一致时 (本进程同步成功、且同步标记键仍在)
+才信任 Redis 未命中。Redis 出错、恢复连接或丢失数据 (标记键消失) 后，未命中回退查库，
+并重新执行 warm_revoked 把未过期的撤销记录写回 Redis。
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+import redis.asyncio as aioredis
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from auth import models
+from auth.config import auth_settings
+from services.logging_service import logger
+
+
+REVOKED_KEY_PREFIX = "auth:revoked"
+# warm_revoked 成功后写入 (不过期)；Redis 重启丢数据或被清空时随之消失
+REVOKED_SYNCED_KEY = f"{REVOKED_KEY_PREFIX}:__synced__"
+# 本进程内存中保留的撤销记录上限，超出时清理已过期条目
+MAX_LOCAL_REVOKED = 100_000
+
+
+def _revoked_key(jti: str) -> str:
+    return f"{REVOKED_KEY_PREFIX}:{jti}"
+
+
+class AuthCache:
+    """用户 TTL 缓存 + 撤销名单"""
+
+    def __init__(
+        self,
+        user_ttl: float | None = None,
+        max_users: int | None = None,
+        redis_url: str | None = None,
+        redis_retry_interval: float | None = None,
+    ):
+        self.user_ttl = auth_settings.user_cache_ttl if user_ttl is None else user_ttl
+        self.max_users = auth_settings.user_cache_max_size if max_users is None else max_users
+        self.redis_url = redis_url or auth_settings.redis_url
+        self.redis_retry_interval = (
+            auth_settings.redis_retry_interval if redis_retry_interval is None else redis_retry_interval
+        )
+
+        self._users: "OrderedDict[uuid.UUID, tuple[float, models.User]]" = OrderedDict()
+        # jti -> Token exp (unix 秒)
+        self._revoked: dict[str, float] = {}
+        self._redis: Optional[aioredis.Redis] = None
+        self._redis_down_until = 0.0
+        # Redis 是否已确认与数据库一致，未确认时 Redis 未命中仍需查库
+        self._redis_synced = False
+        self._sync_lock = asyncio.Lock()
+
+    # ==================== 用户缓存 ====================
+
+    def get_user(self, user_id: uuid.UUID) -> Optional[models.User]:
+        item = self._users.get(user_id)
+        if item is None:
+            return None
+        expires_at, user = item
+        if expires_at < time.monotonic():
+            self._users.pop(user_id, None)
+            return None
+        self._users.move_to_end(user_id)
+        return user
+
+    def set_user(self, user: models.User) -> None:
+        """缓存用户的脱离会话副本，不影响调用方会话中的实例"""
+        if self.user_ttl <= 0:
+            return
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+        cached = models.User(**values)
+        make_transient_to_detached(cached)
+        self._users[user.id] = (time.monotonic() + self.user_ttl, cached)
+        self._users.move_to_end(user.id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def invalidate_user(self, user_id: uuid.UUID) -> None:
+        """用户信息变更 (停用、修改资料) 后调用"""
+        self._users.pop(user_id, None)
+
+    # ==================== 撤销名单 ====================
+
+    def _get_redis(self) -> Optional[aioredis.Redis]:
+        if time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        return self._redis
+
+    def _mark_redis_down(self, exc: Exception) -> None:
+        self._redis_down_until = time.monotonic() + self.redis_retry_interval
+        self._redis_synced = False
+        logger.warning(f"AuthCache redis unavailable, fallback to database for {self.redis_retry_interval}s: {exc}")
+
+    def _remember_revoked(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        if len(self._revoked) >= MAX_LOCAL_REVOKED:
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+        self._revoked[jti] = expires_at
+
+    async def mark_revoked(self, jti: str, expires_at: datetime) -> None:
+        """撤销 Token 后调用 (数据库记录已提交)"""
+        exp = expires_at.timestamp()
+        ttl = int(exp - time.time()) + 1
+        if ttl <= 0:
+            return
+        self._remember_revoked(jti, exp)
+
+        client = self._get_redis()
+        if client is None:
+            return
+        try:
+            await client.set(_revoked_key(jti), 1, ex=ttl)
+        except Exception as exc:
+            self._mark_redis_down(exc)
+
+    async def is_revoked(self, jti: str, db: AsyncSession) -> bool:
+        """检查 jti 是否已撤销: 内存 -> Redis -> 数据库"""
+        exp = self._revoked.get(jti)
+        if exp is not None:
+            if exp > time.time():
+                return True
+            self._revoked.pop(jti, None)
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                hit, synced = await client.mget(_revoked_key(jti), REVOKED_SYNCED_KEY)
+            except Exception as exc:
+                self._mark_redis_down(exc)
+            else:
+                if hit is not None:
+                    return True
+                if synced is not None and self._redis_synced:
+                    return False
+                # Redis 尚未确认与数据库一致: 本次以数据库为准，并重新同步
+                self._redis_synced = False
+                await self._resync(db)
+
+        stmt = select(models.RevokedToken).where(models.RevokedToken.jti == jti)
+        revoked = (await db.execute(stmt)).scalars().first()
+        if revoked is None:
+            return False
+        self._remember_revoked(jti, revoked.expires_at.timestamp())
+        return True
+
+    async def _resync(self, db: AsyncSession) -> None:
+        """Redis 恢复后重新同步撤销名单，已有同步进行中时跳过 (调用方继续查库)"""
+        if self._sync_lock.locked():
+            return
+        async with self._sync_lock:
+            if self._redis_synced:
+                return
+            try:
+                count = await self.warm_revoked(db)
+            except Exception as exc:
+                logger.warning(f"AuthCache failed to resync revoked tokens: {exc}")
+                return
+            if self._redis_synced:
+                logger.info(f"AuthCache resynced {count} revoked tokens to redis")
+
+    async def warm_revoked(self, db: AsyncSession) -> int:
+        """
+        把未过期的撤销记录同步到 Redis 并写入同步标记
+
+        启动时调用；Redis 出错恢复或丢失数据后由 is_revoked 自动重新执行。
+
+        Returns:
+            同步条数
+        """
+        client = self._get_redis()
+        if client is None:
+            return 0
+
+        stmt = select(models.RevokedToken.jti, models.RevokedToken.expires_at).where(
+            models.RevokedToken.expires_at > datetime.now(timezone.utc)
+        )
+        rows = (await db.execute(stmt)).all()
+        now = time.time()
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for jti, expires_at in rows:
+                    pipe.set(_revoked_key(jti), 1, ex=int(expires_at.timestamp() - now) + 1)
+                pipe.set(REVOKED_SYNCED_KEY, 1)
+                await pipe.execute()
+        except Exception as exc:
+            self._mark_redis_down(exc)
+            return 0
+        self._redis_synced = True
+        return len(rows)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+# 全局单例
+auth_cache = AuthCache()
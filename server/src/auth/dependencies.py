@@ -6,6 +6,8 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth import exceptions, models, security
+from auth.cache import auth_cache
+from auth.config import auth_settings
 from database import get_async_db
 
 bearer_scheme = HTTPBearer(auto_error=False)
@@ -42,14 +44,15 @@ async def verify_and_get_user(token: str, db: AsyncSession) -> models.User:
     except ValueError:
         raise exceptions.InvalidCredentials()
 
-    # 检查是否已撤销
-    if jti:
-        stmt = select(models.RevokedToken).where(models.RevokedToken.jti == jti)
-        result = await db.execute(stmt)
-        if result.scalars().first():
-            raise exceptions.InvalidCredentials()
+    # 检查是否已撤销 (内存 / Redis，Redis 不可用时查库)
+    if jti and await auth_cache.is_revoked(jti, db):
+        raise exceptions.InvalidCredentials()
+
+    # 获取用户 (优先进程内缓存)
+    user = auth_cache.get_user(user_id)
+    if user is not None:
+        return user
 
-    # 获取用户
     stmt = select(models.User).where(models.User.id == user_id)
     result = await db.execute(stmt)
     user = result.scalars().first()
@@ -57,6 +60,7 @@ async def verify_and_get_user(token: str, db: AsyncSession) -> models.User:
     if not user:
         raise exceptions.InvalidCredentials()
 
+    auth_cache.set_user(user)
     return user
 
 
@@ -69,6 +73,15 @@ async def get_current_active_user(
     return current_user
 
 
+async def get_current_admin_user(
+    current_user: Annotated[models.User, Depends(get_current_active_user)],
+) -> models.User:
+    """获取当前管理员用户 (auth.admin_phones 中配置的手机号)，用于运维接口"""
+    if current_user.phone not in auth_settings.admin_phones:
+        raise exceptions.PermissionDenied()
+    return current_user
+
+
 async def get_current_user_optional(
     credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(bearer_scheme)],
     db: Annotated[AsyncSession, Depends(get_async_db)],
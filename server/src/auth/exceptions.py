@@ -36,3 +36,11 @@ class UserNotFound(AuthException):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
+
+
+class PermissionDenied(AuthException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Permission denied",
+        )
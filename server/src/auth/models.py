@@ -31,7 +31,7 @@ class OTPCode(Base):
         DateTime(timezone=True), server_default=func.now(), comment="创建时间"
     )
     expires_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, comment="过期时间"
+        DateTime(timezone=True), index=True, nullable=False, comment="过期时间"
     )
     attempts: Mapped[int] = mapped_column(default=0, comment="尝试次数")
     used: Mapped[bool] = mapped_column(Boolean, default=False, comment="是否已使用")
@@ -46,5 +46,5 @@ class RevokedToken(Base):
         DateTime(timezone=True), server_default=func.now(), comment="撤销时间"
     )
     expires_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, comment="原Token过期时间"
+        DateTime(timezone=True), index=True, nullable=False, comment="原Token过期时间"
     )
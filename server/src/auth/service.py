@@ -5,6 +5,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth import exceptions, models, schemas, security, utils
+from auth.cache import auth_cache
 from auth.config import auth_settings
 from config import settings
 from services.sms_service import sms_service
@@ -126,6 +127,7 @@ class AuthService:
         )
         self.db.add(revoked)
         await self.db.commit()
+        await auth_cache.mark_revoked(jti, revoked.expires_at)
         
         # 签发新 Token
         new_access_token = security.create_access_token(user_id)
@@ -176,6 +178,7 @@ class AuthService:
         )
         self.db.add(revoked)
         await self.db.commit()
+        await auth_cache.mark_revoked(jti, revoked.expires_at)
         
     async def get_user_by_id(self, user_id: str) -> models.User | None:
         stmt = select(models.User).where(models.User.id == user_id)
@@ -0,0 +1,23 @@
+"""
+认证模块定时任务
+
+由 Celery Beat 按 settings.auth.purge_interval 调度
+"""
+
+from celery import shared_task
+
+from auth.maintenance import purge_expired_otp_codes, purge_expired_revoked_tokens
+
+
+@shared_task
+def purge_expired_auth_records() -> dict:
+    """
+    清理过期的撤销记录与验证码
+
+    Returns:
+        各表删除条数与吞吐
+    """
+    return {
+        "revoked_tokens": purge_expired_revoked_tokens().to_dict(),
+        "otp_codes": purge_expired_otp_codes().to_dict(),
+    }
@@ -0,0 +1,167 @@
+"""
+数据库连接预算
+
+每个 uvicorn worker 与每个 Celery prefork 子进程各自持有一套连接池，
+这里从一个总预算出发为本进程的每个池分配上限:
+
+    每进程预算 = (max_connections - reserved_connections) x 角色份额 / 该角色进程数
+    池上限 = 每进程预算 x 池权重 / 角色内权重和 (至少 1)
+
+同一数据库的引擎在进程内共享 (所有 PGVector 实例共用 kb 引擎)，
+各连接池注册探针，snapshot() 汇总使用数与饱和度。
+"""
+import os
+import sys
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from config import settings
+from services.logging_service import logger
+
+
+ROLE_API = "api"
+ROLE_WORKER = "worker"
+
+Probe = Callable[[], Dict[str, Any]]
+
+
+def _detect_role() -> str:
+    """未显式指定角色时的回退: Celery 命令启动的进程按 Worker 分配，其余按 API 分配"""
+    return ROLE_WORKER if os.path.basename(sys.argv[0] if sys.argv else "").startswith("celery") else ROLE_API
+
+
+def sqlalchemy_probe(engine: Any) -> Probe:
+    """SQLAlchemy QueuePool (同步或异步引擎)"""
+    def probe() -> Dict[str, Any]:
+        pool = engine.pool
+        return {
+            "max": pool.size(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+        }
+    return probe
+
+
+def psycopg_probe(pool: Any) -> Probe:
+    """psycopg_pool.ConnectionPool / AsyncConnectionPool"""
+    def probe() -> Dict[str, Any]:
+        stats = pool.get_stats()
+        size = stats.get("pool_size", 0)
+        available = stats.get("pool_available", 0)
+        return {
+            "max": pool.max_size,
+            "in_use": size - available,
+            "idle": available,
+            "waiting": stats.get("requests_waiting", 0),
+        }
+    return probe
+
+
+def asyncpg_probe(pool: Any) -> Probe:
+    """asyncpg.Pool"""
+    def probe() -> Dict[str, Any]:
+        idle = pool.get_idle_size()
+        return {"max": pool.get_max_size(), "in_use": pool.get_size() - idle, "idle": idle}
+    return probe
+
+
+class ConnectionBudget:
+    """进程内连接池分配与监控"""
+
+    def __init__(self, role: Optional[str] = None):
+        self._role = role
+        self._engines: Dict[str, AsyncEngine] = {}
+        self._probes: Dict[str, Probe] = {}
+        self._logged = False
+
+    @property
+    def role(self) -> str:
+        if self._role is None:
+            self._role = _detect_role()
+        return self._role
+
+    def set_role(self, role: str) -> None:
+        """显式指定角色 (须在创建连接池之前调用)"""
+        if role not in (ROLE_API, ROLE_WORKER):
+            raise ValueError(f"Unknown role: {role}")
+        if self._probes and role != self._role:
+            logger.warning(f"ConnectionBudget: role set to {role} after pools were created ({list(self._probes)})")
+        self._role = role
+
+    def per_process(self) -> int:
+        conf = settings.db_budget
+        available = max(conf.max_connections - conf.reserved_connections, 1)
+        if self.role == ROLE_WORKER:
+            share, processes = 1 - conf.api_share, conf.worker_processes
+        else:
+            share, processes = conf.api_share, conf.api_processes
+        return max(int(available * share) // max(processes, 1), 1)
+
+    def _weights(self) -> Dict[str, int]:
+        conf = settings.db_budget
+        return conf.worker_weights if self.role == ROLE_WORKER else conf.api_weights
+
+    def plan(self) -> Dict[str, int]:
+        """本进程各池的连接上限"""
+        weights = self._weights()
+        total = sum(weights.values()) or 1
+        budget = self.per_process()
+        return {name: max(budget * weight // total, 1) for name, weight in weights.items()}
+
+    def limit(self, name: str, cap: Optional[int] = None) -> int:
+        """
+        池的连接上限
+
+        Args:
+            name: 池名 (对应 db_budget 权重)
+            cap: 池自身配置的上限
+        """
+        plan = self.plan()
+        if not self._logged:
+            self._logged = True
+            logger.info(f"ConnectionBudget[{self.role}]: {self.per_process()} connections per process, plan={plan}")
+            if sum(plan.values()) > self.per_process():
+                logger.warning("ConnectionBudget: budget is smaller than one connection per pool")
+        size = plan.get(name, 1)
+        return min(size, cap) if cap else size
+
+    def engine_kwargs(self, name: str, cap: Optional[int] = None) -> Dict[str, Any]:
+        """SQLAlchemy create_engine 的连接池参数 (固定上限，不使用溢出连接)"""
+        return {"pool_size": self.limit(name, cap), "max_overflow": 0, "pool_pre_ping": True}
+
+    def register(self, name: str, probe: Probe) -> None:
+        self._probes[name] = probe
+
+    def async_engine(self, name: str, uri: str, cap: Optional[int] = None, **kwargs: Any) -> AsyncEngine:
+        """按池名共享的异步引擎"""
+        if name not in self._engines:
+            engine = create_async_engine(uri, **self.engine_kwargs(name, cap), **kwargs)
+            self._engines[name] = engine
+            self.register(name, sqlalchemy_probe(engine))
+        return self._engines[name]
+
+    async def dispose_async(self) -> None:
+        """
+        关闭共享异步引擎中的连接
+
+        asyncpg 连接绑定创建它的事件循环；Celery 任务每次 asyncio.run 结束前调用，
+        下个任务在新循环中重新建连。
+        """
+        for engine in self._engines.values():
+            await engine.dispose()
+
+    def snapshot(self) -> Dict[str, Any]:
+        pools = {}
+        for name, probe in self._probes.items():
+            try:
+                stats = probe()
+            except Exception as e:
+                pools[name] = {"error": str(e)}
+                continue
+            stats["saturation"] = round(stats["in_use"] / stats["max"], 3) if stats["max"] else 0.0
+            pools[name] = stats
+        return {"role": self.role, "budget": self.per_process(), "plan": self.plan(), "pools": pools}
+
+
+connection_budget = ConnectionBudget()
@@ -1,5 +1,6 @@
+import uuid
 from contextlib import asynccontextmanager, contextmanager
-from typing import AsyncGenerator, Generator, Optional
+from typing import Any, AsyncGenerator, Dict, Generator, Optional
 
 from sqlalchemy import Engine, create_engine
 from sqlalchemy.ext.asyncio import (
@@ -11,6 +12,7 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.orm import Session, sessionmaker
 
 from config import settings
+from connection_budget import connection_budget, sqlalchemy_probe
 
 # --- URI 适配 ---
 
@@ -37,37 +39,79 @@ def get_async_uri(uri: str) -> str:
     return uri
 
 
+# --- 连接参数 ---
+#
+# db.pgbouncer 开启时所有连接经 PgBouncer 事务池复用服务端连接:
+# - 不使用启动参数 options (PgBouncer 不支持)，时区由 pgbouncer.ini 的库参数设置；
+#   timezone/application_name 属于 PgBouncer 跟踪的参数，可继续作为 asyncpg server_settings
+# - PgBouncer 不支持预编译语句时关闭 asyncpg/psycopg 的语句缓存，
+#   SQLAlchemy 显式 prepare 的语句使用随机名称，避免不同客户端在同一服务端连接上重名
+
+def pgbouncer_without_prepared() -> bool:
+    return settings.db.pgbouncer and not settings.db.pgbouncer_prepared_statements
+
+
+def asyncpg_statement_args(cache_size: int = 100) -> Dict[str, Any]:
+    """原生 asyncpg 连接/连接池的语句缓存参数"""
+    return {"statement_cache_size": 0 if pgbouncer_without_prepared() else cache_size}
+
+
+def get_async_connect_args(uri: str) -> Dict[str, Any]:
+    """SQLAlchemy asyncpg 引擎的 connect_args"""
+    if not (uri.startswith("postgresql+asyncpg://") or uri.startswith("postgresql://")):
+        return {}
+    args: Dict[str, Any] = {"server_settings": {"timezone": settings.timezone}}
+    if pgbouncer_without_prepared():
+        args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4().hex}__",
+        )
+    return args
+
+
+def get_sync_connect_args(uri: str) -> Dict[str, Any]:
+    """SQLAlchemy psycopg 引擎的 connect_args"""
+    if not (uri.startswith("postgresql+psycopg://") or uri.startswith("postgresql://")):
+        return {}
+    if not settings.db.pgbouncer:
+        return {"options": f"-c timezone={settings.timezone}"}
+    return {"prepare_threshold": None} if pgbouncer_without_prepared() else {}
+
+
+def get_psycopg_pool_kwargs() -> Dict[str, Any]:
+    """psycopg_pool 连接参数 (LangGraph checkpointer/store)"""
+    kwargs: Dict[str, Any] = {"autocommit": True}
+    if pgbouncer_without_prepared():
+        kwargs["prepare_threshold"] = None
+    return kwargs
+
+
 # --- 全局实例配置 ---
 
 # 同步 Engine
 sync_uri = get_sync_uri(settings.db.uri_app)
-sync_connect_args = (
-    {"options": f"-c timezone={settings.timezone}"}
-    if sync_uri.startswith("postgresql+psycopg://")
-    else {}
-)
+sync_connect_args = get_sync_connect_args(sync_uri)
+# 连接池大小由 connection_budget 按进程角色分配，db.pool_size + db.max_overflow 为上限
+_pool_cap = settings.db.pool_size + settings.db.max_overflow
 engine = create_engine(
     sync_uri,
     echo=settings.db.echo,
-    pool_size=settings.db.pool_size,
-    max_overflow=settings.db.max_overflow,
     connect_args=sync_connect_args,
+    **connection_budget.engine_kwargs("app_sync", _pool_cap),
 )
+connection_budget.register("app_sync", sqlalchemy_probe(engine))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 # 异步 Engine
 async_uri = get_async_uri(settings.db.uri_app)
-async_connect_args = (
-    {"server_settings": {"timezone": settings.timezone}}
-    if async_uri.startswith("postgresql+asyncpg://")
-    else {}
-)
-async_engine = create_async_engine(
+async_connect_args = get_async_connect_args(async_uri)
+async_engine = connection_budget.async_engine(
+    "app",
     async_uri,
+    cap=_pool_cap,
     echo=settings.db.echo,
-    pool_size=settings.db.pool_size,
-    max_overflow=settings.db.max_overflow,
     connect_args=async_connect_args,
 )
 AsyncSessionLocal = async_sessionmaker(
@@ -84,10 +128,8 @@ def get_engine(url: Optional[str] = None) -> Engine:
     if url:
         if "sqlite" in url:
             connect_args = {"check_same_thread": False}
-        elif url.startswith("postgresql+psycopg://") or url.startswith("postgresql://"):
-            connect_args = {"options": f"-c timezone={settings.timezone}"}
         else:
-            connect_args = {}
+            connect_args = get_sync_connect_args(url)
         return create_engine(url, connect_args=connect_args)
     return engine
 
@@ -95,12 +137,7 @@ def get_engine(url: Optional[str] = None) -> Engine:
 def get_async_engine(url: Optional[str] = None) -> AsyncEngine:
     """获取异步引擎，支持自定义 URL"""
     if url:
-        connect_args = (
-            {"server_settings": {"timezone": settings.timezone}}
-            if url.startswith("postgresql+asyncpg://") or url.startswith("postgresql://")
-            else {}
-        )
-        return create_async_engine(url, connect_args=connect_args)
+        return create_async_engine(url, connect_args=get_async_connect_args(url))
     return async_engine
 
 
@@ -0,0 +1,30 @@
+"""
+知识库模块常量
+"""
+
+import enum
+
+
+class ProcessingStage(str, enum.Enum):
+    """文档处理阶段 (进度推送)"""
+    DOWNLOAD = "download"  # 从 RustFS 下载
+    CLONE = "clone"        # 内容重复，复制已有文档的向量
+    LOAD = "load"          # 解析文档
+    SPLIT = "split"        # 切分
+    EMBED = "embed"        # 分批向量化
+    INSERT = "insert"      # 写入向量库并更新文档记录
+    DONE = "done"          # 已完成
+    FAILED = "failed"      # 失败
+
+
+# 各阶段开始时的进度百分比，EMBED 阶段按批次在 EMBED ~ INSERT 之间推进
+STAGE_PERCENT = {
+    ProcessingStage.DOWNLOAD: 0,
+    ProcessingStage.CLONE: 30,
+    ProcessingStage.LOAD: 10,
+    ProcessingStage.SPLIT: 20,
+    ProcessingStage.EMBED: 30,
+    ProcessingStage.INSERT: 95,
+    ProcessingStage.DONE: 100,
+    ProcessingStage.FAILED: 100,
+}
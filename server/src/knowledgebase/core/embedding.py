@@ -1,48 +1,135 @@
 """
 FastEmbed 封装模块
 
-提供单例模式的 Embedding 模型管理
+提供单例模式的 Embedding 模型管理 (按运行时参数区分线程数、批大小、量化版本与执行提供者)，以及启动时预热
 """
 
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 import asyncio
+import time
 
+from fastembed import TextEmbedding
+from fastembed.common.model_description import ModelSource, PoolingType
 from langchain_community.embeddings import FastEmbedEmbeddings
+from langchain_core.embeddings import Embeddings
 
-from config import settings
+from config import EmbeddingProfile, settings
+from services.logging_service import logger
+from .embedding_client import RemoteEmbeddings
+
+
+WARMUP_TEXT = "warm up"
 
 
 class EmbeddingService:
-    """Embedding 服务 (单例模式)"""
+    """
+    Embedding 服务 (单例模式)
+    
+    模型实例按 (模型, 运行时参数) 缓存；进程启动时通过 use_profile 选择参数，
+    API 默认 kb.embedding_profile，Celery Worker 使用 kb.worker_embedding_profile。
+    启用 embedding_server 时返回 RemoteEmbeddings，由独立服务进程持有模型。
+    """
+    
+    _models: Dict[str, Embeddings] = {}
+    _profile: str = settings.kb.embedding_profile
+    # Embedding 服务进程自身强制本地加载
+    _local: bool = False
+    # 已注册到 FastEmbed 的量化模型名
+    _registered: set = set()
+    # 预热状态: model_name -> {"ready": bool, "seconds": float} / {"ready": False, "error": str}
+    _status: Dict[str, Dict[str, Any]] = {}
+    # 上次健康检查探测 Embedding 服务的时间 (monotonic)
+    _last_probe: Optional[float] = None
+    
+    @classmethod
+    def use_profile(cls, name: str) -> None:
+        """切换当前进程的运行时参数 (影响之后创建的模型实例)"""
+        if name not in settings.kb.embedding_profiles:
+            raise ValueError(f"Unknown embedding profile: {name}")
+        cls._profile = name
+    
+    @classmethod
+    def use_local(cls, profile: Optional[str] = None) -> None:
+        """本进程直接加载模型 (Embedding 服务进程调用)"""
+        cls._local = True
+        if profile:
+            cls.use_profile(profile)
     
-    _models: Dict[str, FastEmbedEmbeddings] = {}
+    @classmethod
+    def is_remote(cls) -> bool:
+        return settings.embedding_server.enabled and not cls._local
+    
+    @classmethod
+    def get_profile(cls, name: Optional[str] = None) -> EmbeddingProfile:
+        name = name or cls._profile
+        try:
+            return settings.kb.embedding_profiles[name]
+        except KeyError:
+            raise ValueError(f"Unknown embedding profile: {name}") from None
+    
+    @classmethod
+    def resolve_model(cls, model_name: str, profile: EmbeddingProfile) -> str:
+        """量化参数开启时返回已登记的 int8 模型名 (首次使用时注册到 FastEmbed)"""
+        if not profile.quantized:
+            return model_name
+        variant = settings.kb.quantized_models.get(model_name)
+        if variant is None:
+            raise ValueError(f"No quantized variant configured for {model_name}")
+        name = f"{model_name}-int8"
+        if name not in cls._registered:
+            TextEmbedding.add_custom_model(
+                model=name,
+                pooling=PoolingType(variant.pooling),
+                normalization=variant.normalization,
+                sources=ModelSource(hf=variant.hf_repo),
+                dim=variant.dim,
+                model_file=variant.model_file,
+            )
+            cls._registered.add(name)
+        return name
     
     @classmethod
-    def get_embeddings(cls, model_name: str = None) -> FastEmbedEmbeddings:
+    def get_embeddings(cls, model_name: str = None, profile: Optional[str] = None) -> Embeddings:
         """
         获取 Embedding 模型实例
         
         Args:
             model_name: 模型名称，默认使用配置中的模型
+            profile: 运行时参数名，默认使用当前进程的参数
             
         Returns:
-            FastEmbedEmbeddings 实例
+            FastEmbedEmbeddings 实例，启用 Embedding 服务时为 RemoteEmbeddings
         """
         if model_name is None:
             model_name = settings.kb.embedding_model
-            
-        if model_name not in cls._models:
-            cls._models[model_name] = FastEmbedEmbeddings(
-                model_name=model_name,
+        if cls.is_remote():
+            # 运行时参数由服务进程决定
+            key = f"{model_name}@remote"
+            if key not in cls._models:
+                cls._models[key] = RemoteEmbeddings(model_name)
+            return cls._models[key]
+        profile = profile or cls._profile
+        
+        key = f"{model_name}@{profile}"
+        if key not in cls._models:
+            conf = cls.get_profile(profile)
+            cls._models[key] = FastEmbedEmbeddings(
+                model_name=cls.resolve_model(model_name, conf),
                 cache_dir=settings.kb.embedding_cache_dir,
+                threads=conf.threads,
+                batch_size=conf.batch_size,
+                parallel=conf.parallel,
+                providers=conf.providers,
             )
-        return cls._models[model_name]
+            logger.info(f"Loaded embedding model {model_name} with profile {profile}: {conf.model_dump()}")
+        return cls._models[key]
     
     @classmethod
     async def embed_documents(
         cls, 
         texts: List[str], 
-        model_name: str = None
+        model_name: str = None,
+        profile: Optional[str] = None,
     ) -> List[List[float]]:
         """
         异步批量生成文档向量
@@ -50,25 +137,98 @@ class EmbeddingService:
         Args:
             texts: 文本列表
             model_name: 模型名称
+            profile: 运行时参数名
             
         Returns:
             向量列表
         """
-        embeddings = cls.get_embeddings(model_name)
+        embeddings = cls.get_embeddings(model_name, profile)
+        if isinstance(embeddings, RemoteEmbeddings):
+            return await embeddings.aembed_documents(texts)
         # 使用 asyncio.to_thread 避免阻塞事件循环
         return await asyncio.to_thread(embeddings.embed_documents, texts)
     
     @classmethod
-    async def embed_query(cls, text: str, model_name: str = None) -> List[float]:
+    async def embed_query(cls, text: str, model_name: str = None, profile: Optional[str] = None) -> List[float]:
         """
         异步生成查询向量
         
         Args:
             text: 查询文本
             model_name: 模型名称
+            profile: 运行时参数名
             
         Returns:
             向量
         """
-        embeddings = cls.get_embeddings(model_name)
+        embeddings = cls.get_embeddings(model_name, profile)
+        if isinstance(embeddings, RemoteEmbeddings):
+            return await embeddings.aembed_query(text)
         return await asyncio.to_thread(embeddings.embed_query, text)
+    
+    @staticmethod
+    def configured_models() -> List[str]:
+        """需要预热的模型"""
+        return settings.kb.warmup_models or [settings.kb.embedding_model]
+    
+    @classmethod
+    def warm_up(cls, model_names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        预热模型 (同步，在线程或 Worker 初始化时调用)
+        
+        加载模型 (含下载校验) 并各执行一次文档/查询向量化，让 ONNX Runtime 提前分配缓冲，
+        避免首个请求承担数秒的冷启动。单个模型失败只记录状态，不中断启动。
+        启用 Embedding 服务时只经由服务往返一次，相当于连通性检查。
+        
+        Returns:
+            各模型预热状态
+        """
+        for name in model_names or cls.configured_models():
+            started = time.perf_counter()
+            try:
+                embeddings = cls.get_embeddings(name)
+                embeddings.embed_documents([WARMUP_TEXT])
+                embeddings.embed_query(WARMUP_TEXT)
+            except Exception as e:
+                logger.exception(f"Embedding warm-up failed for {name}")
+                cls._status[name] = {"ready": False, "error": str(e)}
+                continue
+            elapsed = time.perf_counter() - started
+            cls._status[name] = {"ready": True, "seconds": round(elapsed, 2)}
+            logger.info(f"Embedding model {name} warmed up in {elapsed:.2f}s")
+        return dict(cls._status)
+    
+    @classmethod
+    async def probe_remote(cls) -> None:
+        """
+        健康检查时重新探测未就绪的 Embedding 服务 (服务可能晚于 API 启动)
+        
+        按 probe_interval 限频，以 ping_timeout 短超时 ping，服务挂起时不阻塞探针。
+        """
+        conf = settings.embedding_server
+        now = time.monotonic()
+        if cls._last_probe is not None and now - cls._last_probe < conf.probe_interval:
+            return
+        cls._last_probe = now
+        for name in cls.configured_models():
+            if cls._status.get(name, {}).get("ready"):
+                continue
+            started = time.perf_counter()
+            try:
+                await RemoteEmbeddings(name, timeout=conf.ping_timeout).aping()
+            except Exception as e:
+                logger.warning(f"Embedding server not ready for {name}: {e!r}")
+                cls._status[name] = {"ready": False, "error": repr(e)}
+                continue
+            elapsed = time.perf_counter() - started
+            cls._status[name] = {"ready": True, "seconds": round(elapsed, 2)}
+            logger.info(f"Embedding server ready for {name}")
+    
+    @classmethod
+    def readiness(cls) -> Dict[str, Any]:
+        """健康检查: 所有需要预热的模型均已就绪时 ready 为 True"""
+        models = {name: cls._status.get(name, {"ready": False}) for name in cls.configured_models()}
+        return {
+            "ready": all(item["ready"] for item in models.values()),
+            "models": models,
+        }
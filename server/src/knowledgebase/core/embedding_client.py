@@ -0,0 +1,106 @@
+"""
+独立 Embedding 服务客户端
+
+实现 LangChain Embeddings 接口，PGVector 与 EmbeddingService 的调用方无需感知模型在哪个进程。
+每次调用使用独立连接 (本机 Socket 建连开销远小于推理耗时)，不与事件循环或线程绑定，
+可在 Celery 每任务一次的 asyncio.run 中安全使用。
+"""
+import asyncio
+import socket
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from config import settings
+from .embedding_protocol import (
+    OP_DOCUMENTS,
+    OP_PING,
+    OP_QUERY,
+    RESPONSE_HEADER,
+    STATUS_OK,
+    EmbeddingProtocolError,
+    decode_vectors,
+    encode_request,
+    parse_response_header,
+    recv_exactly,
+)
+
+
+def _use_unix_socket() -> bool:
+    return bool(settings.embedding_server.socket_path) and hasattr(socket, "AF_UNIX")
+
+
+class RemoteEmbeddings(Embeddings):
+    """通过本机 Embedding 服务生成向量"""
+
+    def __init__(self, model_name: str, timeout: Optional[float] = None):
+        self.model_name = model_name
+        self.timeout = settings.embedding_server.timeout if timeout is None else timeout
+
+    # ---------- 同步 ----------
+
+    def _connect(self) -> socket.socket:
+        conf = settings.embedding_server
+        if _use_unix_socket():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(conf.socket_path)
+            return sock
+        return socket.create_connection((conf.host, conf.port), timeout=self.timeout)
+
+    def _call(self, op: int, texts: List[str]) -> List[List[float]]:
+        with self._connect() as sock:
+            sock.sendall(encode_request(op, self.model_name, texts))
+            status, rows, dim = parse_response_header(recv_exactly(sock, RESPONSE_HEADER.size))
+            if status != STATUS_OK:
+                raise EmbeddingProtocolError(recv_exactly(sock, rows).decode("utf-8"))
+            return decode_vectors(rows, dim, recv_exactly(sock, rows * dim * 4)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._call(OP_DOCUMENTS, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(OP_QUERY, [text])[0]
+
+    def ping(self) -> None:
+        """确认服务可用且已加载模型"""
+        self._call(OP_PING, [])
+
+    # ---------- 异步 ----------
+
+    async def _acall(self, op: int, texts: List[str]) -> List[List[float]]:
+        conf = settings.embedding_server
+        if _use_unix_socket():
+            connect = asyncio.open_unix_connection(conf.socket_path)
+        else:
+            connect = asyncio.open_connection(conf.host, conf.port)
+        reader, writer = await asyncio.wait_for(connect, self.timeout)
+        try:
+            writer.write(encode_request(op, self.model_name, texts))
+            await writer.drain()
+
+            async def read(size: int) -> bytes:
+                try:
+                    return await asyncio.wait_for(reader.readexactly(size), self.timeout)
+                except asyncio.IncompleteReadError:
+                    raise EmbeddingProtocolError("connection closed by embedding server") from None
+
+            status, rows, dim = parse_response_header(await read(RESPONSE_HEADER.size))
+            if status != STATUS_OK:
+                raise EmbeddingProtocolError((await read(rows)).decode("utf-8"))
+            return decode_vectors(rows, dim, await read(rows * dim * 4)).tolist()
+        finally:
+            writer.close()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return await self._acall(OP_DOCUMENTS, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._acall(OP_QUERY, [text]))[0]
+
+    async def aping(self) -> None:
+        await self._acall(OP_PING, [])
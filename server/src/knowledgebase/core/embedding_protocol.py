@@ -0,0 +1,88 @@
+"""
+Embedding 服务二进制协议
+
+请求: 头部 <BHI (操作, 模型名字节数, 文本数) + 模型名 + 每条文本 (<I 字节数 + UTF-8)
+响应: 头部 <BII (状态, 行数, 维度) + 行数 x 维度 个 little-endian float32；
+      状态为 STATUS_ERROR 时行数为错误信息字节数，随后是 UTF-8 错误信息
+
+同一连接上可连续发送多个请求，按顺序应答。
+"""
+import socket
+import struct
+from typing import Awaitable, Callable, List, Tuple
+
+import numpy as np
+
+
+OP_DOCUMENTS = 1
+OP_QUERY = 2
+OP_PING = 3
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+REQUEST_HEADER = struct.Struct("<BHI")
+RESPONSE_HEADER = struct.Struct("<BII")
+_LENGTH = struct.Struct("<I")
+_DTYPE = np.dtype("<f4")
+
+
+class EmbeddingProtocolError(RuntimeError):
+    """Embedding 服务返回错误或数据不完整"""
+
+
+def encode_request(op: int, model: str, texts: List[str]) -> bytes:
+    name = model.encode("utf-8")
+    parts = [REQUEST_HEADER.pack(op, len(name), len(texts)), name]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+async def read_request(
+    read_exactly: Callable[[int], Awaitable[bytes]],
+    max_bytes: int,
+) -> Tuple[int, str, List[str]]:
+    op, name_len, count = REQUEST_HEADER.unpack(await read_exactly(REQUEST_HEADER.size))
+    model = (await read_exactly(name_len)).decode("utf-8")
+    texts, total = [], 0
+    for _ in range(count):
+        (length,) = _LENGTH.unpack(await read_exactly(_LENGTH.size))
+        total += length
+        if total > max_bytes:
+            raise EmbeddingProtocolError(f"request exceeds {max_bytes} bytes")
+        texts.append((await read_exactly(length)).decode("utf-8"))
+    return op, model, texts
+
+
+def encode_vectors(vectors: np.ndarray) -> bytes:
+    matrix = np.ascontiguousarray(vectors, dtype=_DTYPE)
+    rows, dim = matrix.shape if matrix.ndim == 2 else (0, 0)
+    return RESPONSE_HEADER.pack(STATUS_OK, rows, dim) + matrix.tobytes()
+
+
+def encode_error(message: str) -> bytes:
+    data = message.encode("utf-8")
+    return RESPONSE_HEADER.pack(STATUS_ERROR, len(data), 0) + data
+
+
+def parse_response_header(header: bytes) -> Tuple[int, int, int]:
+    """返回 (状态, 行数, 维度)；调用方据此读取 rows*dim*4 字节向量或 rows 字节错误信息"""
+    return RESPONSE_HEADER.unpack(header)
+
+
+def decode_vectors(rows: int, dim: int, body: bytes) -> np.ndarray:
+    return np.frombuffer(body, dtype=_DTYPE).reshape(rows, dim)
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    """阻塞读取 size 字节"""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise EmbeddingProtocolError("connection closed by embedding server")
+        buf.extend(chunk)
+    return bytes(buf)
@@ -0,0 +1,171 @@
+"""
+独立 Embedding 服务
+
+单进程持有 ONNX 模型，API 与 Celery Worker 通过 Unix Socket / TCP 以二进制协议请求向量，
+避免每个进程各加载一份模型；来自不同进程的请求按 (模型, 类型) 合并成批后推理。
+
+执行命令:
+    cd server/src
+    uv run python -m knowledgebase.core.embedding_server
+
+启用 embedding_server.enabled 后 EmbeddingService 自动改为客户端。
+"""
+import asyncio
+import os
+import socket
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from services.logging_service import init_logging, logger
+from .embedding import EmbeddingService
+from .embedding_protocol import (
+    OP_DOCUMENTS,
+    OP_PING,
+    OP_QUERY,
+    EmbeddingProtocolError,
+    encode_error,
+    encode_vectors,
+    read_request,
+)
+
+
+class _Batcher:
+    """合并同一模型、同一类型的并发请求"""
+
+    def __init__(self, model: str, op: int, max_batch: int, max_wait: float):
+        self.model = model
+        self.op = op
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: asyncio.Queue[Tuple[List[str], asyncio.Future]] = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def submit(self, texts: List[str]) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        embeddings = EmbeddingService.get_embeddings(self.model)
+        if self.op == OP_QUERY:
+            return np.asarray([embeddings.embed_query(text) for text in texts], dtype=np.float32)
+        return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        pending = [await self.queue.get()]
+        total = len(pending[0][0])
+        deadline = loop.time() + self.max_wait
+        while total < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            total += len(item[0])
+        return pending
+
+    async def _run(self) -> None:
+        while True:
+            pending = await self._collect()
+            texts = [text for item, _ in pending for text in item]
+            try:
+                vectors = await asyncio.to_thread(self._embed, texts)
+            except Exception as e:
+                logger.exception(f"EmbeddingServer: batch of {len(texts)} failed for {self.model}")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            offset = 0
+            for item, future in pending:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item)])
+                offset += len(item)
+
+
+class EmbeddingServer:
+    """Embedding 服务进程"""
+
+    def __init__(self):
+        self.conf = settings.embedding_server
+        self._batchers: Dict[Tuple[str, int], _Batcher] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def _batcher(self, model: str, op: int) -> _Batcher:
+        key = (model, op)
+        if key not in self._batchers:
+            self._batchers[key] = _Batcher(model, op, self.conf.max_batch, self.conf.max_wait_ms / 1000)
+        return self._batchers[key]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    op, model, texts = await read_request(reader.readexactly, self.conf.max_request_bytes)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    if op == OP_PING:
+                        # 确保默认模型已加载
+                        await asyncio.to_thread(EmbeddingService.get_embeddings, model or None)
+                        vectors = np.zeros((0, 0), dtype=np.float32)
+                    elif op in (OP_DOCUMENTS, OP_QUERY):
+                        vectors = await self._batcher(model, op).submit(texts)
+                    else:
+                        raise EmbeddingProtocolError(f"unknown op {op}")
+                    writer.write(encode_vectors(vectors))
+                except Exception as e:
+                    writer.write(encode_error(str(e)))
+                await writer.drain()
+        except EmbeddingProtocolError as e:
+            # 请求格式错误时连接状态已不可恢复
+            logger.warning(f"EmbeddingServer: {e}")
+            writer.write(encode_error(str(e)))
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        if self.conf.socket_path and hasattr(socket, "AF_UNIX"):
+            if os.path.exists(self.conf.socket_path):
+                os.unlink(self.conf.socket_path)
+            self._server = await asyncio.start_unix_server(self._handle, path=self.conf.socket_path)
+            address = self.conf.socket_path
+        else:
+            self._server = await asyncio.start_server(self._handle, self.conf.host, self.conf.port)
+            address = f"{self.conf.host}:{self.conf.port}"
+        logger.info(f"EmbeddingServer listening on {address}")
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for batcher in self._batchers.values():
+            batcher.task.cancel()
+        self._batchers.clear()
+
+    async def serve_forever(self) -> None:
+        EmbeddingService.use_local(profile=self.conf.profile)
+        # 先加载模型再开始监听，客户端连接成功即可用
+        await asyncio.to_thread(EmbeddingService.warm_up)
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+
+def main() -> None:
+    init_logging()
+    asyncio.run(EmbeddingServer().serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+最大边际相关性 (MMR) 重排
+
+候选向量一次性归一化为矩阵，相关度为一次矩阵-向量乘；
+每选中一条只计算它与剩余候选的相似度并更新“与已选集合的最大相似度”，
+复杂度 O(k x fetch_k x dim)，不构造完整的相似度矩阵，fetch_k=500、512 维时约 1ms。
+
+在 MMR 之外支持:
+- 近重复去重: 与已选结果相似度超过阈值的候选直接排除 (如内容去重后被复制到多个知识库的同一分块)
+- 单文档上限: 每个 doc_id 最多选中 max_per_doc 条，避免一篇长文档占满结果
+"""
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """按行归一化为单位向量 (零向量保持为零)"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(
+    query: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    doc_ids: Optional[Sequence[Optional[str]]] = None,
+    max_per_doc: Optional[int] = None,
+    dedup_threshold: Optional[float] = None,
+) -> List[int]:
+    """
+    按 MMR 从候选中选出至多 k 条
+
+    Args:
+        query: 查询向量
+        candidates: 候选向量矩阵 (n x dim)
+        k: 选出数量
+        lambda_mult: 相关性权重，1 为纯相似度排序，0 为最大多样性
+        doc_ids: 每个候选所属文档，配合 max_per_doc 使用
+        max_per_doc: 单文档最多选中条数，None 不限制
+        dedup_threshold: 与已选结果的余弦相似度不低于该值时视为重复，None 不去重
+
+    Returns:
+        选中候选的下标，按选中顺序排列
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+
+    matrix = normalize_rows(candidates)
+    relevance = matrix @ normalize_rows(query)[0]
+    # 与已选集合的最大相似度，未选任何结果前为 0 (首条按相关度选)
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    limit_docs = doc_ids is not None and max_per_doc is not None
+    if limit_docs:
+        _, doc_codes = np.unique(np.asarray([str(d) for d in doc_ids]), return_inverse=True)
+        per_doc = np.zeros(doc_codes.max() + 1, dtype=np.int32)
+
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+
+        if limit_docs:
+            code = doc_codes[best]
+            per_doc[code] += 1
+            if per_doc[code] >= max_per_doc:
+                available &= doc_codes != code
+
+        similarity = matrix @ matrix[best]
+        np.maximum(redundancy, similarity, out=redundancy)
+        if dedup_threshold is not None:
+            available &= similarity < dedup_threshold
+    return selected
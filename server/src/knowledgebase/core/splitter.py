@@ -56,6 +56,7 @@ class DocumentSplitter:
             return MarkdownTextSplitter(
                 chunk_size=chunk_size,
                 chunk_overlap=chunk_overlap,
+                add_start_index=True,
             )
         
         # 默认使用中文优化的递归切分器
@@ -65,6 +66,7 @@ class DocumentSplitter:
             separators=cls.CHINESE_SEPARATORS,
             keep_separator=True,
             length_function=len,
+            add_start_index=True,  # 供 RAG 上下文打包合并相邻切片
         )
     
     @classmethod
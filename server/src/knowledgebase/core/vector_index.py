@@ -0,0 +1,134 @@
+"""
+向量 ANN 索引 (量化存储)
+
+langchain_pg_embedding.embedding 保存全精度 float32 向量，索引建在量化表达式上:
+- halfvec: HNSW (embedding::halfvec(dim)) halfvec_cosine_ops，索引约为全精度的一半
+- binary:  HNSW (binary_quantize(embedding)::bit(dim)) bit_hamming_ops，索引约为 1/32
+
+查询先按量化距离经索引取回 fetch_k x rerank_factor 条，再用全精度向量精确重排。
+不同模型的向量共用一张表，索引按维度建为部分索引 (WHERE vector_dims(embedding) = dim)，
+查询条件中的维度须为字面量，规划器才能匹配部分索引。
+
+需要 pgvector >= 0.7 (halfvec 与 binary_quantize)。
+"""
+
+from typing import Any, List, Optional
+
+from pgvector.sqlalchemy import BIT, HALFVEC, VECTOR
+from sqlalchemy import cast, func, literal_column, select
+
+from config import settings
+
+
+TABLE = "langchain_pg_embedding"
+MODE_NONE = "none"
+MODE_HALFVEC = "halfvec"
+MODE_BINARY = "binary"
+QUANTIZED_MODES = (MODE_HALFVEC, MODE_BINARY)
+MAX_EF_SEARCH = 1000  # pgvector hnsw.ef_search 上限，超出部分依赖 hnsw.iterative_scan
+
+_INDEX_EXPRESSIONS = {
+    MODE_HALFVEC: "(embedding::halfvec({dim})) halfvec_cosine_ops",
+    MODE_BINARY: "((binary_quantize(embedding))::bit({dim})) bit_hamming_ops",
+}
+
+
+def index_name(mode: str, dim: int) -> str:
+    return f"ix_{TABLE}_{mode}_{int(dim)}"
+
+
+def create_index_sql(
+    mode: str,
+    dim: int,
+    m: int = 16,
+    ef_construction: int = 64,
+    concurrently: bool = True,
+) -> str:
+    """创建量化 HNSW 部分索引的 DDL"""
+    if mode not in _INDEX_EXPRESSIONS:
+        raise ValueError(f"Unknown vector index mode: {mode}")
+    dim = int(dim)
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {index_name(mode, dim)} "
+        f"ON {TABLE} USING hnsw ({_INDEX_EXPRESSIONS[mode].format(dim=dim)}) "
+        f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)}) "
+        f"WHERE vector_dims(embedding) = {dim}"
+    )
+
+
+def drop_index_sql(mode: str, dim: int, concurrently: bool = True) -> str:
+    return f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {index_name(mode, dim)}"
+
+
+def ef_search(fetch_k: int, rerank_factor: Optional[int] = None) -> int:
+    """HNSW 搜索宽度: 不小于内层取回的候选数 fetch_k x rerank_factor，否则索引扫描凑不满 LIMIT"""
+    conf = settings.kb
+    rerank_factor = rerank_factor or conf.rerank_factor
+    return min(max(int(conf.hnsw_ef_search), fetch_k * rerank_factor), MAX_EF_SEARCH)
+
+
+def session_settings(fetch_k: int, rerank_factor: Optional[int] = None) -> List[str]:
+    """查询所在事务的 HNSW 参数 (SET LOCAL，兼容事务池)"""
+    conf = settings.kb
+    statements = [f"SET LOCAL hnsw.ef_search = {ef_search(fetch_k, rerank_factor)}"]
+    if conf.hnsw_iterative_scan:
+        # pgvector >= 0.8: 带过滤条件时继续扫描索引直到凑满 LIMIT
+        statements.append(f"SET LOCAL hnsw.iterative_scan = {conf.hnsw_iterative_scan}")
+    return statements
+
+
+def ann_distance(embedding: Any, mode: str, query_vector: List[float]) -> Any:
+    """与索引表达式一致的量化距离"""
+    dim = len(query_vector)
+    if mode == MODE_HALFVEC:
+        return cast(embedding, HALFVEC(dim)).cosine_distance(cast(query_vector, HALFVEC(dim)))
+    if mode == MODE_BINARY:
+        query = func.binary_quantize(cast(query_vector, VECTOR(dim)))
+        return cast(func.binary_quantize(embedding), BIT(dim)).hamming_distance(cast(query, BIT(dim)))
+    raise ValueError(f"Unknown vector index mode: {mode}")
+
+
+def candidate_query(
+    store: Any,
+    query_vector: List[float],
+    fetch_k: int,
+    where: List[Any],
+    mode: Optional[str] = None,
+    rerank_factor: Optional[int] = None,
+) -> Any:
+    """
+    候选查询: 返回 id, document, cmetadata, embedding, distance (全精度余弦距离) 升序
+
+    Args:
+        store: PGVector EmbeddingStore 模型
+        query_vector: 查询向量
+        fetch_k: 返回条数
+        where: 过滤条件 (集合、元数据)
+        mode: 索引模式，默认 kb.vector_index
+        rerank_factor: 量化索引候选倍数，默认 kb.rerank_factor
+    """
+    mode = mode or settings.kb.vector_index
+    if mode == MODE_NONE:
+        distance = store.embedding.cosine_distance(query_vector).label("distance")
+        return (
+            select(store.id, store.document, store.cmetadata, store.embedding, distance)
+            .where(*where)
+            .order_by(distance)
+            .limit(fetch_k)
+        )
+
+    rerank_factor = rerank_factor or settings.kb.rerank_factor
+    dim_matches = func.vector_dims(store.embedding) == literal_column(str(len(query_vector)))
+    candidates = (
+        select(store.id, store.document, store.cmetadata, store.embedding)
+        .where(*where, dim_matches)
+        .order_by(ann_distance(store.embedding, mode, query_vector))
+        .limit(fetch_k * rerank_factor)
+        .subquery("candidates")
+    )
+    distance = candidates.c.embedding.cosine_distance(query_vector).label("distance")
+    return (
+        select(candidates.c.id, candidates.c.document, candidates.c.cmetadata, candidates.c.embedding, distance)
+        .order_by(distance)
+        .limit(fetch_k)
+    )
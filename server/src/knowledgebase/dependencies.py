@@ -13,6 +13,7 @@ from auth.dependencies import get_current_active_user
 from auth.models import User
 from knowledgebase.models import KnowledgeBase
 from knowledgebase.services.kb_service import KBService
+from knowledgebase.services.reembed import ReembedService
 from knowledgebase import exceptions
 
 
@@ -23,6 +24,13 @@ async def get_kb_service(
     return KBService(db)
 
 
+async def get_reembed_service(
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+) -> ReembedService:
+    """获取重新向量化服务"""
+    return ReembedService(db)
+
+
 async def get_kb_with_permission(
     kb_id: UUID,
     current_user: Annotated[User, Depends(get_current_active_user)],
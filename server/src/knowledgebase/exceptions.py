@@ -28,6 +28,13 @@ class DocumentNotFound(AppError):
         super().__init__(ErrorCode.NOT_FOUND, msg, status_code=404)
 
 
+class ReembedJobNotFound(AppError):
+    """重新向量化任务不存在"""
+    
+    def __init__(self, kb_id: str):
+        super().__init__(ErrorCode.NOT_FOUND, f"No re-embedding job for knowledge base {kb_id}", status_code=404)
+
+
 class KBPermissionDenied(AppError):
     """无权访问知识库"""
     
@@ -51,3 +58,25 @@ class DocumentProcessingError(AppError):
     
     def __init__(self, msg: str):
         super().__init__(ErrorCode.UNKNOWN_ERROR, msg, status_code=500)
+
+
+class DocumentUploadIncomplete(AppError):
+    """直传文件尚未上传到存储"""
+    
+    def __init__(self, doc_id: str):
+        super().__init__(
+            ErrorCode.VALIDATION_ERROR,
+            f"File for document {doc_id} has not been uploaded",
+            status_code=400
+        )
+
+
+class DocumentTooLarge(AppError):
+    """文件超过上传大小上限"""
+    
+    def __init__(self, size: int, limit: int):
+        super().__init__(
+            ErrorCode.VALIDATION_ERROR,
+            f"File size {size} exceeds the upload limit of {limit} bytes",
+            status_code=413
+        )
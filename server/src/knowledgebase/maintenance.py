@@ -0,0 +1,66 @@
+"""
+知识库数据清理
+
+直传上传 (init) 先创建 UPLOADING 文档，客户端未调用 complete 时记录与已上传的对象会一直残留。
+超过上传 URL 有效期 + 宽限期仍为 UPLOADING 的文档按批删除，删除的记录对应的对象随后从存储删除。
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, ContextManager, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from auth.maintenance import PurgeStats
+from config import settings
+from database import session_scope
+from knowledgebase.models import DocumentStatus, KBDocument
+from rustfs.client import RustfsClient, get_rustfs_client
+from services.logging_service import logger
+
+
+def purge_abandoned_uploads(
+    batch_size: Optional[int] = None,
+    now: Optional[datetime] = None,
+    session_factory: Callable[[], ContextManager[Session]] = session_scope,
+    client: Optional[RustfsClient] = None,
+) -> PurgeStats:
+    """删除过期仍未完成直传的文档及其对象 (DELETE 条件含状态，与 complete 并发时不会误删)"""
+    conf = settings.kb
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(
+        seconds=conf.presign_upload_expires + conf.upload_purge_grace
+    )
+    batch_size = batch_size or conf.upload_purge_batch_size
+    client = client or get_rustfs_client()
+
+    stats = PurgeStats(table=KBDocument.__tablename__)
+    started = time.perf_counter()
+    while True:
+        with session_factory() as db:
+            abandoned = (
+                select(KBDocument.id)
+                .where(KBDocument.status == DocumentStatus.UPLOADING, KBDocument.created_at < cutoff)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            file_keys = db.execute(
+                delete(KBDocument)
+                .where(KBDocument.id.in_(abandoned), KBDocument.status == DocumentStatus.UPLOADING)
+                .returning(KBDocument.file_key)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+        for file_key in file_keys:
+            try:
+                client.delete(file_key)
+            except Exception as e:
+                logger.warning(f"Failed to delete abandoned upload {file_key}: {e}")
+        stats.batches += 1
+        stats.deleted += len(file_keys)
+        if len(file_keys) < batch_size:
+            break
+    stats.elapsed = time.perf_counter() - started
+    logger.info(
+        f"Purged {stats.deleted} abandoned uploads in {stats.batches} batches, "
+        f"{stats.elapsed:.2f}s ({stats.rows_per_second:.0f} rows/s)"
+    )
+    return stats
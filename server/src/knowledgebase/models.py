@@ -4,11 +4,13 @@
 Tables:
 - knowledge_base: 知识库表
 - kb_document: 文档表
+- kb_blobs: 按内容哈希去重的文件对象
+- kb_reembed_jobs: 更换 Embedding 模型的重新向量化任务
 """
 
 import uuid
 import enum
-from sqlalchemy import String, Text, Integer, BigInteger, ForeignKey, Enum as SAEnum
+from sqlalchemy import String, Text, Integer, BigInteger, ForeignKey, Index, Enum as SAEnum, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -23,14 +25,35 @@ class KBVisibility(str, enum.Enum):
 
 class DocumentStatus(str, enum.Enum):
     """文档处理状态"""
+    UPLOADING = "uploading"    # 等待客户端直传
     PROCESSING = "processing"  # 处理中
     INDEXED = "indexed"        # 已索引
     FAILED = "failed"          # 失败
 
 
+class ReembedStatus(str, enum.Enum):
+    """重新向量化任务状态"""
+    PENDING = "pending"      # 等待 Worker 执行
+    RUNNING = "running"      # 回填中
+    PAUSED = "paused"        # 已暂停 (保留进度，仍双写)
+    COMPLETED = "completed"  # 已切换到新模型
+    FAILED = "failed"        # 失败 (可从检查点恢复)
+    CANCELLED = "cancelled"  # 已取消
+
+
+# 进行中的任务: 新写入的向量需要同时写入目标集合
+ACTIVE_REEMBED_STATUSES = (
+    ReembedStatus.PENDING, ReembedStatus.RUNNING, ReembedStatus.PAUSED, ReembedStatus.FAILED,
+)
+
+
 class KnowledgeBase(Base, TimestampMixin):
     """知识库表"""
     __tablename__ = "knowledge_bases"
+    __table_args__ = (
+        # 游标分页: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_knowledge_bases_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -60,6 +83,13 @@ class KnowledgeBase(Base, TimestampMixin):
         nullable=False, 
         comment="Embedding模型"
     )
+    vector_collection: Mapped[str] = mapped_column(
+        String(100),
+        default="axiom_kb_vectors",
+        server_default="axiom_kb_vectors",
+        nullable=False,
+        comment="PGVector集合名称"
+    )
     chunk_size: Mapped[int] = mapped_column(
         Integer, default=500, nullable=False, comment="切片大小"
     )
@@ -76,6 +106,10 @@ class KnowledgeBase(Base, TimestampMixin):
 class KBDocument(Base, TimestampMixin):
     """知识库文档表"""
     __tablename__ = "kb_documents"
+    __table_args__ = (
+        # 游标分页: WHERE kb_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_kb_documents_kb_id_created_at_id", "kb_id", "created_at", "id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -112,8 +146,95 @@ class KBDocument(Base, TimestampMixin):
     chunk_count: Mapped[int] = mapped_column(
         Integer, default=0, nullable=False, comment="切片数量"
     )
+    content_hash: Mapped[str | None] = mapped_column(
+        String(64), nullable=True, index=True, comment="文件内容SHA-256"
+    )
     
     # Relationships
     knowledge_base: Mapped["KnowledgeBase"] = relationship(
         "KnowledgeBase", back_populates="documents"
     )
+
+
+class KBBlob(Base, TimestampMixin):
+    """
+    知识库文件对象表 (内容寻址)
+
+    相同内容的文件在 RustFS 中只保存一份，ref_count 为引用该对象的文档数，
+    归零时删除对象。
+    """
+    __tablename__ = "kb_blobs"
+
+    sha256: Mapped[str] = mapped_column(
+        String(64), primary_key=True, comment="文件内容SHA-256"
+    )
+    file_key: Mapped[str] = mapped_column(
+        String(500), nullable=False, comment="RustFS文件路径"
+    )
+    file_size: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, comment="文件大小(字节)"
+    )
+    ref_count: Mapped[int] = mapped_column(
+        Integer, default=1, nullable=False, comment="引用文档数"
+    )
+
+
+class KBReembedJob(Base, TimestampMixin):
+    """
+    重新向量化任务表
+
+    把知识库已有分块 (复用存储的切片文本，不重新解析文件) 用新模型写入目标集合，
+    cursor 为已处理的最后一个向量 ID (按 ID 顺序分批)，任务中断后从此处继续；
+    回填完成后在同一事务中切换知识库的 embedding_model 与 vector_collection。
+    """
+    __tablename__ = "kb_reembed_jobs"
+    __table_args__ = (
+        # 每个知识库同时只有一个进行中的任务
+        Index(
+            "uq_kb_reembed_jobs_kb_id_active",
+            "kb_id",
+            unique=True,
+            postgresql_where=text("status IN ('PENDING', 'RUNNING', 'PAUSED', 'FAILED')"),
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    kb_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("knowledge_bases.id", ondelete="CASCADE"),
+        index=True,
+        nullable=False,
+        comment="所属知识库ID"
+    )
+    source_model: Mapped[str] = mapped_column(
+        String(100), nullable=False, comment="原Embedding模型"
+    )
+    source_collection: Mapped[str] = mapped_column(
+        String(100), nullable=False, comment="原PGVector集合"
+    )
+    target_model: Mapped[str] = mapped_column(
+        String(100), nullable=False, comment="目标Embedding模型"
+    )
+    target_collection: Mapped[str] = mapped_column(
+        String(100), nullable=False, comment="目标PGVector集合"
+    )
+    status: Mapped[ReembedStatus] = mapped_column(
+        SAEnum(ReembedStatus, native_enum=False),
+        default=ReembedStatus.PENDING,
+        nullable=False,
+        comment="任务状态"
+    )
+    cursor: Mapped[str | None] = mapped_column(
+        String(64), nullable=True, comment="已处理的最后一个向量ID"
+    )
+    processed: Mapped[int] = mapped_column(
+        Integer, default=0, nullable=False, comment="已回填分块数"
+    )
+    total: Mapped[int] = mapped_column(
+        Integer, default=0, nullable=False, comment="开始时的分块总数"
+    )
+    error_msg: Mapped[str | None] = mapped_column(
+        Text, nullable=True, comment="错误信息"
+    )
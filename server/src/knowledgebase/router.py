@@ -4,25 +4,29 @@
 全部使用 POST 方法
 """
 
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_async_db
+from config import settings
+from database import get_async_db, async_session_scope
 from auth.dependencies import get_current_active_user
 from auth.models import User
 from response import success
 from services.logging_service import logger
 from knowledgebase import schemas, exceptions
 from knowledgebase.models import KnowledgeBase, DocumentStatus
-from knowledgebase.dependencies import get_kb_service, get_kb_with_permission, get_kb_owner_only
+from knowledgebase.dependencies import get_kb_service, get_kb_with_permission, get_kb_owner_only, get_reembed_service
 from knowledgebase.services.kb_service import KBService
+from knowledgebase.services.reembed import ReembedService
+from knowledgebase.services.progress import subscribe_progress, format_sse_event
 from knowledgebase.services.vector_store import VectorStoreService
 from knowledgebase.core.loader import DocumentLoader
 from knowledgebase.worker.celery_app import celery_app  # 确保 Celery app 初始化
-from knowledgebase.worker.tasks import process_document, retry_failed_document
+from knowledgebase.worker.tasks import process_document, reembed_knowledge_base, retry_failed_document
 from rustfs.client import get_rustfs_client
 
 
@@ -90,16 +94,21 @@ async def delete_knowledge_base(
 async def list_knowledge_bases(
     current_user: Annotated[User, Depends(get_current_active_user)],
     service: Annotated[KBService, Depends(get_kb_service)],
-    skip: int = Query(0, ge=0, description="跳过数量"),
+    skip: int = Query(0, ge=0, description="跳过数量 (兼容参数，优先使用 cursor)"),
     limit: int = Query(20, ge=1, le=100, description="返回数量"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    include_total: bool = Query(True, description="是否返回总数"),
 ):
     """
     获取用户的知识库列表
     """
-    items, total = await service.get_user_kbs(current_user.id, skip, limit)
+    items, total, next_cursor = await service.get_user_kbs(
+        current_user.id, skip, limit, cursor=cursor, include_total=include_total
+    )
     return success({
         "items": [schemas.KBResponse.model_validate(kb) for kb in items],
         "total": total,
+        "next_cursor": next_cursor,
     })
 
 
@@ -109,7 +118,7 @@ async def list_knowledge_bases(
     "/{kb_id}/document/upload",
     response_model=schemas.Response[schemas.DocumentUploadResponse],
     summary="上传文档",
-    description="上传文档到知识库，触发异步处理任务",
+    description="上传文档到知识库，触发异步处理任务，文件超过大小上限时返回 413",
 )
 async def upload_document(
     kb_id: UUID,
@@ -143,10 +152,6 @@ async def upload_document(
     
     logger.info(f"Uploading document '{doc_title}' to kb {kb_id}")
     
-    # 读取文件内容
-    content = await file.read()
-    file_size = len(content)
-    
     # 上传到 RustFS
     # 路径格式: kb/{kb_id}/{doc_id}_{filename}
     import uuid as uuid_module
@@ -154,20 +159,28 @@ async def upload_document(
     safe_filename = filename.replace(" ", "_").replace("/", "_")
     file_key = f"kb/{kb_id}/{doc_id}_{safe_filename}"
     
+    # 流式分片上传，在线程中执行，内存占用不超过一个分片
     client = get_rustfs_client()
     content_type = file.content_type or "application/octet-stream"
-    client.upload(file_key, content, content_type)
+    result = await client.aupload_stream(file_key, file.file, content_type)
+    file_size = result["size"]
+    if file_size > settings.kb.max_upload_size:
+        await client.adelete(file_key)
+        raise exceptions.DocumentTooLarge(file_size, settings.kb.max_upload_size)
     
     logger.info(f"File uploaded to RustFS: {file_key}")
     
-    # 创建文档记录
+    # 创建文档记录 (按内容哈希登记对象，相同内容复用已有对象)
     doc = await service.create_document(
         kb_id=kb_id,
         title=doc_title,
         file_key=file_key,
         file_type=file_type,
         file_size=file_size,
+        content_hash=result["sha256"],
     )
+    if doc.file_key != file_key:
+        await client.adelete(file_key)
     
     # 触发异步处理任务
     task = process_document.delay(str(doc.id))
@@ -182,6 +195,106 @@ async def upload_document(
     })
 
 
+@router.post(
+    "/{kb_id}/document/upload/init",
+    response_model=schemas.Response[schemas.DocumentUploadInitResponse],
+    summary="初始化直传上传",
+    description="创建待上传文档并返回预签名 PUT 地址，文件内容由客户端直接上传到存储",
+)
+async def init_document_upload(
+    kb_id: UUID,
+    data: schemas.DocumentUploadInitRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    service: Annotated[KBService, Depends(get_kb_service)],
+):
+    """
+    直传上传第一步
+    
+    1. 调用本接口获取 upload_url
+    2. 客户端 PUT 文件内容到 upload_url
+    3. 调用 /document/upload/complete 触发处理
+    """
+    kb = await service.get_kb(kb_id)
+    if kb is None or kb.user_id != current_user.id:
+        raise exceptions.KBNotFound(str(kb_id))
+    
+    filename = data.filename
+    if not DocumentLoader.is_supported(filename):
+        raise exceptions.UnsupportedFileType(filename.rsplit(".", 1)[-1] if "." in filename else "unknown")
+    
+    import uuid as uuid_module
+    doc_id = uuid_module.uuid4()
+    safe_filename = filename.replace(" ", "_").replace("/", "_")
+    file_key = f"kb/{kb_id}/{doc_id}_{safe_filename}"
+    
+    expires_in = settings.kb.presign_upload_expires
+    upload_url = await get_rustfs_client().apresign(file_key, method="PUT", expires=expires_in)
+    
+    doc = await service.create_document(
+        kb_id=kb_id,
+        title=data.title or filename,
+        file_key=file_key,
+        file_type=DocumentLoader.get_file_type(filename),
+        file_size=0,
+        status=DocumentStatus.UPLOADING,
+        doc_id=doc_id,
+    )
+    
+    return success({
+        "doc_id": doc.id,
+        "file_key": file_key,
+        "upload_url": upload_url,
+        "expires_in": expires_in,
+    })
+
+
+@router.post(
+    "/document/upload/complete",
+    response_model=schemas.Response[schemas.DocumentUploadResponse],
+    summary="完成直传上传",
+    description="确认文件已上传到存储并触发异步处理任务，文件超过大小上限时删除该文档并返回 413",
+)
+async def complete_document_upload(
+    data: schemas.DocumentUploadCompleteRequest,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    service: Annotated[KBService, Depends(get_kb_service)],
+):
+    """
+    直传上传第二步
+    
+    - **doc_id**: init 接口返回的文档ID
+    """
+    doc = await service.get_document(data.doc_id)
+    if doc is None:
+        raise exceptions.DocumentNotFound(str(data.doc_id))
+    
+    kb = await service.get_kb(doc.kb_id)
+    if kb is None or kb.user_id != current_user.id:
+        raise exceptions.KBPermissionDenied()
+    
+    # 重复调用时不再重复触发任务
+    if doc.status != DocumentStatus.UPLOADING:
+        return success(schemas.DocumentUploadResponse.model_validate(doc, from_attributes=True))
+    
+    try:
+        stat = await get_rustfs_client().astat(doc.file_key)
+    except FileNotFoundError:
+        raise exceptions.DocumentUploadIncomplete(str(doc.id))
+    
+    # 预签名 PUT 无法限制大小，完成时校验，超限则删除对象与文档记录
+    if stat["size"] > settings.kb.max_upload_size:
+        await get_rustfs_client().adelete(doc.file_key)
+        await service.delete_document(doc.id, current_user.id)
+        raise exceptions.DocumentTooLarge(stat["size"], settings.kb.max_upload_size)
+    
+    doc = await service.mark_uploaded(doc, stat["size"])
+    
+    task = process_document.delay(str(doc.id))
+    logger.info(f"Document processing task {task.id} queued for doc {doc.id}")
+    
+    return success(schemas.DocumentUploadResponse.model_validate(doc, from_attributes=True))
+
+
 @router.post(
     "/document/delete",
     summary="删除文档",
@@ -215,27 +328,70 @@ async def list_documents(
     kb_id: UUID,
     current_user: Annotated[User, Depends(get_current_active_user)],
     service: Annotated[KBService, Depends(get_kb_service)],
-    skip: int = Query(0, ge=0, description="跳过数量"),
+    skip: int = Query(0, ge=0, description="跳过数量 (兼容参数，优先使用 cursor)"),
     limit: int = Query(20, ge=1, le=100, description="返回数量"),
     status: Optional[DocumentStatus] = Query(None, description="状态过滤"),
+    cursor: Optional[str] = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    include_total: bool = Query(True, description="是否返回总数，轮询时可关闭"),
 ):
     """
     获取知识库的文档列表
     
-    可用于前端轮询文档处理进度
+    处理进度请订阅 /{kb_id}/documents/progress，避免轮询本接口
     """
     # 验证知识库权限
     kb = await service.get_kb_with_permission(kb_id, current_user.id)
     if kb is None:
         raise exceptions.KBNotFound(str(kb_id))
     
-    items, total = await service.get_kb_documents(kb_id, skip, limit, status)
+    items, total, next_cursor = await service.get_kb_documents(
+        kb_id, skip, limit, status, cursor=cursor, include_total=include_total
+    )
     return success({
         "items": [schemas.DocumentResponse.model_validate(doc) for doc in items],
         "total": total,
+        "next_cursor": next_cursor,
     })
 
 
+@router.get(
+    "/{kb_id}/documents/progress",
+    summary="订阅文档处理进度",
+    description="SSE 推送知识库内文档的处理阶段与进度，替代轮询文档列表",
+)
+async def stream_document_progress(
+    kb_id: UUID,
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+):
+    """
+    订阅文档处理进度 (text/event-stream)
+    
+    - **event: progress**: {doc_id, stage, percent, ...}，stage 为 download/load/split/embed/insert/done/failed
+    - 无进度时定期发送注释心跳
+    """
+    # 权限检查使用短会话，避免流式响应期间占用数据库连接
+    async with async_session_scope() as db:
+        kb = await KBService(db).get_kb_with_permission(kb_id, current_user.id)
+    if kb is None:
+        raise exceptions.KBNotFound(str(kb_id))
+    
+    async def event_stream():
+        async for message in subscribe_progress(kb_id):
+            if await request.is_disconnected():
+                break
+            if message is None:
+                yield ": ping\n\n"
+            else:
+                yield format_sse_event("progress", message)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post(
     "/document/retry",
     summary="重试文档处理",
@@ -313,6 +469,7 @@ async def search_test(
         k=data.top_k,
         score_threshold=data.score_threshold,
         embedding_model=kb.embedding_model,
+        collection_name=kb.vector_collection,
     )
     
     # 格式化结果
@@ -331,3 +488,79 @@ async def search_test(
         "results": search_results,
         "total": len(search_results),
     })
+
+
+# ==================== 更换 Embedding 模型 ====================
+
+@router.post(
+    "/{kb_id}/reembed/start",
+    response_model=schemas.Response[schemas.ReembedJobResponse],
+    summary="更换 Embedding 模型",
+    description="后台用新模型重新向量化已有分块，完成后自动切换，期间检索仍使用原模型",
+)
+async def start_reembed(
+    data: schemas.ReembedStartRequest,
+    kb: Annotated[KnowledgeBase, Depends(get_kb_owner_only)],
+    service: Annotated[ReembedService, Depends(get_reembed_service)],
+):
+    """
+    更换 Embedding 模型
+    
+    - 复用已存储的切片文本，不重新下载和解析文件
+    - 期间新上传的文档同时写入新旧两个集合
+    - 进度按批保存，可暂停/恢复
+    
+    - **embedding_model**: 目标 Embedding 模型，须为配置中预热的模型 (kb.warmup_models)
+    """
+    job = await service.start(kb, data.embedding_model)
+    task = reembed_knowledge_base.delay(str(job.id))
+    logger.info(f"Re-embedding task {task.id} queued for job {job.id}")
+    return success(schemas.ReembedJobResponse.model_validate(job))
+
+
+@router.post(
+    "/{kb_id}/reembed/status",
+    response_model=schemas.Response[schemas.ReembedJobResponse],
+    summary="重新向量化进度",
+    description="获取知识库最近一次更换模型任务的状态与进度",
+)
+async def get_reembed_status(
+    kb: Annotated[KnowledgeBase, Depends(get_kb_owner_only)],
+    service: Annotated[ReembedService, Depends(get_reembed_service)],
+):
+    """获取最近一次任务"""
+    job = await service.get_latest_job(kb.id)
+    if job is None:
+        raise exceptions.ReembedJobNotFound(str(kb.id))
+    return success(schemas.ReembedJobResponse.model_validate(job))
+
+
+@router.post(
+    "/{kb_id}/reembed/{action}",
+    response_model=schemas.Response[schemas.ReembedJobResponse],
+    summary="控制重新向量化任务",
+    description="pause: 暂停回填; resume: 从检查点继续; cancel: 取消并删除已写入的新向量",
+)
+async def control_reembed(
+    action: Literal["pause", "resume", "cancel"],
+    kb: Annotated[KnowledgeBase, Depends(get_kb_owner_only)],
+    service: Annotated[ReembedService, Depends(get_reembed_service)],
+):
+    """
+    控制进行中的任务
+    
+    - **action**: pause / resume / cancel
+    """
+    job = await service.get_active_job(kb.id)
+    if job is None:
+        raise exceptions.ReembedJobNotFound(str(kb.id))
+    
+    if action == "pause":
+        job = await service.pause(job)
+    elif action == "resume":
+        job = await service.resume(job)
+        task = reembed_knowledge_base.delay(str(job.id))
+        logger.info(f"Re-embedding task {task.id} queued for job {job.id}")
+    else:
+        job = await service.cancel(job)
+    return success(schemas.ReembedJobResponse.model_validate(job))
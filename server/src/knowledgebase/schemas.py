@@ -10,7 +10,7 @@ from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, Field
 
-from knowledgebase.models import KBVisibility, DocumentStatus
+from knowledgebase.models import KBVisibility, DocumentStatus, ReembedStatus
 
 
 # ==================== 通用响应 ====================
@@ -54,6 +54,7 @@ class KBResponse(BaseModel):
     description: Optional[str] = None
     visibility: KBVisibility
     embedding_model: str
+    vector_collection: str
     chunk_size: int
     chunk_overlap: int
     created_at: datetime
@@ -65,7 +66,8 @@ class KBResponse(BaseModel):
 class KBListResponse(BaseModel):
     """知识库列表响应"""
     items: list[KBResponse]
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[str] = Field(None, description="下一页游标，为空表示没有更多")
 
 
 # ==================== 文档相关 ====================
@@ -79,6 +81,25 @@ class DocumentUploadResponse(BaseModel):
     file_size: int = Field(..., description="文件大小")
 
 
+class DocumentUploadInitRequest(BaseModel):
+    """直传上传初始化请求"""
+    filename: str = Field(..., min_length=1, max_length=255, description="文件名")
+    title: Optional[str] = Field(None, description="文档标题，默认使用文件名")
+
+
+class DocumentUploadInitResponse(BaseModel):
+    """直传上传初始化响应"""
+    doc_id: UUID = Field(..., description="文档ID")
+    file_key: str = Field(..., description="存储路径")
+    upload_url: str = Field(..., description="预签名 PUT 地址，客户端直接上传文件内容")
+    expires_in: int = Field(..., description="上传地址有效期 (秒)")
+
+
+class DocumentUploadCompleteRequest(BaseModel):
+    """直传上传完成请求"""
+    doc_id: UUID = Field(..., description="文档ID")
+
+
 class DocumentDeleteRequest(BaseModel):
     """删除文档请求"""
     doc_id: UUID = Field(..., description="文档ID")
@@ -109,7 +130,8 @@ class DocumentResponse(BaseModel):
 class DocumentListResponse(BaseModel):
     """文档列表响应"""
     items: list[DocumentResponse]
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[str] = Field(None, description="下一页游标，为空表示没有更多")
 
 
 # ==================== 检索相关 ====================
@@ -133,3 +155,27 @@ class SearchTestResponse(BaseModel):
     query: str
     results: list[SearchResultItem]
     total: int
+
+
+# ==================== 更换 Embedding 模型 ====================
+
+class ReembedStartRequest(BaseModel):
+    """更换 Embedding 模型请求"""
+    embedding_model: str = Field(..., min_length=1, max_length=100, description="目标 Embedding 模型")
+
+
+class ReembedJobResponse(BaseModel):
+    """重新向量化任务响应"""
+    id: UUID
+    kb_id: UUID
+    source_model: str
+    target_model: str
+    target_collection: str
+    status: ReembedStatus
+    processed: int = Field(..., description="已回填分块数")
+    total: int = Field(..., description="开始时的分块总数")
+    error_msg: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -4,22 +4,27 @@
 处理知识库和文档的 CRUD 操作
 """
 
-from typing import List, Optional, Tuple
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
 from uuid import UUID
 
-from sqlalchemy import select, func, or_
+from sqlalchemy import delete, select, func, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from knowledgebase.config import KBConfig
-from knowledgebase.models import KnowledgeBase, KBDocument, DocumentStatus, KBVisibility
+from knowledgebase.models import KnowledgeBase, KBBlob, KBDocument, DocumentStatus, KBVisibility
 from knowledgebase.schemas import (
     KBCreateRequest, 
     KBUpdateRequest, 
     KBResponse, 
     DocumentResponse,
 )
+from knowledgebase.services.reembed import ReembedService
 from knowledgebase.services.vector_store import VectorStoreService
+from pagination import apply_keyset, split_keyset_page
+from rustfs.client import get_rustfs_client
 from services.logging_service import logger
 
 
@@ -95,37 +100,46 @@ class KBService:
         user_id: UUID,
         skip: int = 0,
         limit: int = 20,
-    ) -> Tuple[List[KnowledgeBase], int]:
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+    ) -> Tuple[List[KnowledgeBase], Optional[int], Optional[str]]:
         """
         获取用户的知识库列表
         
+        按 (created_at, id) 倒序做游标分页，传入 cursor 时忽略 skip
+        
         Args:
             user_id: 用户ID
-            skip: 跳过数量
+            skip: 跳过数量 (兼容旧客户端)
             limit: 返回数量
+            cursor: 上一页返回的游标
+            include_total: 是否统计总数
             
         Returns:
-            (知识库列表, 总数)
+            (知识库列表, 总数或 None, 下一页游标或 None)
         """
-        # 查询总数
-        count_result = await self.db.execute(
-            select(func.count()).select_from(KnowledgeBase).where(
-                KnowledgeBase.user_id == user_id
+        total = None
+        if include_total:
+            count_result = await self.db.execute(
+                select(func.count()).select_from(KnowledgeBase).where(
+                    KnowledgeBase.user_id == user_id
+                )
             )
+            total = count_result.scalar()
+        
+        query = apply_keyset(
+            select(KnowledgeBase).where(KnowledgeBase.user_id == user_id),
+            KnowledgeBase.created_at,
+            KnowledgeBase.id,
+            cursor,
+            limit,
         )
-        total = count_result.scalar()
+        if skip and not cursor:
+            query = query.offset(skip)
+        result = await self.db.execute(query)
+        items, next_cursor = split_keyset_page(result.scalars().all(), limit)
         
-        # 查询列表
-        result = await self.db.execute(
-            select(KnowledgeBase)
-            .where(KnowledgeBase.user_id == user_id)
-            .order_by(KnowledgeBase.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-        )
-        items = list(result.scalars().all())
-        
-        return items, total
+        return items, total, next_cursor
 
     async def get_accessible_kb_ids(self, user_id: UUID) -> list[UUID]:
         """
@@ -144,6 +158,25 @@ class KBService:
             )
         )
         return list(result.scalars().all())
+
+    async def get_accessible_kb_scopes(self, user_id: UUID) -> Dict[Tuple[str, str], List[UUID]]:
+        """
+        按 (Embedding 模型, 向量集合) 分组的可检索知识库
+
+        范围与 get_accessible_kb_ids 相同；更换过模型的知识库需要用各自的模型检索。
+        """
+        result = await self.db.execute(
+            select(KnowledgeBase.id, KnowledgeBase.embedding_model, KnowledgeBase.vector_collection).where(
+                or_(
+                    KnowledgeBase.user_id == user_id,
+                    KnowledgeBase.visibility == KBVisibility.PUBLIC,
+                )
+            )
+        )
+        scopes: Dict[Tuple[str, str], List[UUID]] = {}
+        for kb_id, model, collection in result.all():
+            scopes.setdefault((model, collection), []).append(kb_id)
+        return scopes
     
     async def update_kb(
         self, 
@@ -176,12 +209,22 @@ class KBService:
         if kb is None or kb.user_id != user_id:
             return False
         
-        # 删除向量存储中的数据
-        await VectorStoreService.delete_by_kb_id(kb_id, kb.embedding_model)
+        # 删除向量存储中的数据 (更换模型期间包含目标集合)
+        for collection, model in await ReembedService(self.db).vector_collections(kb):
+            await VectorStoreService.delete_by_kb_id(kb_id, model, collection)
+        
+        # 释放文档引用的文件对象
+        hashes = await self.db.execute(
+            select(KBDocument.content_hash).where(
+                KBDocument.kb_id == kb_id, KBDocument.content_hash.is_not(None)
+            )
+        )
+        orphan_keys = await self.release_blobs(hashes.scalars().all())
         
         # 删除数据库记录 (级联删除文档)
         await self.db.delete(kb)
         await self.db.commit()
+        await self._delete_objects(orphan_keys)
         
         logger.info(f"Deleted knowledge base {kb_id}")
         return True
@@ -195,6 +238,9 @@ class KBService:
         file_key: str,
         file_type: str,
         file_size: int,
+        status: DocumentStatus = DocumentStatus.PROCESSING,
+        doc_id: Optional[UUID] = None,
+        content_hash: Optional[str] = None,
     ) -> KBDocument:
         """
         创建文档记录
@@ -205,18 +251,28 @@ class KBService:
             file_key: RustFS 文件路径
             file_type: 文件类型
             file_size: 文件大小
+            status: 初始状态 (直传流程为 UPLOADING)
+            doc_id: 指定文档ID (与 file_key 保持一致)
+            content_hash: 文件 SHA-256，传入时登记到 kb_blobs，
+                已存在相同内容时 file_key 指向已有对象 (调用方负责删除刚上传的副本)
             
         Returns:
             KBDocument 实例
         """
+        if content_hash is not None:
+            file_key = await self.acquire_blob(content_hash, file_key, file_size)
+        
         doc = KBDocument(
             kb_id=kb_id,
             title=title,
             file_key=file_key,
             file_type=file_type,
             file_size=file_size,
-            status=DocumentStatus.PROCESSING,
+            status=status,
+            content_hash=content_hash,
         )
+        if doc_id is not None:
+            doc.id = doc_id
         
         self.db.add(doc)
         await self.db.commit()
@@ -238,41 +294,49 @@ class KBService:
         skip: int = 0,
         limit: int = 20,
         status: Optional[DocumentStatus] = None,
-    ) -> Tuple[List[KBDocument], int]:
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+    ) -> Tuple[List[KBDocument], Optional[int], Optional[str]]:
         """
         获取知识库的文档列表
         
+        按 (created_at, id) 倒序做游标分页，传入 cursor 时忽略 skip
+        
         Args:
             kb_id: 知识库ID
-            skip: 跳过数量
+            skip: 跳过数量 (兼容旧客户端)
             limit: 返回数量
             status: 状态过滤
+            cursor: 上一页返回的游标
+            include_total: 是否统计总数 (轮询时可关闭)
             
         Returns:
-            (文档列表, 总数)
+            (文档列表, 总数或 None, 下一页游标或 None)
         """
-        query = select(KBDocument).where(KBDocument.kb_id == kb_id)
-        count_query = select(func.count()).select_from(KBDocument).where(
-            KBDocument.kb_id == kb_id
-        )
-        
+        conditions = [KBDocument.kb_id == kb_id]
         if status is not None:
-            query = query.where(KBDocument.status == status)
-            count_query = count_query.where(KBDocument.status == status)
+            conditions.append(KBDocument.status == status)
         
-        # 总数
-        count_result = await self.db.execute(count_query)
-        total = count_result.scalar()
-        
-        # 列表
-        result = await self.db.execute(
-            query.order_by(KBDocument.created_at.desc())
-            .offset(skip)
-            .limit(limit)
+        total = None
+        if include_total:
+            count_result = await self.db.execute(
+                select(func.count()).select_from(KBDocument).where(*conditions)
+            )
+            total = count_result.scalar()
+        
+        query = apply_keyset(
+            select(KBDocument).where(*conditions),
+            KBDocument.created_at,
+            KBDocument.id,
+            cursor,
+            limit,
         )
-        items = list(result.scalars().all())
+        if skip and not cursor:
+            query = query.offset(skip)
+        result = await self.db.execute(query)
+        items, next_cursor = split_keyset_page(result.scalars().all(), limit)
         
-        return items, total
+        return items, total, next_cursor
     
     async def update_document_status(
         self,
@@ -298,6 +362,16 @@ class KBService:
         logger.info(f"Updated document {doc_id} status to {status}")
         return doc
     
+    async def mark_uploaded(self, doc: KBDocument, file_size: int) -> KBDocument:
+        """直传完成: 记录实际大小并进入处理状态"""
+        doc.file_size = file_size
+        doc.status = DocumentStatus.PROCESSING
+        await self.db.commit()
+        await self.db.refresh(doc)
+        
+        logger.info(f"Document {doc.id} uploaded directly, size={file_size}")
+        return doc
+    
     async def delete_document(self, doc_id: UUID, user_id: UUID) -> bool:
         """
         删除文档
@@ -313,16 +387,104 @@ class KBService:
         if kb is None or kb.user_id != user_id:
             return False
         
-        # 删除向量
-        await VectorStoreService.delete_by_doc_id(doc_id, kb.embedding_model)
+        # 删除向量 (更换模型期间包含目标集合)
+        for collection, model in await ReembedService(self.db).vector_collections(kb):
+            await VectorStoreService.delete_by_doc_id(doc_id, model, collection)
         
-        # 删除数据库记录
+        # 删除数据库记录并释放文件对象引用
+        orphan_keys = await self.release_blobs([doc.content_hash] if doc.content_hash else [])
         await self.db.delete(doc)
         await self.db.commit()
+        await self._delete_objects(orphan_keys)
         
         logger.info(f"Deleted document {doc_id}")
         return True
     
+    # ==================== 内容去重 ====================
+    
+    async def acquire_blob(self, sha256: str, file_key: str, file_size: int) -> str:
+        """
+        登记文件对象引用 (不提交，随调用方事务生效)
+        
+        INSERT ... ON CONFLICT DO UPDATE 原子地新增或累加引用计数，
+        并发上传相同内容时只有一方的对象成为规范对象。
+        
+        Returns:
+            规范对象的 file_key，与传入值不同时说明内容已存在
+        """
+        insert = sqlite.insert if self.db.bind.dialect.name == "sqlite" else postgresql.insert
+        stmt = insert(KBBlob).values(sha256=sha256, file_key=file_key, file_size=file_size, ref_count=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["sha256"],
+            set_={"ref_count": KBBlob.__table__.c.ref_count + 1},
+        ).returning(KBBlob.file_key)
+        canonical_key = (await self.db.execute(stmt)).scalar_one()
+        if canonical_key != file_key:
+            logger.info(f"Deduplicated upload {file_key} -> {canonical_key}")
+        return canonical_key
+    
+    async def release_blobs(self, hashes: Iterable[str]) -> List[str]:
+        """
+        释放文件对象引用 (不提交)
+        
+        Returns:
+            引用归零、需在提交后从 RustFS 删除的 file_key 列表
+        """
+        orphan_keys = []
+        for sha256, count in Counter(hashes).items():
+            result = await self.db.execute(
+                update(KBBlob)
+                .where(KBBlob.sha256 == sha256)
+                .values(ref_count=KBBlob.ref_count - count)
+                .returning(KBBlob.ref_count, KBBlob.file_key)
+            )
+            row = result.first()
+            if row is not None and row.ref_count <= 0:
+                await self.db.execute(delete(KBBlob).where(KBBlob.sha256 == sha256))
+                orphan_keys.append(row.file_key)
+        return orphan_keys
+    
+    @staticmethod
+    async def _delete_objects(file_keys: List[str]) -> None:
+        """删除已无引用的 RustFS 对象 (失败只记录日志)"""
+        client = get_rustfs_client()
+        for file_key in file_keys:
+            try:
+                await client.adelete(file_key)
+            except Exception as e:
+                logger.warning(f"Failed to delete orphan object {file_key}: {e}")
+    
+    async def find_indexed_duplicate(
+        self,
+        doc: KBDocument,
+        kb: KnowledgeBase,
+    ) -> Optional[KBDocument]:
+        """
+        查找内容相同且可复用向量的已索引文档
+        
+        切片结果取决于文件类型与切分参数，向量取决于 Embedding 模型，
+        这些都一致且在同一集合中时才能直接复制向量。
+        """
+        if doc.content_hash is None:
+            return None
+        result = await self.db.execute(
+            select(KBDocument)
+            .join(KnowledgeBase, KnowledgeBase.id == KBDocument.kb_id)
+            .where(
+                KBDocument.content_hash == doc.content_hash,
+                KBDocument.id != doc.id,
+                KBDocument.status == DocumentStatus.INDEXED,
+                KBDocument.file_type == doc.file_type,
+                KnowledgeBase.embedding_model == kb.embedding_model,
+                KnowledgeBase.vector_collection == kb.vector_collection,
+                KnowledgeBase.chunk_size == kb.chunk_size,
+                KnowledgeBase.chunk_overlap == kb.chunk_overlap,
+            )
+            .order_by(KBDocument.updated_at.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+    
     async def get_failed_documents(
         self, 
         kb_id: Optional[UUID] = None
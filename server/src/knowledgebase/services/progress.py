@@ -0,0 +1,116 @@
+"""
+文档处理进度通道
+
+Celery Worker 在各处理阶段向 Redis 频道 kb:progress:{kb_id} 发布进度，
+API 进程按知识库订阅并通过 SSE 推送给前端，替代轮询文档列表。
+进度推送是尽力而为的：发布失败只记录日志，不影响文档处理。
+"""
+
+import json
+from typing import Any, AsyncGenerator, Optional
+from uuid import UUID
+
+import redis.asyncio as aioredis
+
+from config import settings
+from knowledgebase.constants import ProcessingStage, STAGE_PERCENT
+from services.logging_service import logger
+
+
+CHANNEL_PREFIX = "kb:progress"
+
+
+def progress_channel(kb_id: UUID | str) -> str:
+    """知识库进度频道名"""
+    return f"{CHANNEL_PREFIX}:{kb_id}"
+
+
+def format_sse_event(event: str, data: dict) -> str:
+    """编码为标准 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ProgressPublisher:
+    """
+    单个文档的进度发布器 (Worker 侧)
+
+    Args:
+        kb_id: 知识库ID
+        doc_id: 文档ID
+        client: Redis 客户端，默认按配置创建
+    """
+
+    def __init__(self, kb_id: UUID, doc_id: UUID, client: Optional[aioredis.Redis] = None):
+        self.kb_id = str(kb_id)
+        self.doc_id = str(doc_id)
+        self._owns_client = client is None
+        self.client = client or aioredis.from_url(settings.kb.progress_redis_url)
+
+    async def publish(
+        self,
+        stage: ProcessingStage,
+        percent: Optional[int] = None,
+        **extra: Any,
+    ) -> None:
+        """
+        发布进度
+
+        Args:
+            stage: 处理阶段
+            percent: 进度百分比，默认取阶段起点
+            **extra: 附加字段 (chunk_count / error 等)
+        """
+        payload = {
+            "kb_id": self.kb_id,
+            "doc_id": self.doc_id,
+            "stage": stage.value,
+            "percent": STAGE_PERCENT[stage] if percent is None else percent,
+            **extra,
+        }
+        try:
+            await self.client.publish(progress_channel(self.kb_id), json.dumps(payload, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"Failed to publish progress for doc {self.doc_id}: {e}")
+
+    async def embed_progress(self, done: int, total: int) -> None:
+        """EMBED 阶段按已完成批次推进百分比"""
+        start = STAGE_PERCENT[ProcessingStage.EMBED]
+        end = STAGE_PERCENT[ProcessingStage.INSERT]
+        percent = start + (end - start) * done // max(total, 1)
+        await self.publish(ProcessingStage.EMBED, percent, done=done, total=total)
+
+    async def close(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+
+async def subscribe_progress(
+    kb_id: UUID,
+    heartbeat_interval: Optional[float] = None,
+) -> AsyncGenerator[Optional[dict], None]:
+    """
+    订阅知识库进度 (API 侧)
+
+    每条进度产出一个 dict；heartbeat_interval 内无消息时产出 None，
+    调用方据此发送心跳并检测客户端断开。
+    """
+    if heartbeat_interval is None:
+        heartbeat_interval = settings.kb.progress_heartbeat_interval
+
+    client = aioredis.from_url(settings.kb.progress_redis_url)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(progress_channel(kb_id))
+    try:
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat_interval)
+            if message is None:
+                yield None
+                continue
+            try:
+                yield json.loads(message["data"])
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid progress message on kb {kb_id}: {message['data']!r}")
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
@@ -0,0 +1,307 @@
+"""
+更换 Embedding 模型 (重新向量化)
+
+流程:
+1. start: 登记任务，目标集合以新模型命名；此后新索引/复制的文档同步写入目标集合 (sync_document)
+2. run: Worker 按向量 ID 分批读取原集合中的分块文本与元数据 (不重新下载解析文件)，
+   用新模型向量化后写入目标集合，每批提交一次检查点 (cursor)，按 reembed_max_rate 限速；
+   单次执行超过 reembed_slice_seconds 后交还 Worker 重新入队，中断后从检查点继续
+3. complete: 按文档核对两个集合的向量数并补齐差异，然后锁定任务行确认仍在执行，
+   在同一事务中切换知识库的 embedding_model / vector_collection，最后删除原集合中的向量
+   (cancel 同样先锁定任务行，两者不会交错)
+
+目标向量 ID 由来源 ID 派生，回填与双写重复处理同一分块时覆盖写入，不会产生重复。
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from knowledgebase.core.embedding import EmbeddingService
+from knowledgebase.exceptions import KBException
+from knowledgebase.models import ACTIVE_REEMBED_STATUSES, KBReembedJob, KnowledgeBase, ReembedStatus
+from knowledgebase.services.vector_store import VectorStoreService, collection_for_model, derived_vector_id
+from services.logging_service import logger
+
+
+Chunk = Tuple[str, str, Dict[str, Any]]
+
+
+async def copy_chunks(job: KBReembedJob, chunks: List[Chunk]) -> int:
+    """用目标模型向量化分块文本并写入目标集合"""
+    if not chunks:
+        return 0
+    texts = [text for _, text, _ in chunks]
+    embeddings = await EmbeddingService.embed_documents(texts, job.target_model)
+    return await VectorStoreService.upsert_embeddings(
+        ids=[derived_vector_id(vector_id, job.target_collection) for vector_id, _, _ in chunks],
+        texts=texts,
+        embeddings=embeddings,
+        metadatas=[metadata for _, _, metadata in chunks],
+        embedding_model=job.target_model,
+        collection_name=job.target_collection,
+    )
+
+
+def throttle_delay(count: int, elapsed: float, max_rate: float) -> float:
+    """本批处理后需要等待的秒数，使平均速率不超过 max_rate 分块/秒"""
+    if max_rate <= 0:
+        return 0.0
+    return max(0.0, count / max_rate - elapsed)
+
+
+class ReembedService:
+    """重新向量化服务"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_job(self, job_id: UUID) -> Optional[KBReembedJob]:
+        return await self.db.get(KBReembedJob, job_id)
+
+    async def get_active_job(self, kb_id: UUID) -> Optional[KBReembedJob]:
+        """进行中的任务 (需要双写)"""
+        result = await self.db.execute(
+            select(KBReembedJob).where(
+                KBReembedJob.kb_id == kb_id,
+                KBReembedJob.status.in_(ACTIVE_REEMBED_STATUSES),
+            )
+        )
+        return result.scalars().first()
+
+    async def get_latest_job(self, kb_id: UUID) -> Optional[KBReembedJob]:
+        result = await self.db.execute(
+            select(KBReembedJob)
+            .where(KBReembedJob.kb_id == kb_id)
+            .order_by(KBReembedJob.created_at.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+
+    async def _lock_job(self, job: KBReembedJob) -> KBReembedJob:
+        """锁定任务行 (SELECT ... FOR UPDATE) 并重新读取状态，串行化 complete 与 cancel"""
+        result = await self.db.execute(
+            select(KBReembedJob)
+            .where(KBReembedJob.id == job.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().one()
+
+    async def vector_collections(self, kb: KnowledgeBase) -> List[Tuple[str, str]]:
+        """知识库向量所在的 (集合, 模型)，迁移期间包含目标集合"""
+        collections = [(kb.vector_collection, kb.embedding_model)]
+        job = await self.get_active_job(kb.id)
+        if job is not None:
+            collections.append((job.target_collection, job.target_model))
+        return collections
+
+    # ==================== 任务控制 ====================
+
+    async def start(self, kb: KnowledgeBase, target_model: str) -> KBReembedJob:
+        """登记任务 (调用方负责投递 Worker 任务)"""
+        # 只允许部署中配置 (并预热) 的模型，避免 Worker 按请求下载加载任意模型
+        if target_model not in EmbeddingService.configured_models():
+            raise KBException(f"Unsupported embedding model: {target_model}")
+        if target_model == kb.embedding_model:
+            raise KBException(f"Knowledge base already uses {target_model}")
+        if await self.get_active_job(kb.id) is not None:
+            raise KBException("A re-embedding job is already in progress", status_code=409)
+
+        job = KBReembedJob(
+            kb_id=kb.id,
+            source_model=kb.embedding_model,
+            source_collection=kb.vector_collection,
+            target_model=target_model,
+            target_collection=collection_for_model(target_model),
+            status=ReembedStatus.PENDING,
+            processed=0,
+            total=0,
+        )
+        self.db.add(job)
+        await self.db.commit()
+        await self.db.refresh(job)
+
+        logger.info(f"Re-embedding job {job.id}: kb {kb.id} {job.source_model} -> {target_model}")
+        return job
+
+    async def pause(self, job: KBReembedJob) -> KBReembedJob:
+        """暂停回填 (Worker 在下一批前退出，新文档仍双写)"""
+        if job.status not in (ReembedStatus.PENDING, ReembedStatus.RUNNING):
+            raise KBException(f"Cannot pause a {job.status.value} job")
+        job.status = ReembedStatus.PAUSED
+        await self.db.commit()
+        return job
+
+    async def resume(self, job: KBReembedJob) -> KBReembedJob:
+        """从检查点继续 (调用方负责投递 Worker 任务)"""
+        if job.status not in (ReembedStatus.PAUSED, ReembedStatus.FAILED):
+            raise KBException(f"Cannot resume a {job.status.value} job")
+        job.status = ReembedStatus.PENDING
+        job.error_msg = None
+        await self.db.commit()
+        return job
+
+    async def cancel(self, job: KBReembedJob) -> KBReembedJob:
+        """取消任务并删除已写入目标集合的向量，知识库保持原模型"""
+        job = await self._lock_job(job)
+        if job.status not in ACTIVE_REEMBED_STATUSES:
+            await self.db.commit()  # 释放行锁
+            raise KBException(f"Cannot cancel a {job.status.value} job")
+        job.status = ReembedStatus.CANCELLED
+        await self.db.commit()
+        await VectorStoreService.delete_by_kb_id(job.kb_id, job.target_model, job.target_collection)
+        logger.info(f"Re-embedding job {job.id} cancelled")
+        return job
+
+    # ==================== 双写 ====================
+
+    async def sync_document(self, kb_id: UUID, doc_id: UUID, collection_name: str) -> int:
+        """
+        迁移期间把文档在原集合中的分块同步到目标集合 (先删后写)
+
+        文档索引或复制向量完成后调用，collection_name 为本次写入的集合；
+        写入时知识库已切换到新集合的，同步后删除原集合中的副本。
+
+        Returns:
+            写入目标集合的向量数
+        """
+        job = await self.get_active_job(kb_id)
+        if job is not None:
+            return await self._sync_document(job, str(doc_id))
+
+        job = await self.get_latest_job(kb_id)
+        if job is None or job.status != ReembedStatus.COMPLETED or job.source_collection != collection_name:
+            return 0
+        count = await self._sync_document(job, str(doc_id))
+        if settings.kb.reembed_cleanup:
+            await VectorStoreService.delete_by_doc_id(doc_id, job.source_model, job.source_collection)
+        return count
+
+    @staticmethod
+    async def _sync_document(job: KBReembedJob, doc_id: str) -> int:
+        await VectorStoreService._delete_by_metadata(
+            {"doc_id": doc_id}, job.target_model, job.target_collection
+        )
+        chunks = await VectorStoreService.fetch_chunks(
+            {"doc_id": doc_id},
+            embedding_model=job.source_model,
+            collection_name=job.source_collection,
+        )
+        count = await copy_chunks(job, chunks)
+        logger.info(f"Re-embedding job {job.id}: synced {count} vectors for doc {doc_id}")
+        return count
+
+    # ==================== 回填 ====================
+
+    async def run(self, job: KBReembedJob, time_budget: Optional[float] = None) -> ReembedStatus:
+        """
+        从检查点继续回填，直到完成、被暂停/取消或用完本次时长
+
+        Returns:
+            退出时的任务状态，RUNNING 表示时长用完、需要重新入队；
+            任务已暂停/结束时直接返回当前状态
+        """
+        conf = settings.kb
+        time_budget = conf.reembed_slice_seconds if time_budget is None else time_budget
+        started = time.monotonic()
+        source = {"kb_id": str(job.kb_id)}
+
+        if job.status not in (ReembedStatus.PENDING, ReembedStatus.RUNNING):
+            return job.status
+        job.status = ReembedStatus.RUNNING
+        if job.cursor is None:
+            counts = await VectorStoreService.count_by_doc(job.kb_id, job.source_model, job.source_collection)
+            job.total = sum(counts.values())
+        await self.db.commit()
+
+        try:
+            while True:
+                # 读取 API 侧的暂停/取消
+                await self.db.refresh(job)
+                if job.status != ReembedStatus.RUNNING:
+                    logger.info(f"Re-embedding job {job.id} stopped at {job.processed}/{job.total}: {job.status.value}")
+                    return job.status
+
+                batch_started = time.monotonic()
+                chunks = await VectorStoreService.fetch_chunks(
+                    source,
+                    after_id=job.cursor,
+                    limit=conf.reembed_batch_size,
+                    embedding_model=job.source_model,
+                    collection_name=job.source_collection,
+                )
+                if not chunks:
+                    await self.complete(job)
+                    return job.status
+
+                await copy_chunks(job, chunks)
+                job.cursor = chunks[-1][0]
+                job.processed += len(chunks)
+                await self.db.commit()
+
+                delay = throttle_delay(len(chunks), time.monotonic() - batch_started, conf.reembed_max_rate)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if time.monotonic() - started >= time_budget:
+                    logger.info(f"Re-embedding job {job.id} checkpoint at {job.processed}/{job.total}")
+                    return job.status
+        except Exception as e:
+            logger.exception(f"Re-embedding job {job.id} failed")
+            await self.db.rollback()
+            job.status = ReembedStatus.FAILED
+            job.error_msg = str(e)
+            await self.db.commit()
+            raise
+
+    async def reconcile(self, job: KBReembedJob) -> int:
+        """
+        按文档核对两个集合的向量数，重新同步不一致的文档
+
+        覆盖回填期间删除或重新索引的文档，以及任务登记前已开始、未双写的索引任务。
+
+        Returns:
+            重新同步的文档数
+        """
+        source = await VectorStoreService.count_by_doc(job.kb_id, job.source_model, job.source_collection)
+        target = await VectorStoreService.count_by_doc(job.kb_id, job.target_model, job.target_collection)
+        stale = [doc_id for doc_id in source.keys() | target.keys() if source.get(doc_id) != target.get(doc_id)]
+        for doc_id in stale:
+            await self._sync_document(job, doc_id)
+        if stale:
+            logger.info(f"Re-embedding job {job.id}: reconciled {len(stale)} documents")
+        return len(stale)
+
+    async def complete(self, job: KBReembedJob) -> None:
+        """补齐差异后原子切换知识库的模型与集合，并清理原集合"""
+        await self.reconcile(job)
+
+        # 补齐期间可能被暂停/取消 (取消会清空目标集合)，锁定任务行后确认仍在执行再切换
+        job = await self._lock_job(job)
+        if job.status != ReembedStatus.RUNNING:
+            await self.db.commit()  # 释放行锁
+            logger.info(f"Re-embedding job {job.id} not switched: {job.status.value}")
+            return
+
+        result = await self.db.execute(
+            select(KnowledgeBase).where(KnowledgeBase.id == job.kb_id).with_for_update()
+        )
+        kb = result.scalars().first()
+        if kb is None:
+            job.status = ReembedStatus.CANCELLED
+            await self.db.commit()
+            return
+        kb.embedding_model = job.target_model
+        kb.vector_collection = job.target_collection
+        job.status = ReembedStatus.COMPLETED
+        job.error_msg = None
+        await self.db.commit()
+        logger.info(f"Knowledge base {kb.id} switched to {job.target_model} ({job.target_collection})")
+
+        if settings.kb.reembed_cleanup:
+            await VectorStoreService.delete_by_kb_id(job.kb_id, job.source_model, job.source_collection)
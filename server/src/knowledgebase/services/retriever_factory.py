@@ -1,20 +1,182 @@
 """
 检索器工厂
 
-为 Agent 模块提供标准的 LangChain Retriever 对象
+为 Agent 模块提供标准的 LangChain Retriever 对象；
+search_type="mmr" 使用自有的 MMRRetriever (候选与向量一次取回，NumPy 重排，支持跨知识库)，
+其余检索类型使用 SimilarityRetriever；两者都在 metadata 中写入 score (余弦相似度)。
+知识库使用不同模型/集合时按组分别检索，由 MergedRetriever 按分数合并。
+
+向量存储只使用异步引擎 (asyncpg 连接绑定创建它的事件循环，不能在新循环中复用)，
+工厂返回的检索器只支持异步调用 (ainvoke)。
 """
 
-from typing import Optional, Literal
+import asyncio
+
+from typing import Any, Dict, List, Optional, Literal, Tuple
 from uuid import UUID
 
-from langchain_core.vectorstores import VectorStoreRetriever
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 
-from knowledgebase.services.vector_store import VectorStoreService
+from config import settings
+from knowledgebase.core.embedding import EmbeddingService
+from knowledgebase.core.mmr import mmr_select
+from knowledgebase.services.vector_store import DEFAULT_COLLECTION, VectorStoreService
 from services.logging_service import logger
 
 
+class AsyncRetriever(BaseRetriever):
+    """只支持异步调用的检索器，同步调用时给出明确错误"""
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        raise NotImplementedError(f"{type(self).__name__} only supports async invocation, use ainvoke()")
+
+
+class MMRRetriever(AsyncRetriever):
+    """
+    MMR 检索器
+
+    查询向量化一次，按余弦距离取回 fetch_k 条候选及其存储的向量，
+    在 NumPy 中完成 MMR、近重复去重与单文档上限，结果 metadata 带 score (余弦相似度)。
+    """
+    filter: Dict[str, Any]
+    embedding_model: Optional[str] = None
+    collection_name: str = DEFAULT_COLLECTION
+    k: int = 4
+    fetch_k: int = 100
+    lambda_mult: float = 0.5
+    max_per_doc: Optional[int] = None
+    dedup_threshold: Optional[float] = None
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        model = self.embedding_model or settings.kb.embedding_model
+        query_vector = await EmbeddingService.embed_query(query, model)
+        docs, vectors, distances = await VectorStoreService.fetch_candidates(
+            query_vector,
+            self.filter,
+            max(self.fetch_k, self.k),
+            embedding_model=model,
+            collection_name=self.collection_name,
+        )
+        selected = mmr_select(
+            np.asarray(query_vector, dtype=np.float32),
+            vectors,
+            self.k,
+            lambda_mult=self.lambda_mult,
+            doc_ids=[doc.metadata.get("doc_id") for doc in docs],
+            max_per_doc=self.max_per_doc,
+            dedup_threshold=self.dedup_threshold,
+        )
+        results = []
+        for index in selected:
+            doc = docs[index]
+            doc.metadata["score"] = round(float(1 - distances[index]), 4)
+            results.append(doc)
+        return results
+
+
+class SimilarityRetriever(AsyncRetriever):
+    """
+    相似度检索器
+
+    按余弦距离取回前 k 条 (可按相关度阈值过滤)，结果 metadata 带 score (余弦相似度)，
+    与 MMRRetriever 的分数口径一致，可由 MergedRetriever 合并排序。
+    """
+    filter: Dict[str, Any]
+    embedding_model: Optional[str] = None
+    collection_name: str = DEFAULT_COLLECTION
+    k: int = 4
+    score_threshold: Optional[float] = None
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # 与 VectorStoreService.similarity_search 相同，经 fetch_candidates 走 (量化) 索引并精排
+        model = self.embedding_model or settings.kb.embedding_model
+        query_vector = await EmbeddingService.embed_query(query, model)
+        docs, _, distances = await VectorStoreService.fetch_candidates(
+            query_vector,
+            self.filter,
+            self.k,
+            embedding_model=model,
+            collection_name=self.collection_name,
+        )
+        results = []
+        for doc, distance in zip(docs, distances):
+            score = float(1 - distance)
+            if self.score_threshold is not None and score < self.score_threshold:
+                continue
+            doc.metadata["score"] = round(score, 4)
+            results.append(doc)
+        return results
+
+
+class MergedRetriever(AsyncRetriever):
+    """
+    合并多个检索器的结果
+
+    用于向量分属不同模型/集合的知识库 (如更换模型后)，各组并发检索，
+    按 metadata 中的 score 取前 k 条；不同模型的余弦相似度只作近似比较。
+    各组须为写入 score 的检索器 (MMRRetriever / SimilarityRetriever)。
+    """
+    retrievers: List[BaseRetriever]
+    k: int = 4
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        groups = await asyncio.gather(
+            *(retriever.ainvoke(query, config={"callbacks": run_manager.get_child()}) for retriever in self.retrievers)
+        )
+        docs = [doc for group in groups for doc in group]
+        if any("score" not in doc.metadata for doc in docs):
+            raise ValueError("MergedRetriever requires retrievers that set metadata['score']")
+        docs.sort(key=lambda doc: doc.metadata["score"], reverse=True)
+        return docs[:self.k]
+
+
 class RetrieverFactory:
-    """检索器工厂"""
+    """检索器工厂 (返回的检索器只支持 ainvoke)"""
+    
+    @staticmethod
+    def _build(
+        search_filter: dict,
+        embedding_model: Optional[str],
+        search_type: str,
+        k: int,
+        score_threshold: Optional[float] = None,
+        fetch_k: Optional[int] = None,
+        lambda_mult: Optional[float] = None,
+        max_per_doc: Optional[int] = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> BaseRetriever:
+        if search_type == "mmr":
+            return MMRRetriever(
+                filter=search_filter,
+                embedding_model=embedding_model,
+                collection_name=collection_name,
+                k=k,
+                fetch_k=fetch_k or settings.kb.mmr_fetch_k,
+                lambda_mult=settings.kb.mmr_lambda_mult if lambda_mult is None else lambda_mult,
+                max_per_doc=max_per_doc,
+                dedup_threshold=settings.kb.mmr_dedup_threshold,
+            )
+        
+        if search_type not in ("similarity", "similarity_score_threshold"):
+            raise ValueError(f"Unknown search_type: {search_type}")
+        return SimilarityRetriever(
+            filter=search_filter,
+            embedding_model=embedding_model,
+            collection_name=collection_name,
+            k=k,
+            score_threshold=score_threshold if search_type == "similarity_score_threshold" else None,
+        )
     
     @classmethod
     def create_retriever(
@@ -24,9 +186,11 @@ class RetrieverFactory:
         search_type: Literal["similarity", "mmr", "similarity_score_threshold"] = "similarity",
         k: int = 4,
         score_threshold: Optional[float] = None,
-        fetch_k: int = 20,
-        lambda_mult: float = 0.5,
-    ) -> VectorStoreRetriever:
+        fetch_k: Optional[int] = None,
+        lambda_mult: Optional[float] = None,
+        max_per_doc: Optional[int] = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> BaseRetriever:
         """
         创建 LangChain Retriever 对象
         
@@ -39,30 +203,24 @@ class RetrieverFactory:
                 - similarity_score_threshold: 带分数阈值的相似度检索
             k: 返回结果数量
             score_threshold: 分数阈值 (仅 similarity_score_threshold 使用)
-            fetch_k: MMR 初始获取数量
-            lambda_mult: MMR 多样性参数
+            fetch_k: MMR 候选数量，默认 kb.mmr_fetch_k
+            lambda_mult: MMR 多样性参数，默认 kb.mmr_lambda_mult
+            max_per_doc: MMR 单文档最多返回的分块数
+            collection_name: 向量集合 (知识库的 vector_collection)
             
         Returns:
-            VectorStoreRetriever 实例
+            Retriever 实例
         """
-        vector_store = VectorStoreService.get_vector_store(embedding_model=embedding_model)
-        
-        # 构建 search_kwargs
-        search_kwargs = {
-            "k": k,
-            "filter": {"kb_id": str(kb_id)},
-        }
-        
-        # 根据检索类型添加额外参数
-        if search_type == "mmr":
-            search_kwargs["fetch_k"] = fetch_k
-            search_kwargs["lambda_mult"] = lambda_mult
-        elif search_type == "similarity_score_threshold" and score_threshold is not None:
-            search_kwargs["score_threshold"] = score_threshold
-        
-        retriever = vector_store.as_retriever(
-            search_type=search_type,
-            search_kwargs=search_kwargs,
+        retriever = cls._build(
+            {"kb_id": str(kb_id)},
+            embedding_model,
+            search_type,
+            k,
+            score_threshold=score_threshold,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            max_per_doc=max_per_doc,
+            collection_name=collection_name,
         )
         
         logger.debug(f"Created retriever for kb {kb_id} with type={search_type}, k={k}")
@@ -76,7 +234,11 @@ class RetrieverFactory:
         embedding_model: str = None,
         search_type: Literal["similarity", "mmr"] = "similarity",
         k: int = 4,
-    ) -> VectorStoreRetriever:
+        fetch_k: Optional[int] = None,
+        lambda_mult: Optional[float] = None,
+        max_per_doc: Optional[int] = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> BaseRetriever:
         """
         创建多知识库检索器
         
@@ -85,21 +247,24 @@ class RetrieverFactory:
             embedding_model: Embedding 模型
             search_type: 检索类型
             k: 返回结果数量
+            fetch_k: MMR 候选数量
+            lambda_mult: MMR 多样性参数
+            max_per_doc: MMR 单文档最多返回的分块数
+            collection_name: 向量集合 (知识库的 vector_collection)
             
         Returns:
-            VectorStoreRetriever 实例
+            Retriever 实例
         """
-        vector_store = VectorStoreService.get_vector_store(embedding_model=embedding_model)
-        
-        # 使用 $in 操作符匹配多个知识库
-        search_kwargs = {
-            "k": k,
-            "filter": {"kb_id": {"$in": [str(kb_id) for kb_id in kb_ids]}},
-        }
-        
-        retriever = vector_store.as_retriever(
-            search_type=search_type,
-            search_kwargs=search_kwargs,
+        # 使用 $in 操作符匹配多个知识库，MMR 在所有知识库的候选上统一重排
+        retriever = cls._build(
+            {"kb_id": {"$in": [str(kb_id) for kb_id in kb_ids]}},
+            embedding_model,
+            search_type,
+            k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            max_per_doc=max_per_doc,
+            collection_name=collection_name,
         )
         
         logger.debug(f"Created multi-kb retriever for {len(kb_ids)} knowledge bases")
@@ -114,36 +279,32 @@ class RetrieverFactory:
         search_type: Literal["similarity", "mmr", "similarity_score_threshold"] = "similarity",
         k: int = 4,
         score_threshold: Optional[float] = None,
-        fetch_k: int = 20,
-        lambda_mult: float = 0.5,
-    ) -> VectorStoreRetriever:
+        fetch_k: Optional[int] = None,
+        lambda_mult: Optional[float] = None,
+        max_per_doc: Optional[int] = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> BaseRetriever:
         """
         创建“可访问知识库集合”检索器。
 
         适用于默认检索范围：当前用户私有库 + 全部公开库。
         """
-        vector_store = VectorStoreService.get_vector_store(embedding_model=embedding_model)
-
         if kb_ids:
             kb_filter: dict = {"kb_id": {"$in": [str(kb_id) for kb_id in kb_ids]}}
         else:
             # 空集合时给一个不可能命中的过滤器，避免误扫全库
             kb_filter = {"kb_id": {"$eq": "__none__"}}
 
-        search_kwargs = {
-            "k": k,
-            "filter": kb_filter,
-        }
-
-        if search_type == "mmr":
-            search_kwargs["fetch_k"] = fetch_k
-            search_kwargs["lambda_mult"] = lambda_mult
-        elif search_type == "similarity_score_threshold" and score_threshold is not None:
-            search_kwargs["score_threshold"] = score_threshold
-
-        retriever = vector_store.as_retriever(
-            search_type=search_type,
-            search_kwargs=search_kwargs,
+        retriever = cls._build(
+            kb_filter,
+            embedding_model,
+            search_type,
+            k,
+            score_threshold=score_threshold,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            max_per_doc=max_per_doc,
+            collection_name=collection_name,
         )
 
         logger.debug(
@@ -153,3 +314,35 @@ class RetrieverFactory:
             k,
         )
         return retriever
+
+    @classmethod
+    def create_scoped_retriever(
+        cls,
+        scopes: Dict[Tuple[str, str], List[UUID]],
+        k: int = 4,
+        **kwargs: Any,
+    ) -> BaseRetriever:
+        """
+        按 (模型, 集合) 分组创建检索器
+
+        Args:
+            scopes: {(embedding_model, vector_collection): [kb_id, ...]}
+            k: 返回结果数量
+            **kwargs: 传给 create_accessible_retriever 的检索参数
+
+        Returns:
+            只有一组时为该组的检索器，否则为 MergedRetriever
+        """
+        if len(scopes) <= 1:
+            (model, collection), kb_ids = next(iter(scopes.items()), ((None, DEFAULT_COLLECTION), []))
+            return cls.create_accessible_retriever(
+                kb_ids=kb_ids, embedding_model=model, collection_name=collection, k=k, **kwargs
+            )
+        retrievers = [
+            cls.create_accessible_retriever(
+                kb_ids=kb_ids, embedding_model=model, collection_name=collection, k=k, **kwargs
+            )
+            for (model, collection), kb_ids in scopes.items()
+        ]
+        logger.debug(f"Created merged retriever over {len(retrievers)} embedding scopes")
+        return MergedRetriever(retrievers=retrievers, k=k)
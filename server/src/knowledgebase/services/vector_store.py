@@ -2,21 +2,49 @@
 向量存储服务
 
 连接 axiom_kb 数据库的 PGVector 操作
+
+所有集合共用 langchain_pg_embedding 表，按 collection_id 区分；
+知识库更换 Embedding 模型时写入以模型命名的新集合 (见 collection_for_model)。
 """
 
-from typing import List, Optional
+import re
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from uuid import UUID
 import asyncio
 
 from langchain_postgres.vectorstores import PGVector
 from langchain_core.documents import Document
-from sqlalchemy.ext.asyncio import create_async_engine
+import numpy as np
+from sqlalchemy import String, cast, delete, func, insert, literal, select, text
+from sqlalchemy.dialects.postgresql import JSONB
 
 from config import settings
+from connection_budget import connection_budget
+from database import get_async_connect_args
+from knowledgebase.core import vector_index
 from knowledgebase.core.embedding import EmbeddingService
 from services.logging_service import logger
 
 
+# 已有知识库所在的共享集合
+DEFAULT_COLLECTION = "axiom_kb_vectors"
+
+# 重新向量化时目标向量 ID 由来源 ID 派生，回填与双写重复写入同一分块时覆盖而不重复
+_REEMBED_NAMESPACE = uuid.UUID("5c1f0d2e-8b7a-4c3e-9f61-2a4d8e0b7c15")
+
+
+def collection_for_model(embedding_model: str) -> str:
+    """模型对应的集合名称 (更换模型时的目标集合)"""
+    slug = re.sub(r"[^a-z0-9]+", "_", embedding_model.lower()).strip("_")
+    return f"{DEFAULT_COLLECTION}__{slug}"[:100]
+
+
+def derived_vector_id(source_id: str, collection_name: str) -> str:
+    """来源向量在目标集合中的 ID"""
+    return str(uuid.uuid5(_REEMBED_NAMESPACE, f"{collection_name}:{source_id}"))
+
+
 def get_kb_connection_string() -> str:
     """获取 axiom_kb 的同步连接字符串"""
     uri = settings.db.uri_kb
@@ -39,7 +67,7 @@ class VectorStoreService:
     @classmethod
     def get_vector_store(
         cls,
-        collection_name: str = "axiom_kb_vectors",
+        collection_name: str = DEFAULT_COLLECTION,
         embedding_model: str = None,
     ) -> PGVector:
         """
@@ -60,14 +88,11 @@ class VectorStoreService:
         if cache_key not in cls._stores:
             embeddings = EmbeddingService.get_embeddings(embedding_model)
 
-            # Create async engine for PGVector async operations
             # When an AsyncEngine is passed as connection, PGVector automatically
             # sets async_mode=True and uses it for async methods like asimilarity_search()
-            async_engine = create_async_engine(
-                get_kb_async_connection_string(),
-                pool_size=5,
-                max_overflow=10,
-            )
+            # 所有集合/模型的 PGVector 共用进程内唯一的 kb 引擎
+            uri = get_kb_async_connection_string()
+            async_engine = connection_budget.async_engine("kb", uri, connect_args=get_async_connect_args(uri))
 
             cls._stores[cache_key] = PGVector(
                 embeddings=embeddings,
@@ -79,6 +104,16 @@ class VectorStoreService:
 
         return cls._stores[cache_key]
     
+    @classmethod
+    def warm_up(cls) -> None:
+        """预热 Embedding 模型并预先创建向量存储实例 (同步)"""
+        EmbeddingService.warm_up()
+        for name in EmbeddingService.configured_models():
+            try:
+                cls.get_vector_store(embedding_model=name)
+            except Exception as e:
+                logger.warning(f"Failed to prepare vector store for {name}: {e}")
+    
     @classmethod
     async def add_documents(
         cls,
@@ -87,16 +122,27 @@ class VectorStoreService:
         doc_id: UUID,
         user_id: UUID,
         embedding_model: str = None,
+        batch_size: Optional[int] = None,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+        collection_name: str = DEFAULT_COLLECTION,
+        on_insert: Optional[Callable[[], Awaitable[None]]] = None,
     ) -> List[str]:
         """
         添加文档到向量存储
         
+        先分批向量化全部分块，再分批写入；不清理文档已有的向量，
+        重新索引 (重试) 前由调用方先 delete_by_doc_id。
+        
         Args:
             documents: 文档列表
             kb_id: 知识库ID
             doc_id: 文档ID
             user_id: 用户ID
             embedding_model: Embedding 模型
+            batch_size: 分批大小，None 表示一次处理
+            on_progress: 每批向量化完成后回调 (已完成数, 总数)
+            collection_name: 集合名称
+            on_insert: 向量化完成、开始写入前回调
             
         Returns:
             向量ID列表
@@ -109,60 +155,309 @@ class VectorStoreService:
                 "user_id": str(user_id),
             })
         
-        vector_store = cls.get_vector_store(embedding_model=embedding_model)
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
 
-        # Use async method directly (PGVector is now in async mode)
-        ids = await vector_store.aadd_documents(documents)
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        step = batch_size or len(documents) or 1
+
+        embeddings: List[List[float]] = []
+        for start in range(0, len(texts), step):
+            embeddings.extend(await vector_store.embeddings.aembed_documents(texts[start:start + step]))
+            if on_progress is not None:
+                await on_progress(len(embeddings), len(texts))
+
+        if on_insert is not None:
+            await on_insert()
+        ids: List[str] = []
+        for start in range(0, len(texts), step):
+            ids.extend(await vector_store.aadd_embeddings(
+                texts=texts[start:start + step],
+                embeddings=embeddings[start:start + step],
+                metadatas=metadatas[start:start + step],
+            ))
 
         logger.info(f"Added {len(ids)} vectors for doc {doc_id}")
         return ids
     
     @classmethod
-    async def delete_by_doc_id(cls, doc_id: UUID, embedding_model: str = None) -> bool:
+    async def _delete_by_metadata(
+        cls,
+        metadata: Dict[str, str],
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> int:
+        """
+        按元数据删除向量 (cmetadata @> metadata，走 GIN 索引)
+        
+        PGVector.adelete 只支持按 ID 删除，会忽略 filter 参数。
+        """
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
+        store = vector_store.EmbeddingStore
+        async with vector_store._make_async_session() as session:
+            collection = await vector_store.aget_collection(session)
+            if collection is None:
+                return 0
+            result = await session.execute(
+                delete(store).where(
+                    store.collection_id == collection.uuid,
+                    store.cmetadata.contains(metadata),
+                )
+            )
+            await session.commit()
+            return result.rowcount
+    
+    @classmethod
+    async def clone_document_vectors(
+        cls,
+        source_doc_id: UUID,
+        kb_id: UUID,
+        doc_id: UUID,
+        user_id: UUID,
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> int:
+        """
+        复制已有文档的向量到新文档 (内容相同时跳过解析与向量化)
+        
+        在数据库内 INSERT ... SELECT，向量不经过应用进程；
+        新行使用新 ID，元数据中的 kb_id/doc_id/user_id 替换为新文档。
+        
+        Args:
+            source_doc_id: 来源文档ID
+            kb_id: 新文档所属知识库ID
+            doc_id: 新文档ID
+            user_id: 用户ID
+            metadata: 额外覆盖的元数据 (如 title)
+            embedding_model: Embedding 模型
+            collection_name: 集合名称 (来源与新文档在同一集合)
+            
+        Returns:
+            复制的向量数
+        """
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
+        store = vector_store.EmbeddingStore
+        overrides = {
+            **(metadata or {}),
+            "kb_id": str(kb_id),
+            "doc_id": str(doc_id),
+            "user_id": str(user_id),
+        }
+        async with vector_store._make_async_session() as session:
+            collection = await vector_store.aget_collection(session)
+            if collection is None:
+                return 0
+            source = select(
+                cast(func.gen_random_uuid(), String),
+                store.collection_id,
+                store.embedding,
+                store.document,
+                store.cmetadata.op("||")(literal(overrides, JSONB)),
+            ).where(
+                store.collection_id == collection.uuid,
+                store.cmetadata.contains({"doc_id": str(source_doc_id)}),
+            )
+            result = await session.execute(
+                insert(store).from_select(
+                    ["id", "collection_id", "embedding", "document", "cmetadata"],
+                    source,
+                )
+            )
+            await session.commit()
+        
+        logger.info(f"Cloned {result.rowcount} vectors from doc {source_doc_id} to doc {doc_id}")
+        return result.rowcount
+    
+    @classmethod
+    async def delete_by_doc_id(
+        cls,
+        doc_id: UUID,
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> bool:
         """
         删除文档的所有向量
         
         Args:
             doc_id: 文档ID
             embedding_model: Embedding 模型
+            collection_name: 集合名称
             
         Returns:
             是否成功
         """
-        vector_store = cls.get_vector_store(embedding_model=embedding_model)
-
         try:
-            # Use async method directly
-            await vector_store.adelete(filter={"doc_id": str(doc_id)})
-            logger.info(f"Deleted vectors for doc {doc_id}")
+            count = await cls._delete_by_metadata({"doc_id": str(doc_id)}, embedding_model, collection_name)
+            logger.info(f"Deleted {count} vectors for doc {doc_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to delete vectors for doc {doc_id}: {e}")
             return False
     
     @classmethod
-    async def delete_by_kb_id(cls, kb_id: UUID, embedding_model: str = None) -> bool:
+    async def delete_by_kb_id(
+        cls,
+        kb_id: UUID,
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> bool:
         """
         删除知识库的所有向量
         
         Args:
             kb_id: 知识库ID
             embedding_model: Embedding 模型
+            collection_name: 集合名称
             
         Returns:
             是否成功
         """
-        vector_store = cls.get_vector_store(embedding_model=embedding_model)
-
         try:
-            # Use async method directly
-            await vector_store.adelete(filter={"kb_id": str(kb_id)})
-            logger.info(f"Deleted all vectors for kb {kb_id}")
+            count = await cls._delete_by_metadata({"kb_id": str(kb_id)}, embedding_model, collection_name)
+            logger.info(f"Deleted {count} vectors for kb {kb_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to delete vectors for kb {kb_id}: {e}")
             return False
     
+    @classmethod
+    async def fetch_chunks(
+        cls,
+        metadata: Dict[str, str],
+        after_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        按向量 ID 顺序读取分块文本与元数据 (不含向量)，供重新向量化复用
+
+        Args:
+            metadata: 元数据过滤 (cmetadata @> metadata)
+            after_id: 只返回 ID 大于该值的分块 (检查点)
+            limit: 返回数量，None 表示全部
+            embedding_model: Embedding 模型
+            collection_name: 集合名称
+
+        Returns:
+            (向量ID, 分块文本, 元数据) 列表
+        """
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
+        store = vector_store.EmbeddingStore
+        async with vector_store._make_async_session() as session:
+            collection = await vector_store.aget_collection(session)
+            if collection is None:
+                return []
+            stmt = select(store.id, store.document, store.cmetadata).where(
+                store.collection_id == collection.uuid,
+                store.cmetadata.contains(metadata),
+            )
+            if after_id is not None:
+                stmt = stmt.where(store.id > after_id)
+            stmt = stmt.order_by(store.id).limit(limit)
+            rows = (await session.execute(stmt)).all()
+        return [(row.id, row.document, row.cmetadata or {}) for row in rows]
+
+    @classmethod
+    async def count_by_doc(
+        cls,
+        kb_id: UUID,
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> Dict[str, int]:
+        """
+        统计知识库各文档的向量数
+
+        Returns:
+            {doc_id: 向量数}
+        """
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
+        store = vector_store.EmbeddingStore
+        async with vector_store._make_async_session() as session:
+            collection = await vector_store.aget_collection(session)
+            if collection is None:
+                return {}
+            doc_id = store.cmetadata["doc_id"].astext
+            rows = (await session.execute(
+                select(doc_id, func.count())
+                .where(
+                    store.collection_id == collection.uuid,
+                    store.cmetadata.contains({"kb_id": str(kb_id)}),
+                )
+                .group_by(doc_id)
+            )).all()
+        return {row[0]: row[1] for row in rows}
+
+    @classmethod
+    async def upsert_embeddings(
+        cls,
+        ids: List[str],
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> int:
+        """
+        写入已计算好的向量，ID 已存在时覆盖 (集合不存在时自动创建)
+
+        Returns:
+            写入的向量数
+        """
+        if not ids:
+            return 0
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
+        await vector_store.aadd_embeddings(texts=texts, embeddings=embeddings, metadatas=metadatas, ids=ids)
+        return len(ids)
+
+    @classmethod
+    async def fetch_candidates(
+        cls,
+        query_vector: List[float],
+        filter: Dict[str, Any],
+        fetch_k: int,
+        embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
+    ) -> Tuple[List[Document], np.ndarray, np.ndarray]:
+        """
+        一次查询取回最相近的 fetch_k 条分块及其存储的向量 (供 MMR 重排，不再重新向量化)
+        
+        kb.vector_index 为 halfvec/binary 时经量化索引取候选，再按全精度向量重排。
+        
+        Args:
+            query_vector: 查询向量
+            filter: PGVector 元数据过滤条件 (与 as_retriever 的 filter 语法一致)
+            fetch_k: 候选数量
+            embedding_model: Embedding 模型
+            collection_name: 集合名称
+            
+        Returns:
+            (文档列表, 向量矩阵 fetch_k x dim, 余弦距离)
+        """
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
+        store = vector_store.EmbeddingStore
+        async with vector_store._make_async_session() as session:
+            collection = await vector_store.aget_collection(session)
+            if collection is None:
+                return [], np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.float32)
+            where = [store.collection_id == collection.uuid]
+            clause = vector_store._create_filter_clause(filter) if filter else None
+            if clause is not None:
+                where.append(clause)
+            if settings.kb.vector_index in vector_index.QUANTIZED_MODES:
+                for statement in vector_index.session_settings(fetch_k):
+                    await session.execute(text(statement))
+            stmt = vector_index.candidate_query(store, query_vector, fetch_k, where)
+            rows = (await session.execute(stmt)).all()
+        
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32), np.empty(0, dtype=np.float32)
+        docs = [Document(id=row.id, page_content=row.document, metadata=row.cmetadata or {}) for row in rows]
+        vectors = np.stack([np.asarray(row.embedding, dtype=np.float32) for row in rows])
+        distances = np.asarray([row.distance for row in rows], dtype=np.float32)
+        return docs, vectors, distances
+    
     @classmethod
     async def similarity_search(
         cls,
@@ -171,6 +466,7 @@ class VectorStoreService:
         k: int = 4,
         score_threshold: Optional[float] = None,
         embedding_model: str = None,
+        collection_name: str = DEFAULT_COLLECTION,
     ) -> List[tuple]:
         """
         相似度搜索
@@ -181,13 +477,24 @@ class VectorStoreService:
             k: 返回数量
             score_threshold: 分数阈值
             embedding_model: Embedding 模型
+            collection_name: 集合名称
             
         Returns:
             (Document, score) 元组列表
         """
-        vector_store = cls.get_vector_store(embedding_model=embedding_model)
-
         filter_dict = {"kb_id": str(kb_id)}
+        
+        if settings.kb.vector_index in vector_index.QUANTIZED_MODES:
+            # 经量化索引检索并精排，相关度与 PGVector 余弦相关度一致 (1 - 距离)
+            model = embedding_model or settings.kb.embedding_model
+            query_vector = await EmbeddingService.embed_query(query, model)
+            docs, _, distances = await cls.fetch_candidates(query_vector, filter_dict, k, model, collection_name)
+            results = [(doc, float(1 - distance)) for doc, distance in zip(docs, distances)]
+            if score_threshold is not None:
+                results = [item for item in results if item[1] >= score_threshold]
+            return results
+
+        vector_store = cls.get_vector_store(collection_name, embedding_model)
 
         # Use async method directly
         if score_threshold is not None:
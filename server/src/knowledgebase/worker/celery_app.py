@@ -3,6 +3,7 @@ Celery 应用配置
 
 启动命令:
     celery -A knowledgebase.worker.celery_app worker -l info
+    celery -A knowledgebase.worker.celery_app beat -l info  # 定时清理任务
 """
 
 import os
@@ -14,6 +15,7 @@ if src_dir not in sys.path:
     sys.path.insert(0, src_dir)
 
 from celery import Celery
+from celery.signals import import_modules, worker_process_init
 
 from config import settings
 
@@ -23,7 +25,7 @@ celery_app = Celery(
     "knowledgebase",
     broker=settings.celery.broker_url,
     backend=settings.celery.result_backend,
-    include=["knowledgebase.worker.tasks"],
+    include=["knowledgebase.worker.tasks", "auth.tasks"],
 )
 
 # Celery 配置
@@ -45,5 +47,40 @@ celery_app.conf.update(
     
     # Worker 配置
     worker_prefetch_multiplier=1,
-    worker_concurrency=4,
+    # 与连接预算中的 Worker 进程数保持一致
+    worker_concurrency=settings.db_budget.worker_processes,
+    
+    # 定时任务
+    beat_schedule={
+        "purge-expired-auth-records": {
+            "task": "auth.tasks.purge_expired_auth_records",
+            "schedule": settings.auth.purge_interval,
+        },
+        "purge-abandoned-uploads": {
+            "task": "knowledgebase.worker.tasks.purge_abandoned_uploads",
+            "schedule": settings.kb.upload_purge_interval,
+        },
+    },
 )
+
+
+@import_modules.connect
+def use_worker_budget(**kwargs) -> None:
+    """
+    Worker / Beat 导入任务模块 (创建数据库引擎) 之前指定连接预算角色，
+    不依赖启动命令名 (python -m celery、uv run celery 等均适用)；API 进程只导入本模块，不触发该信号
+    """
+    from connection_budget import ROLE_WORKER, connection_budget
+
+    connection_budget.set_role(ROLE_WORKER)
+
+
+@worker_process_init.connect
+def warm_up_embeddings(**kwargs) -> None:
+    """每个 Worker 子进程启动时选择运行时参数并预热 Embedding 模型，首个文档任务不再承担模型加载"""
+    from knowledgebase.core.embedding import EmbeddingService
+    from knowledgebase.services.vector_store import VectorStoreService
+
+    EmbeddingService.use_profile(settings.kb.worker_embedding_profile)
+    if settings.kb.warmup_on_start:
+        VectorStoreService.warm_up()
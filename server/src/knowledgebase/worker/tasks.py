@@ -2,39 +2,120 @@
 Celery 任务定义
 
 文档处理任务: 下载 -> 加载 -> 切分 -> 向量化 -> 入库
+内容与已索引文档相同 (SHA-256 一致且切分/Embedding 配置相同) 时直接复制向量
+重新向量化任务: 知识库更换 Embedding 模型时分批回填，超过单次时长后重新入队
+直传清理任务: 由 Celery Beat 按 settings.kb.upload_purge_interval 调度
 """
 
 import asyncio
+import hashlib
 from uuid import UUID
 from typing import Optional
 
 from celery import shared_task
 from celery.utils.log import get_task_logger
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from config import settings
-from knowledgebase.models import KnowledgeBase, KBDocument, DocumentStatus
+from connection_budget import connection_budget
+from database import AsyncSessionLocal
+from knowledgebase.constants import ProcessingStage
+from knowledgebase import maintenance
+from knowledgebase.models import KnowledgeBase, KBDocument, DocumentStatus, ReembedStatus
 from knowledgebase.core.loader import DocumentLoader
 from knowledgebase.core.splitter import DocumentSplitter
+from knowledgebase.services.kb_service import KBService
+from knowledgebase.services.progress import ProgressPublisher
+from knowledgebase.services.reembed import ReembedService
 from knowledgebase.services.vector_store import VectorStoreService
-from rustfs.client import get_rustfs_client
+from rustfs.client import RustfsClient, get_rustfs_client
 
 
 logger = get_task_logger(__name__)
 
 
-def get_async_session() -> async_sessionmaker[AsyncSession]:
-    """获取异步数据库会话工厂"""
-    engine = create_async_engine(
-        settings.db.uri_app,
-        echo=settings.db.echo,
+async def _run_with_pools(coro):
+    """在本任务的事件循环中执行，结束前关闭绑定到该循环的共享引擎连接"""
+    try:
+        return await coro
+    finally:
+        await connection_budget.dispose_async()
+
+
+async def _register_content(service: KBService, client: RustfsClient, doc: KBDocument, content: bytes) -> None:
+    """直传文档在下载后计算哈希并登记对象，内容已存在时删除重复对象"""
+    uploaded_key = doc.file_key
+    doc.content_hash = hashlib.sha256(content).hexdigest()
+    doc.file_key = await service.acquire_blob(doc.content_hash, uploaded_key, len(content))
+    await service.db.commit()
+    if doc.file_key != uploaded_key:
+        await client.adelete(uploaded_key)
+
+
+async def _index_content(
+    doc: KBDocument,
+    kb: KnowledgeBase,
+    client: RustfsClient,
+    content: Optional[bytes],
+    progress: ProgressPublisher,
+) -> tuple[int, list[str]]:
+    """
+    下载 (如尚未下载) -> 加载 -> 切分 -> 向量化并入库
+    
+    Returns:
+        (切片数量, 向量ID列表)
+    """
+    # 从 RustFS 下载文件
+    if content is None:
+        await progress.publish(ProcessingStage.DOWNLOAD)
+        logger.info(f"Downloading file from {doc.file_key}")
+        content = await client.adownload(doc.file_key)
+    
+    # 加载文档
+    await progress.publish(ProcessingStage.LOAD)
+    logger.info(f"Loading document, type={doc.file_type}")
+    metadata = {
+        "title": doc.title,
+        "file_type": doc.file_type,
+    }
+    documents = DocumentLoader.load_from_bytes(
+        content=content,
+        file_type=doc.file_type,
+        metadata=metadata,
     )
-    return async_sessionmaker(
-        bind=engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
+    
+    if not documents:
+        raise ValueError("No content extracted from document")
+    
+    # 切分文档
+    await progress.publish(ProcessingStage.SPLIT)
+    logger.info(f"Splitting documents with chunk_size={kb.chunk_size}")
+    chunks = DocumentSplitter.split_documents(
+        documents=documents,
+        chunk_size=kb.chunk_size,
+        chunk_overlap=kb.chunk_overlap,
+        file_type=doc.file_type,
+    )
+    
+    logger.info(f"Split into {len(chunks)} chunks")
+    
+    # 向量化并入库；先清除该文档已有的向量 (自动重试 / 手动重试时上次可能已写入部分批次)
+    await progress.publish(ProcessingStage.EMBED, total=len(chunks))
+    if not await VectorStoreService.delete_by_doc_id(doc.id, kb.embedding_model, kb.vector_collection):
+        raise RuntimeError(f"Failed to clear existing vectors for doc {doc.id}")
+    logger.info("Adding documents to vector store")
+    ids = await VectorStoreService.add_documents(
+        documents=chunks,
+        kb_id=kb.id,
+        doc_id=doc.id,
+        user_id=kb.user_id,
+        embedding_model=kb.embedding_model,
+        batch_size=settings.kb.embed_batch_size,
+        on_progress=progress.embed_progress,
+        collection_name=kb.vector_collection,
+        on_insert=lambda: progress.publish(ProcessingStage.INSERT),
     )
+    return len(chunks), ids
 
 
 async def _process_document_async(doc_id: str) -> dict:
@@ -48,7 +129,6 @@ async def _process_document_async(doc_id: str) -> dict:
         处理结果
     """
     doc_uuid = UUID(doc_id)
-    AsyncSessionLocal = get_async_session()
     
     async with AsyncSessionLocal() as db:
         # 1. 获取文档记录
@@ -69,6 +149,7 @@ async def _process_document_async(doc_id: str) -> dict:
         if kb is None:
             raise ValueError(f"Knowledge base {doc.kb_id} not found")
         
+        progress = ProgressPublisher(kb.id, doc.id)
         try:
             # 3. 更新状态为 PROCESSING
             doc.status = DocumentStatus.PROCESSING
@@ -76,59 +157,56 @@ async def _process_document_async(doc_id: str) -> dict:
             
             logger.info(f"Processing document {doc_id}: {doc.title}")
             
-            # 4. 从 RustFS 下载文件
-            logger.info(f"Downloading file from {doc.file_key}")
+            service = KBService(db)
             client = get_rustfs_client()
-            content = client.download(doc.file_key)
+            content = None
             
-            # 5. 加载文档
-            logger.info(f"Loading document, type={doc.file_type}")
-            metadata = {
-                "title": doc.title,
-                "file_type": doc.file_type,
-            }
-            documents = DocumentLoader.load_from_bytes(
-                content=content,
-                file_type=doc.file_type,
-                metadata=metadata,
-            )
-            
-            if not documents:
-                raise ValueError("No content extracted from document")
+            # 4. 直传文档上传时未计算哈希，先下载再登记
+            if doc.content_hash is None:
+                await progress.publish(ProcessingStage.DOWNLOAD)
+                logger.info(f"Downloading file from {doc.file_key}")
+                content = await client.adownload(doc.file_key)
+                await _register_content(service, client, doc, content)
             
-            # 6. 切分文档
-            logger.info(f"Splitting documents with chunk_size={kb.chunk_size}")
-            chunks = DocumentSplitter.split_documents(
-                documents=documents,
-                chunk_size=kb.chunk_size,
-                chunk_overlap=kb.chunk_overlap,
-                file_type=doc.file_type,
-            )
+            source = await service.find_indexed_duplicate(doc, kb)
+            if source is not None:
+                # 内容相同: 复制来源文档的向量，跳过解析与向量化
+                await progress.publish(ProcessingStage.CLONE, source_doc_id=str(source.id))
+                logger.info(f"Document {doc_id} duplicates {source.id}, cloning vectors")
+                await VectorStoreService.delete_by_doc_id(doc.id, kb.embedding_model, kb.vector_collection)
+                chunk_count = await VectorStoreService.clone_document_vectors(
+                    source_doc_id=source.id,
+                    kb_id=kb.id,
+                    doc_id=doc.id,
+                    user_id=kb.user_id,
+                    metadata={"title": doc.title},
+                    embedding_model=kb.embedding_model,
+                    collection_name=kb.vector_collection,
+                )
+                ids = []
+            else:
+                chunk_count, ids = await _index_content(doc, kb, client, content, progress)
             
-            logger.info(f"Split into {len(chunks)} chunks")
+            # 知识库正在更换模型时同步写入目标集合，失败的文档在切换前的核对中补齐
+            try:
+                await ReembedService(db).sync_document(kb.id, doc.id, kb.vector_collection)
+            except Exception as e:
+                logger.warning(f"Failed to sync doc {doc_id} to re-embedding target: {e}")
             
-            # 7. 向量化并入库
-            logger.info("Adding documents to vector store")
-            ids = await VectorStoreService.add_documents(
-                documents=chunks,
-                kb_id=kb.id,
-                doc_id=doc.id,
-                user_id=kb.user_id,
-                embedding_model=kb.embedding_model,
-            )
-            
-            # 8. 更新状态为 INDEXED
+            # 5. 更新状态为 INDEXED
             doc.status = DocumentStatus.INDEXED
-            doc.chunk_count = len(chunks)
+            doc.chunk_count = chunk_count
             doc.error_msg = None
             await db.commit()
+            await progress.publish(ProcessingStage.DONE, status=doc.status.value, chunk_count=chunk_count)
             
-            logger.info(f"Document {doc_id} indexed successfully with {len(chunks)} chunks")
+            logger.info(f"Document {doc_id} indexed successfully with {chunk_count} chunks")
             
             return {
                 "status": "success",
                 "doc_id": doc_id,
-                "chunk_count": len(chunks),
+                "chunk_count": chunk_count,
+                "deduplicated": source is not None,
                 "vector_ids": ids,
             }
             
@@ -138,7 +216,10 @@ async def _process_document_async(doc_id: str) -> dict:
             doc.status = DocumentStatus.FAILED
             doc.error_msg = str(e)
             await db.commit()
+            await progress.publish(ProcessingStage.FAILED, status=doc.status.value, error=str(e))
             raise
+        finally:
+            await progress.close()
 
 
 @shared_task(
@@ -161,7 +242,7 @@ def process_document(self, doc_id: str) -> dict:
     
     try:
         # 在新的事件循环中运行异步代码
-        result = asyncio.run(_process_document_async(doc_id))
+        result = asyncio.run(_run_with_pools(_process_document_async(doc_id)))
         return result
     except Exception as e:
         logger.error(f"Document processing failed: {e}")
@@ -181,3 +262,53 @@ def retry_failed_document(doc_id: str) -> dict:
     """
     logger.info(f"Retrying failed document {doc_id}")
     return process_document(doc_id)
+
+
+async def _reembed_async(job_id: str) -> dict:
+    """从检查点继续执行重新向量化任务"""
+    async with AsyncSessionLocal() as db:
+        service = ReembedService(db)
+        job = await service.get_job(UUID(job_id))
+        if job is None:
+            logger.info(f"Re-embedding job {job_id} not found")
+            return {"job_id": job_id, "status": "missing"}
+        
+        status = await service.run(job)
+        return {
+            "job_id": job_id,
+            "status": status.value,
+            "processed": job.processed,
+            "total": job.total,
+        }
+
+
+@shared_task(bind=True)
+def reembed_knowledge_base(self, job_id: str) -> dict:
+    """
+    重新向量化任务
+    
+    每次最多执行 kb.reembed_slice_seconds，未完成时重新入队 (进度已按批提交)；
+    失败时任务标记为 failed，经 resume 接口从检查点继续。
+    
+    Args:
+        job_id: 任务ID
+        
+    Returns:
+        本次执行结果
+    """
+    logger.info(f"Running re-embedding job {job_id}")
+    result = asyncio.run(_run_with_pools(_reembed_async(job_id)))
+    if result["status"] == ReembedStatus.RUNNING.value:
+        self.apply_async(args=(job_id,))
+    return result
+
+
+@shared_task
+def purge_abandoned_uploads() -> dict:
+    """
+    清理超过有效期仍未完成直传的文档及其对象
+
+    Returns:
+        删除条数与吞吐
+    """
+    return maintenance.purge_abandoned_uploads().to_dict()
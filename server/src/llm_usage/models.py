@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, Integer, String, ForeignKey, JSON
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String, ForeignKey, JSON
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -11,12 +11,15 @@ from models import Base
 
 class LLMUsage(Base):
     __tablename__ = "llm_usage"
+    __table_args__ = (
+        # 明细查询按用户 + 时间倒序，复合索引同时覆盖仅按 user_id 的过滤
+        Index("ix_llm_usage_user_id_created_at", "user_id", "created_at"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         ForeignKey("users.id", ondelete="CASCADE"),
-        index=True,
         nullable=False,
         comment="用户ID",
     )
@@ -43,6 +46,8 @@ class LLMUsage(Base):
     request_id: Mapped[str | None] = mapped_column(
         String(128),
         nullable=True,
+        unique=True,
+        index=True,
         comment="请求追踪ID",
     )
     trace_id: Mapped[str | None] = mapped_column(
@@ -60,3 +65,49 @@ class LLMUsage(Base):
         server_default=func.now(),
         comment="调用时间",
     )
+
+
+class LLMUsageHourly(Base):
+    """按 用户 / 模型 / 小时 预聚合的用量，随明细写入增量维护"""
+    __tablename__ = "llm_usage_hourly"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="用户ID",
+    )
+    model_name: Mapped[str] = mapped_column(
+        String(100),
+        primary_key=True,
+        comment="模型名称",
+    )
+    bucket: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        primary_key=True,
+        comment="小时起点 (UTC)",
+    )
+    request_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="调用次数",
+    )
+    prompt_tokens: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        default=0,
+        comment="输入Token",
+    )
+    completion_tokens: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        default=0,
+        comment="输出Token",
+    )
+    total_tokens: Mapped[int] = mapped_column(
+        BigInteger,
+        nullable=False,
+        default=0,
+        comment="总Token",
+    )
@@ -0,0 +1,80 @@
+"""
+LLM 用量小时级预聚合
+
+明细写入时在同一事务内把新增记录累加到 llm_usage_hourly，
+汇总接口按整小时读取预聚合表，仅对区间两端不足一小时的部分扫描明细。
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from llm_usage.models import LLMUsageHourly
+
+
+def hour_floor(dt: datetime) -> datetime:
+    """向下取整到小时"""
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_ceil(dt: datetime) -> datetime:
+    """向上取整到小时"""
+    floor = hour_floor(dt)
+    return floor if floor == dt else floor + timedelta(hours=1)
+
+
+def ensure_utc(dt: datetime) -> datetime:
+    """无时区的时间按 UTC 处理"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def hour_bucket(dt: datetime | None) -> datetime:
+    """明细时间所属的小时桶 (统一为 UTC)"""
+    return hour_floor(ensure_utc(dt or datetime.now(timezone.utc)))
+
+
+def build_rollups(rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """把明细行按 (user_id, model_name, 小时) 聚合为增量"""
+    buckets: dict[tuple, dict[str, Any]] = {}
+    for row in rows:
+        key = (row["user_id"], row["model_name"], hour_bucket(row.get("created_at")))
+        item = buckets.get(key)
+        if item is None:
+            item = buckets[key] = {
+                "user_id": key[0],
+                "model_name": key[1],
+                "bucket": key[2],
+                "request_count": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+            }
+        item["request_count"] += 1
+        item["prompt_tokens"] += row.get("prompt_tokens") or 0
+        item["completion_tokens"] += row.get("completion_tokens") or 0
+        item["total_tokens"] += row.get("total_tokens") or 0
+    return list(buckets.values())
+
+
+async def upsert_rollups(session: AsyncSession, rows: Iterable[dict[str, Any]]) -> None:
+    """在当前事务内累加小时桶 (INSERT ... ON CONFLICT DO UPDATE)"""
+    rollups = build_rollups(rows)
+    if not rollups:
+        return
+
+    insert = sqlite.insert if session.bind.dialect.name == "sqlite" else postgresql.insert
+    stmt = insert(LLMUsageHourly).values(rollups)
+    table = LLMUsageHourly.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "model_name", "bucket"],
+        set_={
+            name: table.c[name] + stmt.excluded[name]
+            for name in ("request_count", "prompt_tokens", "completion_tokens", "total_tokens")
+        },
+    )
+    await session.execute(stmt)
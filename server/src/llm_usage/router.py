@@ -23,13 +23,15 @@ router = APIRouter(prefix="/api/llm", tags=["LLM Usage"])
 async def list_llm_usage(
     current_user: Annotated[User, Depends(get_current_active_user)],
     db: Annotated[AsyncSession, Depends(get_async_db)],
-    skip: int = Query(0, ge=0, description="跳过数量"),
+    skip: int = Query(0, ge=0, description="跳过数量 (兼容参数，优先使用 cursor)"),
     limit: int = Query(20, ge=1, le=200, description="返回数量"),
     model_name: str | None = Query(None, description="模型名称过滤"),
     start_at: datetime | None = Query(None, description="开始时间"),
     end_at: datetime | None = Query(None, description="结束时间"),
+    cursor: str | None = Query(None, description="分页游标，取上一页返回的 next_cursor"),
+    include_total: bool = Query(True, description="是否返回总数"),
 ):
-    items, total = await service.list_usage(
+    items, total, next_cursor = await service.list_usage(
         db=db,
         user_id=current_user.id,
         start_at=start_at,
@@ -37,11 +39,14 @@ async def list_llm_usage(
         model_name=model_name,
         skip=skip,
         limit=limit,
+        cursor=cursor,
+        include_total=include_total,
     )
     return success(
         {
             "items": [schemas.LLMUsageResponse.model_validate(item) for item in items],
             "total": total,
+            "next_cursor": next_cursor,
         }
     )
 
@@ -31,7 +31,8 @@ class LLMUsageResponse(BaseModel):
 
 class LLMUsageListResponse(BaseModel):
     items: list[LLMUsageResponse]
-    total: int
+    total: Optional[int] = None
+    next_cursor: Optional[str] = Field(None, description="下一页游标，为空表示没有更多")
 
 
 class LLMUsageSummaryItem(BaseModel):
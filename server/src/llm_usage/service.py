@@ -1,15 +1,18 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Any, Optional
 
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from database import async_session_scope
+from pagination import apply_keyset, split_keyset_page
 from services.logging_service import logger
-from llm_usage.models import LLMUsage
+from llm_usage.models import LLMUsage, LLMUsageHourly
+from llm_usage.rollup import ensure_utc, hour_ceil, hour_floor, upsert_rollups
+from llm_usage.sink import usage_sink
 
 
 def _normalize_usage(usage: dict | None) -> tuple[Optional[int], Optional[int], Optional[int]]:
@@ -60,22 +63,32 @@ async def record_usage(
 
     prompt_tokens, completion_tokens, total_tokens = _normalize_usage(usage)
 
-    usage_record = LLMUsage(
-        user_id=user_id,
-        model_name=model_name or "unknown",
-        prompt_tokens=prompt_tokens,
-        completion_tokens=completion_tokens,
-        total_tokens=total_tokens,
-        request_id=request_id,
-        trace_id=trace_id,
-        meta=meta if meta is not None else usage,
-    )
+    row = {
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "model_name": model_name or "unknown",
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": total_tokens,
+        "request_id": request_id,
+        "trace_id": trace_id,
+        "meta": meta if meta is not None else usage,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+    # 优先交给后台批量写入，请求路径不访问数据库
+    if db is None and usage_sink.submit(row):
+        return
+
+    usage_record = LLMUsage(**row)
 
     if db is None:
         async with async_session_scope() as session:
             session.add(usage_record)
+            await upsert_rollups(session, [row])
     else:
         db.add(usage_record)
+        await upsert_rollups(db, [row])
 
 
 async def record_usage_from_response(
@@ -102,6 +115,22 @@ async def record_usage_from_response(
     )
 
 
+def _detail_filters(
+    user_id: uuid.UUID,
+    start_at: datetime | None,
+    end_at: datetime | None,
+    model_name: str | None,
+) -> list:
+    conditions = [LLMUsage.user_id == user_id]
+    if start_at:
+        conditions.append(LLMUsage.created_at >= start_at)
+    if end_at:
+        conditions.append(LLMUsage.created_at <= end_at)
+    if model_name:
+        conditions.append(LLMUsage.model_name == model_name)
+    return conditions
+
+
 async def list_usage(
     db: AsyncSession,
     user_id: uuid.UUID,
@@ -110,21 +139,47 @@ async def list_usage(
     model_name: str | None,
     skip: int,
     limit: int,
-) -> tuple[list[LLMUsage], int]:
-    stmt = select(LLMUsage).where(LLMUsage.user_id == user_id)
-    if start_at:
-        stmt = stmt.where(LLMUsage.created_at >= start_at)
-    if end_at:
-        stmt = stmt.where(LLMUsage.created_at <= end_at)
-    if model_name:
-        stmt = stmt.where(LLMUsage.model_name == model_name)
+    cursor: str | None = None,
+    include_total: bool = True,
+) -> tuple[list[LLMUsage], int | None, str | None]:
+    conditions = _detail_filters(user_id, start_at, end_at, model_name)
 
-    count_stmt = select(func.count()).select_from(stmt.subquery())
-    total = (await db.execute(count_stmt)).scalar_one()
+    total = None
+    if include_total:
+        # 直接 COUNT，由 (user_id, created_at) 复合索引支撑
+        count_stmt = select(func.count()).select_from(LLMUsage).where(*conditions)
+        total = (await db.execute(count_stmt)).scalar_one()
 
-    stmt = stmt.order_by(LLMUsage.created_at.desc()).offset(skip).limit(limit)
-    items = (await db.execute(stmt)).scalars().all()
-    return items, total
+    stmt = apply_keyset(select(LLMUsage).where(*conditions), LLMUsage.created_at, LLMUsage.id, cursor, limit)
+    if skip and not cursor:
+        stmt = stmt.offset(skip)
+    items, next_cursor = split_keyset_page((await db.execute(stmt)).scalars().all(), limit)
+    return items, total, next_cursor
+
+
+async def _aggregate(
+    db: AsyncSession,
+    model: Any,
+    time_col: Any,
+    group_by: str,
+    conditions: list,
+) -> list:
+    if group_by == "model":
+        group_col = model.model_name
+    else:
+        group_col = func.date_trunc("day", time_col)
+
+    stmt = (
+        select(
+            group_col.label("group_key"),
+            func.coalesce(func.sum(model.prompt_tokens), 0).label("prompt_tokens"),
+            func.coalesce(func.sum(model.completion_tokens), 0).label("completion_tokens"),
+            func.coalesce(func.sum(model.total_tokens), 0).label("total_tokens"),
+        )
+        .where(*conditions)
+        .group_by(group_col)
+    )
+    return (await db.execute(stmt)).all()
 
 
 async def summary_usage(
@@ -135,41 +190,64 @@ async def summary_usage(
     model_name: str | None,
     group_by: str,
 ) -> list[dict]:
-    if group_by == "model":
-        group_col = LLMUsage.model_name
+    """
+    用量汇总
+
+    整小时部分读取 llm_usage_hourly，区间两端不足一小时的部分扫描明细后合并
+    """
+    start_at = ensure_utc(start_at) if start_at else None
+    end_at = ensure_utc(end_at) if end_at else None
+    rollup_start = hour_ceil(start_at) if start_at else None
+    rollup_end = hour_floor(end_at) if end_at else None
+
+    rows = []
+    raw_ranges: list[tuple[datetime | None, datetime | None, bool]] = []
+    if rollup_start and rollup_end and rollup_start >= rollup_end:
+        # 区间不足一个完整小时，全部走明细
+        raw_ranges.append((start_at, end_at, True))
     else:
-        group_col = func.date_trunc("day", LLMUsage.created_at)
-
-    stmt = select(
-        group_col.label("group_key"),
-        func.coalesce(func.sum(LLMUsage.prompt_tokens), 0).label("prompt_tokens"),
-        func.coalesce(func.sum(LLMUsage.completion_tokens), 0).label("completion_tokens"),
-        func.coalesce(func.sum(LLMUsage.total_tokens), 0).label("total_tokens"),
-    ).where(LLMUsage.user_id == user_id)
-
-    if start_at:
-        stmt = stmt.where(LLMUsage.created_at >= start_at)
-    if end_at:
-        stmt = stmt.where(LLMUsage.created_at <= end_at)
-    if model_name:
-        stmt = stmt.where(LLMUsage.model_name == model_name)
-
-    stmt = stmt.group_by(group_col).order_by(group_col)
-    rows = (await db.execute(stmt)).all()
+        conditions = [LLMUsageHourly.user_id == user_id]
+        if rollup_start:
+            conditions.append(LLMUsageHourly.bucket >= rollup_start)
+        if rollup_end:
+            conditions.append(LLMUsageHourly.bucket < rollup_end)
+        if model_name:
+            conditions.append(LLMUsageHourly.model_name == model_name)
+        rows.extend(await _aggregate(db, LLMUsageHourly, LLMUsageHourly.bucket, group_by, conditions))
+
+        if start_at and rollup_start != start_at:
+            raw_ranges.append((start_at, rollup_start, False))
+        if end_at:
+            raw_ranges.append((rollup_end, end_at, True))
+
+    for range_start, range_end, include_end in raw_ranges:
+        conditions = _detail_filters(user_id, range_start, None, model_name)
+        if range_end is not None:
+            conditions.append(
+                LLMUsage.created_at <= range_end if include_end else LLMUsage.created_at < range_end
+            )
+        rows.extend(await _aggregate(db, LLMUsage, LLMUsage.created_at, group_by, conditions))
+
+    merged: dict[Any, list[int]] = {}
+    for row in rows:
+        totals = merged.setdefault(row.group_key, [0, 0, 0])
+        totals[0] += int(row.prompt_tokens)
+        totals[1] += int(row.completion_tokens)
+        totals[2] += int(row.total_tokens)
 
     items = []
-    for row in rows:
-        group_key = row.group_key
+    for group_key in sorted(merged):
         if isinstance(group_key, datetime):
             group_value = group_key.date().isoformat()
         else:
             group_value = str(group_key)
+        prompt_tokens, completion_tokens, total_tokens = merged[group_key]
         items.append(
             {
                 "group": group_value,
-                "prompt_tokens": int(row.prompt_tokens),
-                "completion_tokens": int(row.completion_tokens),
-                "total_tokens": int(row.total_tokens),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": total_tokens,
             }
         )
 
@@ -0,0 +1,191 @@
+"""
+LLM 用量异步写入器
+
+请求路径只把用量记录放入进程内队列，后台任务按批量大小或时间间隔
+以多行 INSERT 写库，并以 request_id 去重 (ON CONFLICT DO NOTHING)，
+实际插入的记录在同一事务内累加到小时预聚合表。
+写库失败时按退避重试整批 (request_id 去重保证幂等)，仍失败则逐条写入，只丢弃写不进的记录。
+应用关闭时由 lifespan 调用 stop() 排空队列。
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncContextManager, Callable, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from database import async_session_scope
+from services.logging_service import logger
+from llm_usage.models import LLMUsage
+from llm_usage.rollup import upsert_rollups
+
+
+_STOP = object()
+
+
+class UsageSink:
+    """批量写入 llm_usage 的后台队列"""
+
+    def __init__(
+        self,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        queue_size: int | None = None,
+        flush_retries: int | None = None,
+        retry_backoff: float | None = None,
+        session_scope: Callable[[], AsyncContextManager[AsyncSession]] = async_session_scope,
+    ):
+        conf = settings.llm_usage
+        self.batch_size = conf.batch_size if batch_size is None else batch_size
+        self.flush_interval = conf.flush_interval if flush_interval is None else flush_interval
+        self.queue_size = conf.queue_size if queue_size is None else queue_size
+        self.flush_retries = conf.flush_retries if flush_retries is None else flush_retries
+        self.retry_backoff = conf.retry_backoff if retry_backoff is None else retry_backoff
+        self.session_scope = session_scope
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.overflow_inline = 0  # 队列满时退回调用方直接写库的记录数
+        self.written = 0
+        self.dropped = 0  # 重试与逐条写入后仍失败而丢弃的记录数
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """启动后台写入任务"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"UsageSink started: batch_size={self.batch_size}, flush_interval={self.flush_interval}s"
+        )
+
+    async def stop(self) -> None:
+        """停止后台任务并写完队列中剩余的记录"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+        logger.info(
+            f"UsageSink stopped: written={self.written}, overflow_inline={self.overflow_inline}, dropped={self.dropped}"
+        )
+
+    def submit(self, row: dict[str, Any]) -> bool:
+        """
+        提交一条用量记录 (不阻塞、不访问数据库)
+
+        Returns:
+            是否入队成功；队列已满时返回 False 并计数，由调用方直接写库
+        """
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            self.overflow_inline += 1
+            logger.warning(
+                f"UsageSink queue full, writing usage record inline (total overflow={self.overflow_inline})"
+            )
+            return False
+
+    async def _collect_batch(self) -> tuple[list[dict[str, Any]], bool]:
+        """
+        等待首条记录，再在 flush_interval 内凑满一批
+
+        Returns:
+            (记录列表, 是否收到停止信号)
+        """
+        item = await self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect_batch()
+            if not batch:
+                continue
+            await self._flush_with_retry(batch)
+
+    async def _flush_with_retry(self, batch: list[dict[str, Any]]) -> None:
+        """整批按退避重试，仍失败时逐条写入，隔离写不进的记录"""
+        delay = self.retry_backoff
+        for attempt in range(self.flush_retries + 1):
+            try:
+                await self._flush(batch)
+                return
+            except Exception as exc:
+                if attempt == self.flush_retries:
+                    logger.warning(f"UsageSink flush failed after {attempt} retries, writing records one by one: {exc}")
+                    break
+                logger.warning(f"UsageSink flush failed, retrying in {delay}s: {exc}")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        lost = 0
+        for row in batch:
+            try:
+                await self._flush([row])
+            except Exception as exc:
+                lost += 1
+                error = exc
+        if lost:
+            self.dropped += lost
+            logger.error(f"UsageSink dropped {lost}/{len(batch)} usage records: {error}")
+
+    async def _flush(self, batch: list[dict[str, Any]]) -> None:
+        """多行 INSERT，按 request_id 幂等"""
+        rows: list[dict[str, Any]] = []
+        seen: set[str] = set()
+        for row in batch:
+            request_id = row.get("request_id")
+            if request_id is not None:
+                if request_id in seen:
+                    continue
+                seen.add(request_id)
+            rows.append(row)
+
+        async with self.session_scope() as session:
+            dialect = session.bind.dialect.name
+            insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+            stmt = (
+                insert(LLMUsage)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["request_id"])
+                .returning(LLMUsage.id)
+            )
+            inserted = set((await session.execute(stmt)).scalars().all())
+            # 重复的 request_id 未插入，不计入预聚合
+            inserted_rows = [row for row in rows if row["id"] in inserted]
+            await upsert_rollups(session, inserted_rows)
+
+        self.written += len(inserted_rows)
+        logger.debug(f"UsageSink flushed {len(inserted_rows)} usage records")
+
+
+# 全局单例
+usage_sink = UsageSink()
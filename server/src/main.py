@@ -1,13 +1,15 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from scalar_fastapi import get_scalar_api_reference
 
 from config import settings
 from exceptions import init_exception_handlers
-from services.logging_service import init_logging
+from services.logging_service import init_logging, logger
 from auth import dependencies, models
 from auth.router import router as auth_router
 from rustfs.router import router as rustfs_router
@@ -16,6 +18,12 @@ from knowledgebase.router import router as kb_router
 from llm_usage.router import router as llm_usage_router
 from agent.dependencies import init_agent_dependencies, close_agent_dependencies
 from rustfs.client import get_rustfs_client
+from llm_usage.sink import usage_sink
+from auth.cache import auth_cache
+from database import async_session_scope
+from connection_budget import connection_budget
+from knowledgebase.core.embedding import EmbeddingService
+from knowledgebase.services.vector_store import VectorStoreService
 
 
 @asynccontextmanager
@@ -26,17 +34,35 @@ async def lifespan(app: FastAPI):
     
     # 初始化 Agent 依赖 (DB, Checkpointer, Store)
     await init_agent_dependencies()
+
+    # 启动 LLM 用量批量写入
+    await usage_sink.start()
+
+    # 同步撤销名单到 Redis (Redis 数据丢失后自愈)
+    try:
+        async with async_session_scope() as db:
+            await auth_cache.warm_revoked(db)
+    except Exception as e:
+        logger.warning(f"Failed to warm revoked token cache: {e}")
     
     # 初始化 MinIO Bucket
     try:
-        get_rustfs_client().ensure_bucket_exists()
+        await get_rustfs_client().aensure_bucket_exists()
     except Exception as e:
         # Log error but don't crash if MinIO is down (optional)
         pass 
+    
+    # 预热 Embedding 模型 (在线程中执行，完成前不接受请求，首个 RAG 请求不再承担冷启动)
+    if settings.kb.warmup_on_start:
+        await asyncio.to_thread(VectorStoreService.warm_up)
         
     yield
-    # 关闭时清理
+    # 关闭时清理 (先排空用量队列)
+    await usage_sink.stop()
+    await auth_cache.close()
     await close_agent_dependencies()
+    get_rustfs_client().close()
+    await connection_budget.dispose_async()
 
 
 app = FastAPI(
@@ -75,6 +101,29 @@ async def scalar_docs():
     )
 
 
+@app.get("/health", include_in_schema=False)
+async def health():
+    """健康检查: Embedding 模型未就绪 (预热失败) 时返回 503"""
+    embedding = EmbeddingService.readiness()
+    if not embedding["ready"] and EmbeddingService.is_remote():
+        # Embedding 服务可能晚于 API 启动，未就绪时重新探测 (短超时、限频)
+        await EmbeddingService.probe_remote()
+        embedding = EmbeddingService.readiness()
+    ready = embedding["ready"] or not settings.kb.warmup_on_start
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ok" if ready else "starting", "embedding": embedding},
+    )
+
+
+@app.get("/metrics/db")
+async def db_pool_metrics(
+    current_user: Annotated[models.User, Depends(dependencies.get_current_admin_user)],
+):
+    """本进程数据库连接池分配与饱和度 (in_use / max)，仅管理员可访问"""
+    return connection_budget.snapshot()
+
+
 @app.get("/info")
 async def info(
     current_user: Annotated[models.User, Depends(dependencies.get_current_active_user)],
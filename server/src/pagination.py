@@ -1,5 +1,12 @@
-from typing import Any, Dict, List
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Select, tuple_
+
 import response
+from exceptions import AppError, ErrorCode
 
 
 def build_page(items: List[Any], total: int, limit: int, offset: int) -> Dict[str, Any]:
@@ -30,3 +37,62 @@ def build_page_response(items: List[Any], total: int, limit: int, offset: int) -
     """
     page_data = build_page(items, total, limit, offset)
     return response.success(page_data)
+
+
+# ==================== 游标 (Keyset) 分页 ====================
+
+def encode_cursor(created_at: datetime, item_id: UUID) -> str:
+    """
+    将 (created_at, id) 编码为不透明游标
+    :param created_at: 最后一条记录的创建时间
+    :param item_id: 最后一条记录的ID
+    :return: URL 安全的游标字符串
+    """
+    raw = f"{created_at.isoformat()}|{item_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    解析游标
+    :param cursor: encode_cursor 生成的游标
+    :return: (created_at, id)
+    :raises AppError: 游标格式非法
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), UUID(item_id)
+    except (ValueError, UnicodeDecodeError):
+        raise AppError(ErrorCode.VALIDATION_ERROR, "无效的分页游标")
+
+
+def apply_keyset(stmt: Select, created_col: Any, id_col: Any, cursor: Optional[str], limit: int) -> Select:
+    """
+    按 (created_at DESC, id DESC) 追加游标条件与排序
+    多取一条用于判断是否存在下一页
+    :param stmt: 已包含过滤条件的查询
+    :param created_col: 创建时间列
+    :param id_col: 主键列
+    :param cursor: 上一页返回的游标，None 表示第一页
+    :param limit: 每页数量
+    :return: 新的查询
+    """
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(created_col, id_col) < tuple_(created_at, item_id))
+    return stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def split_keyset_page(rows: List[Any], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    截取当前页并生成下一页游标
+    :param rows: apply_keyset 查询结果 (最多 limit + 1 条)
+    :param limit: 每页数量
+    :return: (当前页数据, 下一页游标或 None)
+    """
+    if len(rows) <= limit:
+        return list(rows), None
+    items = list(rows[:limit])
+    last = items[-1]
+    return items, encode_cursor(last.created_at, last.id)
@@ -1,13 +1,39 @@
-from typing import Any, Dict, Optional
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional
+import asyncio
+import functools
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import certifi
+import urllib3
 from minio import Minio
 from minio.error import S3Error
 from datetime import timedelta
 from config import settings
+from rustfs.metrics import StorageMetrics, tracked
+from rustfs.utils import HashingReader
+
+
+def _build_http_client(pool_maxsize: int) -> urllib3.PoolManager:
+    """与 MinIO 默认一致的连接池，放大连接数并设置超时与重试"""
+    conf = settings.storage
+    return urllib3.PoolManager(
+        timeout=urllib3.Timeout(connect=conf.connect_timeout, read=conf.read_timeout),
+        maxsize=pool_maxsize,
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+        retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    )
 
 
 class RustfsClient:
-    """Rustfs (MinIO) 文件存储客户端封装"""
+    """
+    Rustfs (MinIO) 文件存储客户端封装
+
+    同步方法直接调用 MinIO；异步代码使用 a 前缀的方法，
+    在有界线程池中执行，避免阻塞事件循环。
+    """
 
     def __init__(
         self,
@@ -16,20 +42,40 @@ class RustfsClient:
         secret_key: str,
         bucket_name: str = "axiom",
         secure: bool = False,
+        pool_maxsize: Optional[int] = None,
+        max_workers: Optional[int] = None,
     ):
+        conf = settings.storage
         self.bucket_name = bucket_name
         self.client = Minio(
             endpoint=endpoint,
             access_key=access_key,
             secret_key=secret_key,
             secure=secure,
+            http_client=_build_http_client(pool_maxsize or conf.pool_maxsize),
+        )
+        self.metrics = StorageMetrics()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or conf.max_workers,
+            thread_name_prefix="rustfs",
         )
 
+    async def _run(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self) -> None:
+        """关闭线程池与连接池"""
+        self._executor.shutdown(wait=False)
+        self.client._http.clear()
+
+    @tracked("ensure_bucket")
     def ensure_bucket_exists(self) -> None:
         """确保 Bucket 存在，不存在则创建"""
         if not self.client.bucket_exists(self.bucket_name):
             self.client.make_bucket(self.bucket_name)
 
+    @tracked("upload")
     def upload(
         self,
         file_name: str,
@@ -62,6 +108,46 @@ class RustfsClient:
         except S3Error as e:
             raise Exception(f"Upload failed: {e}") from e
 
+    @tracked("upload")
+    def upload_stream(
+        self,
+        file_name: str,
+        stream: BinaryIO,
+        content_type: str = "application/octet-stream",
+        part_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        流式上传 (分片上传，长度未知)
+        每次只读取一个分片到内存，同时计算大小与 SHA-256
+        阻塞调用，异步代码中请放到线程中执行
+        :param file_name: 文件名
+        :param stream: 可读的二进制流 (如 UploadFile.file)
+        :param content_type: MIME类型
+        :param part_size: 分片大小，最小 5MiB
+        :return: 上传结果，额外包含 size / sha256
+        """
+        reader = HashingReader(stream)
+        try:
+            result = self.client.put_object(
+                self.bucket_name,
+                file_name,
+                reader,
+                length=-1,
+                part_size=part_size or settings.storage.upload_part_size,
+                content_type=content_type,
+            )
+            return {
+                "bucket": result.bucket_name,
+                "object": result.object_name,
+                "etag": result.etag,
+                "version_id": result.version_id,
+                "size": reader.size,
+                "sha256": reader.sha256,
+            }
+        except S3Error as e:
+            raise Exception(f"Upload failed: {e}") from e
+
+    @tracked("download")
     def download(self, file_name: str) -> bytes:
         """
         下载文件
@@ -79,6 +165,60 @@ class RustfsClient:
             if e.code == "NoSuchKey":
                 raise FileNotFoundError(f"File not found: {file_name}")
             raise Exception(f"Download failed: {e}") from e
+
+    @tracked("download")
+    def iter_download(
+        self,
+        file_name: str,
+        offset: int = 0,
+        length: int = 0,
+        chunk_size: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """
+        流式下载，按块产出内容
+        对象在调用时即打开 (不存在时立即报错)，迭代结束或中途关闭时释放连接
+        :param file_name: 文件名
+        :param offset: 起始偏移
+        :param length: 读取长度，0 表示到结尾
+        :param chunk_size: 每块大小
+        :return: 内容块迭代器
+        """
+        try:
+            response = self.client.get_object(self.bucket_name, file_name, offset=offset, length=length)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise FileNotFoundError(f"File not found: {file_name}")
+            raise Exception(f"Download failed: {e}") from e
+        return self._iter_response(response, chunk_size or settings.storage.download_chunk_size)
+
+    @staticmethod
+    def _iter_response(response: Any, chunk_size: int) -> Iterator[bytes]:
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+
+    @tracked("stat")
+    def stat(self, file_name: str) -> Dict[str, Any]:
+        """
+        获取对象元数据
+        :param file_name: 文件名
+        :return: size / etag / content_type
+        """
+        try:
+            result = self.client.stat_object(self.bucket_name, file_name)
+            return {
+                "size": result.size,
+                "etag": result.etag,
+                "content_type": result.content_type,
+            }
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                raise FileNotFoundError(f"File not found: {file_name}")
+            raise Exception(f"Stat failed: {e}") from e
+
+    @tracked("delete")
     def delete(self, file_name: str) -> bool:
         """
         删除文件
@@ -92,6 +232,7 @@ class RustfsClient:
             # MinIO remove_object 即使对象不存在也不会报错，这里捕获其他错误
             raise Exception(f"Delete failed: {e}") from e
 
+    @tracked("presign")
     def presign(
         self,
         file_name: str,
@@ -127,6 +268,32 @@ class RustfsClient:
         except S3Error as e:
             raise Exception(f"Presign failed: {e}") from e
 
+    # ==================== 异步接口 ====================
+
+    async def aensure_bucket_exists(self) -> None:
+        await self._run(self.ensure_bucket_exists)
+
+    async def aupload(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.upload, *args, **kwargs)
+
+    async def aupload_stream(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.upload_stream, *args, **kwargs)
+
+    async def adownload(self, *args, **kwargs) -> bytes:
+        return await self._run(self.download, *args, **kwargs)
+
+    async def aiter_download(self, *args, **kwargs) -> Iterator[bytes]:
+        """打开对象并返回同步块迭代器 (交给 StreamingResponse 在线程中迭代)"""
+        return await self._run(self.iter_download, *args, **kwargs)
+
+    async def astat(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.stat, *args, **kwargs)
+
+    async def adelete(self, *args, **kwargs) -> bool:
+        return await self._run(self.delete, *args, **kwargs)
+
+    async def apresign(self, *args, **kwargs) -> str:
+        return await self._run(self.presign, *args, **kwargs)
 
 
 # 单例客户端
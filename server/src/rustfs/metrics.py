@@ -0,0 +1,76 @@
+"""
+对象存储调用指标
+
+记录每类操作的调用次数、失败次数、耗时与当前并发数，
+调用在线程池中执行，计数需加锁。
+"""
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator
+
+
+@dataclass
+class _OpStats:
+    count: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class StorageMetrics:
+    """存储客户端指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops: Dict[str, _OpStats] = {}
+        self.in_flight = 0
+
+    @contextmanager
+    def track(self, op: str) -> Iterator[None]:
+        with self._lock:
+            self.in_flight += 1
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.in_flight -= 1
+                stats = self._ops.setdefault(op, _OpStats())
+                stats.count += 1
+                stats.errors += int(failed)
+                stats.total_seconds += elapsed
+                stats.max_seconds = max(stats.max_seconds, elapsed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "ops": {
+                    op: {
+                        "count": stats.count,
+                        "errors": stats.errors,
+                        "avg_ms": round(stats.total_seconds / stats.count * 1000, 2) if stats.count else 0.0,
+                        "max_ms": round(stats.max_seconds * 1000, 2),
+                    }
+                    for op, stats in self._ops.items()
+                },
+            }
+
+
+def tracked(op: str) -> Callable:
+    """方法装饰器: 以 self.metrics 记录调用"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.track(op):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,18 +1,18 @@
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, File, UploadFile, Form
-from fastapi.responses import StreamingResponse
-import io
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, Form
+from fastapi.responses import RedirectResponse, StreamingResponse
 
 from database import get_async_db
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from config import settings
 from response import success
 from rustfs.dependencies import get_rustfs_service
 from rustfs.service import RustfsService
-from rustfs import schemas, models
-from auth.dependencies import get_current_active_user, get_current_user
+from rustfs import schemas, models, utils
+from auth.dependencies import get_current_active_user, get_current_admin_user, get_current_user
 from auth.models import User
 
 router = APIRouter(prefix="/files", tags=["Files"])
@@ -44,20 +44,69 @@ async def upload_file(
 @router.post("/download/{file_id}")
 async def download_file(
     file_id: UUID,
+    request: Request,
     service: Annotated[RustfsService, Depends(get_rustfs_service)],
     current_user: Annotated[User, Depends(get_current_user)], # 强制要求 Token
+    redirect: bool = Query(False, description="是否重定向到预签名 GET 地址，由存储直接提供内容"),
 ):
-    """下载文件 (POST)"""
-    content, filename = await service.download_file(file_id, user=current_user)
+    """
+    下载文件 (POST)
     
-    # 返回流式响应
+    - 支持单段 Range 请求 (206) 与 If-None-Match (304)
+    - redirect=true 时返回 303 跳转到预签名地址
+    """
+    record = await service.get_downloadable_file(file_id, user=current_user)
+    disposition = utils.content_disposition(record.filename)
+    
+    if redirect:
+        url = await service.client.apresign(
+            record.object_key,
+            "GET",
+            settings.storage.download_redirect_expires,
+            {"response-content-disposition": disposition},
+        )
+        return RedirectResponse(url, status_code=303)
+    
+    headers = {"Content-Disposition": disposition, "Accept-Ranges": "bytes"}
+    if record.etag:
+        etag = record.etag.strip('"')
+        headers["ETag"] = f'"{etag}"'
+        if utils.etag_matches(request.headers.get("if-none-match"), record.etag):
+            return Response(status_code=304, headers=headers)
+    
+    try:
+        byte_range = utils.parse_range(request.headers.get("range"), record.size)
+    except ValueError:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{record.size}"})
+    
+    status_code = 200
+    start, end = 0, record.size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{record.size}"
+    length = end - start + 1
+    headers["Content-Length"] = str(length)
+    
+    # 按块从 MinIO 读取，不在内存中缓冲整个文件
+    chunks = await service.client.aiter_download(record.object_key, start, length)
     return StreamingResponse(
-        io.BytesIO(content),
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        chunks,
+        status_code=status_code,
+        media_type=record.content_type or "application/octet-stream",
+        headers=headers,
     )
 
 
+@router.get("/metrics")
+async def storage_metrics(
+    service: Annotated[RustfsService, Depends(get_rustfs_service)],
+    current_user: Annotated[User, Depends(get_current_admin_user)],
+):
+    """对象存储调用指标 (当前并发数、各操作次数/失败数/耗时)，仅管理员可访问"""
+    return success(service.client.metrics.snapshot())
+
+
 @router.post("/{file_id}")
 async def delete_file(
     file_id: UUID,
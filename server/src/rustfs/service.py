@@ -1,14 +1,12 @@
 import uuid
 from datetime import datetime
-from typing import Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, UploadFile
 
-from config import settings
 from rustfs import models, schemas
-from rustfs.client import RustfsClient
+from rustfs.client import RustfsClient, get_rustfs_client
 from auth.models import User
 
 
@@ -19,13 +17,8 @@ class RustfsService:
 
     @staticmethod
     def _get_client() -> RustfsClient:
-        return RustfsClient(
-            endpoint=settings.storage.rustfs_endpoint,
-            access_key=settings.storage.access_key,
-            secret_key=settings.storage.secret_key,
-            bucket_name=settings.storage.bucket_name,
-            secure=settings.storage.secure,
-        )
+        # 复用进程级客户端 (共享连接池与线程池)
+        return get_rustfs_client()
 
     def generate_object_key(self, module: str, resource: str, owner_id: uuid.UUID, filename: str) -> str:
         """生成对象存储 Key: {module}/{resource}/{yyyy}/{mm}/{owner_id}/{uuid}_{origin_name}"""
@@ -51,14 +44,13 @@ class RustfsService:
     ) -> schemas.UploadResponse:
         """上传文件并记录元数据"""
         
-        content = await file_obj.read()
-        size = len(content)
         content_type = file_obj.content_type or "application/octet-stream"
         
         object_key = self.generate_object_key(module, resource, user.id, file_obj.filename)
         
-        # 上传到 MinIO
-        result = self.client.upload(object_key, content, content_type)
+        # 流式分片上传到 MinIO (在线程中执行，不阻塞事件循环)
+        result = await self.client.aupload_stream(object_key, file_obj.file, content_type)
+        size = result["size"]
         etag = result.get("etag")
         
         # 写入数据库
@@ -93,8 +85,8 @@ class RustfsService:
             raise HTTPException(status_code=404, detail="File not found")
         return record
 
-    async def download_file(self, file_id: uuid.UUID, user: User) -> Tuple[bytes, str]:
-        """下载文件内容"""
+    async def get_downloadable_file(self, file_id: uuid.UUID, user: User) -> models.FileObject:
+        """获取可下载的文件记录 (权限校验)，内容由调用方流式读取"""
         record = await self.get_file(file_id)
         
         # 权限校验 (强制鉴权后，user 一定存在)
@@ -103,8 +95,7 @@ class RustfsService:
                 # TODO: 增加业务关联权限校验逻辑
                 raise HTTPException(status_code=403, detail="Permission denied")
         
-        content = self.client.download(record.object_key)
-        return content, record.filename
+        return record
 
     async def delete_file(self, file_id: uuid.UUID, user: User) -> bool:
         """删除文件"""
@@ -115,7 +106,7 @@ class RustfsService:
              raise HTTPException(status_code=403, detail="Permission denied")
              
         # 从 MinIO 删除
-        self.client.delete(record.object_key)
+        await self.client.adelete(record.object_key)
         
         # 从数据库删除
         await self.db.delete(record)
@@ -0,0 +1,81 @@
+import hashlib
+from typing import BinaryIO, Optional, Tuple
+from urllib.parse import quote
+
+
+class HashingReader:
+    """
+    只读流包装: 读取时累计字节数并计算 SHA-256
+
+    用于流式上传时在不额外缓冲整个文件的前提下得到大小与校验和
+    """
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        if data:
+            self.size += len(data)
+            self._sha256.update(data)
+        return data
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 HTTP Range 头 (bytes=start-end / bytes=start- / bytes=-suffix)
+    :param header: Range 头，为空或非 bytes 单位时返回 None (返回完整内容)
+    :param size: 对象大小
+    :return: (start, end)，end 为闭区间
+    :raises ValueError: 范围不可满足 (416)
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        # 多段范围不支持，按完整内容返回
+        return None
+
+    start_text, _, end_text = spec.partition("-")
+    try:
+        if not start_text:
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise ValueError("Unsatisfiable range")
+            return max(size - suffix, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError("Unsatisfiable range")
+
+    if start >= size or end < start:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """If-None-Match 是否命中 (弱比较)"""
+    if not if_none_match or not etag:
+        return False
+    target = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == target:
+            return True
+    return False
+
+
+def content_disposition(filename: str) -> str:
+    """attachment 头，非 ASCII 文件名使用 RFC 5987 编码"""
+    ascii_name = filename.encode("ascii", "ignore").decode("ascii").replace('"', "") or "download"
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
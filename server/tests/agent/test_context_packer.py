@@ -0,0 +1,53 @@
+from langchain_core.documents import Document
+
+from agent.context import ContextPacker, estimate_tokens
+
+
+def _count(text: str) -> int:
+    return len(text)
+
+
+def test_merge_adjacent_chunks_by_start_index():
+    """同一文档相邻切片按 start_index 合并。"""
+    docs = [
+        Document(page_content="abcdef", metadata={"doc_id": "d1", "start_index": 0}),
+        Document(page_content="defghi", metadata={"doc_id": "d1", "start_index": 3}),
+    ]
+    packed = ContextPacker(token_counter=_count, token_budget=100).pack(docs)
+    assert [b.text for b in packed] == ["abcdefghi"]
+
+
+def test_merge_overlapping_chunks_by_text():
+    """缺少 start_index 时按首尾重叠文本合并，并去除重复片段。"""
+    docs = [
+        Document(page_content="第一句话。第二句话。", metadata={"doc_id": "d1", "page": 1}),
+        Document(page_content="第二句话。第三句话。", metadata={"doc_id": "d1", "page": 1}),
+        Document(page_content="第一句话。", metadata={"doc_id": "d1", "page": 1}),
+    ]
+    packed = ContextPacker(token_counter=_count, token_budget=100, min_overlap=3).pack(docs)
+    assert [b.text for b in packed] == ["第一句话。第二句话。第三句话。"]
+
+
+def test_greedy_fill_by_score():
+    """按分数贪心填充预算，放不下的片段被跳过。"""
+    docs = [
+        Document(page_content="x" * 50, metadata={"doc_id": "a", "score": 0.9}),
+        Document(page_content="y" * 80, metadata={"doc_id": "b", "score": 0.8}),
+        Document(page_content="z" * 30, metadata={"doc_id": "c", "score": 0.7}),
+    ]
+    packed = ContextPacker(token_counter=_count, token_budget=100).pack(docs)
+    assert [b.text[0] for b in packed] == ["x", "z"]
+    assert sum(b.tokens for b in packed) <= 100
+
+
+def test_truncate_top_block_at_sentence_boundary():
+    """最相关片段超出预算时在句子边界截断。"""
+    docs = [Document(page_content="短句。" + "很长的一句话" * 20 + "。", metadata={"doc_id": "a"})]
+    packed = ContextPacker(token_counter=_count, token_budget=10).pack(docs)
+    assert [b.text for b in packed] == ["短句。"]
+
+
+def test_estimate_tokens():
+    """CJK 字符按 1 Token 估算。"""
+    assert estimate_tokens("你好") == 2
+    assert estimate_tokens("abcd") == 1
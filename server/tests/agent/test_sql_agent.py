@@ -0,0 +1,103 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from agent.constants import NOSTREAM_TAG, STREAM_INCLUDE_NAMES, STREAM_INCLUDE_TYPES
+from agent.exceptions import SQLValidationError
+from agent.sql import SQLGuard, SchemaSnapshot, TableInfo
+from agent.subagents.sql_agent import SQLAgent, extract_sql
+from agent.utils import convert_to_vercel_sse
+
+
+def make_guard():
+    return SQLGuard([("public", "orders")], max_rows=100)
+
+
+def test_guard_adds_limit_and_normalizes():
+    """自动追加 LIMIT，格式不同的同一查询得到相同 SQL。"""
+    guard = make_guard()
+    assert guard.validate("select id from orders") == "SELECT id FROM orders LIMIT 100"
+    assert guard.validate("SELECT  id\nFROM orders LIMIT 500") == "SELECT id FROM orders LIMIT 100"
+    assert guard.validate("select id from orders limit 5") == "SELECT id FROM orders LIMIT 5"
+
+
+@pytest.mark.parametrize("sql", [
+    "delete from orders",
+    "select 1; drop table orders",
+    "select * from users",
+    "select * from pg_catalog.pg_roles",
+    "select pg_sleep(10)",
+    "select * from orders for update",
+    "select * into t2 from orders",
+    "select schema_to_xml('public', true, false, '')",
+    "select database_to_xml(true, false, '')",
+    "select pg_try_advisory_lock(1)",
+    "select lo_get(1)",
+    "select * from generate_series(1, 1000000000)",
+    "select evil.lower(status) from orders",
+])
+def test_guard_rejects_unsafe_sql(sql):
+    with pytest.raises(SQLValidationError):
+        make_guard().validate(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "select date_trunc('day', created_at), count(distinct user_id), sum(amount) from orders group by 1",
+    "select to_char(created_at, 'YYYY-MM'), round(avg(amount)::numeric, 2) from orders group by 1",
+    "select id, row_number() over (partition by user_id order by created_at) from orders",
+    "select coalesce(meta->>'channel', '-'), lower(status) from orders where created_at > now() - interval '7 day'",
+    "select percentile_cont(0.5) within group (order by amount) from orders",
+])
+def test_guard_allows_common_functions(sql):
+    """白名单覆盖常用的聚合、窗口、日期与字符串函数。"""
+    make_guard().validate(sql)
+
+
+def test_extract_sql_strips_fence():
+    assert extract_sql("```sql\nSELECT 1;\n```") == "SELECT 1"
+
+
+class FakeExecutor:
+    dsn = "fake"
+
+    def __init__(self):
+        self.executed = []
+
+    async def stream(self, sql, batch_rows=None):
+        self.executed.append(sql)
+        yield ["id"], [[1], [2]]
+        yield ["id"], [[3]]
+
+
+class FakeSchemas:
+    def __init__(self):
+        orders = TableInfo(schema="public", name="orders", columns=[("id", "integer")])
+        self.snapshot = SchemaSnapshot(tables={orders.key: orders})
+
+    async def get(self, executor):
+        return self.snapshot
+
+    async def relevant_schema(self, executor, question):
+        return self.snapshot.render()
+
+
+async def test_agent_retries_rejected_sql_and_streams_tables():
+    """校验失败时重新生成，执行结果以表格帧推送。"""
+    llm = FakeListChatModel(responses=["DELETE FROM orders", "SELECT id FROM orders", "共 3 条订单"])
+    executor = FakeExecutor()
+    app = SQLAgent(llm=llm, executor=executor, schemas=FakeSchemas()).compile()
+
+    frames = []
+    async for event in app.astream_events(
+        {"messages": [HumanMessage(content="订单数")]},
+        version="v2",
+        include_types=STREAM_INCLUDE_TYPES,
+        include_names=STREAM_INCLUDE_NAMES,
+        exclude_tags=[NOSTREAM_TAG],
+    ):
+        if event["event"] == "on_custom_event":
+            frames.append(convert_to_vercel_sse(event))
+
+    assert executor.executed == ["SELECT id FROM orders LIMIT 200"]
+    assert [f[:2] for f in frames] == ["8:", "8:", "8:"]
+    assert '"done":true' in frames[-1] and '"row_count":3' in frames[-1]
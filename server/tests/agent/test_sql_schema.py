@@ -0,0 +1,115 @@
+import numpy as np
+
+from agent.sql import SchemaCache, schema as schema_module
+from config import settings
+
+
+class FakeExecutor:
+    dsn = "fake"
+
+    def __init__(self, version="v1"):
+        self.version = version
+        self.columns = [
+            ("public", "orders", "id", "integer"),
+            ("public", "orders", "customer_id", "integer"),
+            ("public", "orders", "status", "character varying"),
+            ("public", "customers", "id", "integer"),
+            ("public", "products", "id", "integer"),
+            ("public", "users", "id", "integer"),
+        ]
+
+    async def fetch(self, sql, *args):
+        if sql == schema_module._VERSION_SQL:
+            return [{"version_num": self.version}]
+        if sql == schema_module._COLUMNS_SQL:
+            keys = ("table_schema", "table_name", "column_name", "data_type")
+            return [dict(zip(keys, row)) for row in self.columns]
+        if sql == schema_module._FOREIGN_KEYS_SQL:
+            return [{
+                "table_schema": "public", "table_name": "orders", "column_name": "customer_id",
+                "ref_schema": "public", "ref_table": "customers", "ref_column": "id",
+            }]
+        return [{"schemaname": "public", "tablename": "orders", "attname": "status", "vals": ["paid", "pending"]}]
+
+
+def fake_vector(text):
+    """按表名生成可区分的向量"""
+    return [float(name in text) for name in ("orders", "customers", "products")]
+
+
+async def test_schema_index_selects_related_tables(monkeypatch):
+    """按问题选出最相关的表并补充外键相邻表，禁止访问的表不出现。"""
+    embedded = []
+
+    async def embed_documents(texts, model_name=None):
+        embedded.extend(texts)
+        return [fake_vector(t.split("(")[0]) for t in texts]
+
+    async def embed_query(text, model_name=None):
+        return fake_vector(text)
+
+    monkeypatch.setattr(schema_module.EmbeddingService, "embed_documents", embed_documents)
+    monkeypatch.setattr(schema_module.EmbeddingService, "embed_query", embed_query)
+    monkeypatch.setattr(settings.sql_agent, "schema_top_k", 1)
+    monkeypatch.setattr(settings.sql_agent, "allowed_tables", ["orders", "customers", "public.products", "users"])
+
+    cache = SchemaCache(ttl=3600, check_interval=0)
+    executor = FakeExecutor()
+    snapshot = await cache.get(executor)
+
+    assert ("public", "users") not in snapshot.tables
+    assert "FK: customer_id -> customers.id" in snapshot.tables[("public", "orders")].render()
+    assert "示例值 status: paid, pending" in snapshot.tables[("public", "orders")].render()
+    assert snapshot.vectors is not None and snapshot.vectors.shape == (3, 3)
+
+    keys = await cache.select_tables(snapshot, "orders")
+    assert keys == [("public", "orders"), ("public", "customers")]
+
+    # 版本不变: 复用快照；迁移后: 只重新向量化描述变化的表
+    assert await cache.get(executor) is snapshot
+    embedded.clear()
+    executor.version = "v2"
+    executor.columns.append(("public", "products", "name", "text"))
+    refreshed = await cache.get(executor)
+    assert refreshed is not snapshot
+    assert [t.split("(")[0] for t in embedded] == ["products"]
+    assert np.allclose(np.linalg.norm(refreshed.vectors, axis=1), 1.0)
+
+
+async def test_schema_empty_without_allowed_tables():
+    """默认未配置可查询的表，快照中没有任何表 (也不读取示例值)。"""
+    assert settings.sql_agent.allowed_tables == []
+    snapshot = await SchemaCache(check_interval=0).get(FakeExecutor())
+    assert snapshot.tables == {}
+
+
+async def test_schema_vectors_cached_per_dsn(monkeypatch):
+    """不同 DSN 的向量缓存互不裁剪：另一个库刷新后，本库迁移只重新向量化变化的表。"""
+    embedded = []
+
+    async def embed_documents(texts, model_name=None):
+        embedded.extend(t.split("(")[0] for t in texts)
+        return [fake_vector(t.split("(")[0]) for t in texts]
+
+    monkeypatch.setattr(schema_module.EmbeddingService, "embed_documents", embed_documents)
+    monkeypatch.setattr(settings.sql_agent, "schema_top_k", 1)
+    monkeypatch.setattr(settings.sql_agent, "allowed_tables", ["orders", "customers", "products"])
+
+    cache = SchemaCache(ttl=3600, check_interval=0)
+    primary, replica = FakeExecutor(), FakeExecutor()
+    replica.dsn = "replica"
+    replica.columns = [
+        ("public", "customers", "id", "integer"),
+        ("public", "customers", "email", "text"),
+        ("public", "products", "id", "integer"),
+        ("public", "products", "sku", "text"),
+    ]
+
+    await cache.get(primary)
+    await cache.get(replica)
+    embedded.clear()
+
+    primary.version = "v2"
+    primary.columns.append(("public", "products", "name", "text"))
+    await cache.get(primary)
+    assert embedded == ["products"]
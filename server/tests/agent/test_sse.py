@@ -0,0 +1,63 @@
+import json
+from unittest.mock import patch
+
+from langchain_core.messages import AIMessageChunk
+
+from agent.utils import convert_to_vercel_sse, should_emit_debug
+
+
+def _stream_event(content: str, reasoning: str | None = None) -> dict:
+    additional_kwargs = {"reasoning_content": reasoning} if reasoning else {}
+    return {
+        "event": "on_chat_model_stream",
+        "name": "DeepSeekChat",
+        "run_id": "run-1",
+        "metadata": {"user_id": "u1"},
+        "data": {"chunk": AIMessageChunk(content=content, additional_kwargs=additional_kwargs)},
+    }
+
+
+def test_production_mode_emits_protocol_frames_only():
+    """生产模式只输出协议帧，不附带 e: 调试帧。"""
+    output = convert_to_vercel_sse(_stream_event("你好", reasoning="思考"))
+    assert output == '2:"思考"\n0:"你好"\n'
+
+
+def test_production_mode_drops_unknown_events():
+    """生产模式下非协议事件不输出。"""
+    assert convert_to_vercel_sse({"event": "on_chain_start", "name": "agent"}) == ""
+
+
+def test_debug_mode_appends_raw_event():
+    """调试模式追加 e: 原始事件帧。"""
+    output = convert_to_vercel_sse(_stream_event("hi"), debug=True)
+    lines = output.strip().split("\n")
+    assert lines[0] == '0:"hi"'
+    assert lines[1].startswith("e:")
+    assert json.loads(lines[1][2:])["event"] == "on_chat_model_stream"
+
+
+def test_tool_frames():
+    """工具调用与结果输出 9:/a: 帧。"""
+    start = convert_to_vercel_sse(
+        {"event": "on_tool_start", "name": "weather", "run_id": "r1", "data": {"input": {"city": "beijing"}}}
+    )
+    assert json.loads(start[2:]) == {"toolCallId": "r1", "toolName": "weather", "args": {"city": "beijing"}}
+
+    end = convert_to_vercel_sse(
+        {"event": "on_tool_end", "name": "weather", "run_id": "r1", "data": {"output": "Sunny"}}
+    )
+    assert json.loads(end[2:]) == {"toolCallId": "r1", "result": "Sunny"}
+
+
+def test_should_emit_debug_gating():
+    """调试通道需配置允许 (采样也不例外)，允许后请求显式开启或按采样率开启。"""
+    with patch("config.settings.agent.sse_debug_allowed", False), patch(
+        "config.settings.agent.sse_debug_sample_rate", 1.0
+    ):
+        assert should_emit_debug(True) is False
+        assert should_emit_debug(False) is False
+    with patch("config.settings.agent.sse_debug_allowed", True):
+        assert should_emit_debug(True) is True
+        with patch("config.settings.agent.sse_debug_sample_rate", 1.0):
+            assert should_emit_debug(False) is True
@@ -0,0 +1,93 @@
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+
+from agent.stream import SSEStreamWriter
+
+
+def _token(content: str = "", reasoning: str | None = None) -> dict:
+    additional_kwargs = {"reasoning_content": reasoning} if reasoning else {}
+    return {
+        "event": "on_chat_model_stream",
+        "data": {"chunk": AIMessageChunk(content=content, additional_kwargs=additional_kwargs)},
+    }
+
+
+async def _events(items):
+    for item in items:
+        yield item
+
+
+async def _collect(writer: SSEStreamWriter, events) -> str:
+    return "".join([chunk async for chunk in writer.stream(events)])
+
+
+async def test_coalesce_tokens_into_single_frame():
+    """连续 Token 合并为一个帧，类型切换时分帧。"""
+    writer = SSEStreamWriter(flush_interval=10, max_buffer_bytes=1024)
+    items = [_token(reasoning="想"), _token(reasoning="一想"), _token("你"), _token("好")]
+    output = await _collect(writer, _events(items))
+    assert output == '2:"想一想"\n0:"你好"\n'
+
+
+async def test_flush_before_tool_frame():
+    """工具帧前先输出缓冲文本，保持顺序。"""
+    writer = SSEStreamWriter(flush_interval=10, max_buffer_bytes=1024)
+    items = [
+        _token("查询"),
+        {"event": "on_tool_start", "name": "weather", "run_id": "r1", "data": {"input": {}}},
+        _token("完成"),
+    ]
+    lines = (await _collect(writer, _events(items))).strip().split("\n")
+    assert lines[0] == '0:"查询"'
+    assert lines[1].startswith("9:")
+    assert lines[2] == '0:"完成"'
+
+
+async def test_flush_on_buffer_size():
+    """缓冲字节达到上限时立即输出。"""
+    writer = SSEStreamWriter(flush_interval=10, max_buffer_bytes=2)
+    output = await _collect(writer, _events([_token("a"), _token("b"), _token("c")]))
+    assert output == '0:"ab"\n0:"c"\n'
+
+
+async def test_disconnect_cancels_upstream():
+    """客户端断开后取消上游事件流。"""
+    cancelled = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield _token("x")
+                await asyncio.sleep(0.01)
+        finally:
+            cancelled.set()
+
+    async def is_disconnected() -> bool:
+        return True
+
+    writer = SSEStreamWriter(
+        flush_interval=10,
+        is_disconnected=is_disconnected,
+        disconnect_check_interval=0.02,
+    )
+    await asyncio.wait_for(_collect(writer, endless()), timeout=2)
+    assert cancelled.is_set()
+
+
+async def test_bounded_queue_applies_backpressure():
+    """消费停止时生产者最多领先队列容量。"""
+    produced = 0
+
+    async def source():
+        nonlocal produced
+        for _ in range(100):
+            produced += 1
+            yield _token("x")
+
+    writer = SSEStreamWriter(flush_interval=0, max_buffer_bytes=1, queue_size=4)
+    stream = writer.stream(source())
+    await stream.__anext__()
+    await asyncio.sleep(0.05)
+    assert produced < 100
+    await stream.aclose()
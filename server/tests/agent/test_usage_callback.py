@@ -0,0 +1,33 @@
+import uuid
+from unittest.mock import AsyncMock, patch
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from agent.callbacks import UsageCallbackHandler, extract_usage
+
+
+def _result(usage) -> LLMResult:
+    message = AIMessage(content="ok", response_metadata={"usage": usage})
+    return LLMResult(generations=[[ChatGeneration(message=message)]])
+
+
+def test_extract_usage_from_response_metadata():
+    """从消息 response_metadata 中提取 usage。"""
+    usage = {"prompt_tokens": 3, "completion_tokens": 5, "total_tokens": 8}
+    assert extract_usage(_result(usage)) == usage
+
+
+async def test_handler_records_usage_with_model_name():
+    """回调在模型结束时按模型名记录 usage。"""
+    handler = UsageCallbackHandler(user_id=str(uuid.uuid4()))
+    run_id = uuid.uuid4()
+    usage = {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3}
+
+    with patch("agent.callbacks.record_usage", new=AsyncMock()) as record:
+        await handler.on_chat_model_start({}, [], run_id=run_id, metadata={"ls_model_name": "deepseek-reasoner"})
+        await handler.on_llm_end(_result(usage), run_id=run_id)
+
+    record.assert_awaited_once()
+    assert record.await_args.kwargs["model_name"] == "deepseek-reasoner"
+    assert record.await_args.kwargs["usage"] == usage
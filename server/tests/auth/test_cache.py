@@ -0,0 +1,129 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+from auth import models
+from auth.cache import REVOKED_SYNCED_KEY, AuthCache
+
+
+def _cache(**kwargs) -> AuthCache:
+    cache = AuthCache(redis_url="redis://127.0.0.1:1/0", **kwargs)
+    # 模拟 Redis 不可用
+    cache._redis_down_until = time.monotonic() + 60
+    return cache
+
+
+class FakeRedis:
+    """按键保存值的最小 Redis 替身 (忽略过期时间)"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        self.redis.data.update(self.ops)
+
+
+def _revoked_db(*tokens: models.RevokedToken) -> AsyncMock:
+    """数据库中已有的撤销记录: is_revoked 查单条，warm_revoked 查全部"""
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = tokens[0] if tokens else None
+    result.all.return_value = [(token.jti, token.expires_at) for token in tokens]
+    db = AsyncMock()
+    db.execute.return_value = result
+    return db
+
+
+def test_user_cache_ttl():
+    """缓存的是脱离会话的副本，过期后失效。"""
+    cache = _cache(user_ttl=60)
+    user = models.User(id=uuid.uuid4(), phone="13800000000", is_active=True)
+    cache.set_user(user)
+
+    cached = cache.get_user(user.id)
+    assert cached is not user
+    assert cached.phone == user.phone
+
+    cache._users[user.id] = (time.monotonic() - 1, cached)
+    assert cache.get_user(user.id) is None
+
+
+async def test_revoked_in_memory_without_db():
+    """本进程撤销的 jti 直接命中内存，不查库。"""
+    cache = _cache()
+    db = AsyncMock()
+    await cache.mark_revoked("j1", datetime.now(timezone.utc) + timedelta(minutes=5))
+    assert await cache.is_revoked("j1", db) is True
+    db.execute.assert_not_awaited()
+
+
+async def test_revoked_falls_back_to_db():
+    """Redis 不可用时回退数据库，撤销仍然生效。"""
+    cache = _cache()
+    result = MagicMock()
+    result.scalars.return_value.first.return_value = models.RevokedToken(
+        jti="j2", expires_at=datetime.now(timezone.utc) + timedelta(minutes=5)
+    )
+    db = AsyncMock()
+    db.execute.return_value = result
+
+    assert await cache.is_revoked("j2", db) is True
+    assert await cache.is_revoked("j2", db) is True
+    db.execute.assert_awaited_once()
+
+
+async def test_redis_miss_trusted_only_after_sync():
+    """Redis 未同步或丢失数据时未命中仍以数据库为准，并重新同步撤销名单。"""
+    cache = AuthCache(redis_url="redis://127.0.0.1:1/0")
+    redis = FakeRedis()
+    cache._redis = redis
+    token = models.RevokedToken(jti="j3", expires_at=datetime.now(timezone.utc) + timedelta(minutes=5))
+    db = _revoked_db(token)
+
+    # 进程启动后尚未同步 (如 warm_revoked 失败): 查库命中，同时写回 Redis
+    assert await cache.is_revoked("j3", db) is True
+    assert "auth:revoked:j3" in redis.data and REVOKED_SYNCED_KEY in redis.data
+    cache._revoked.clear()
+
+    # 同步后 Redis 未命中直接信任，不查库
+    clean_db = _revoked_db()
+    assert await cache.is_revoked("other", clean_db) is False
+    clean_db.execute.assert_not_awaited()
+
+    # Redis 运行中丢失数据: 标记键消失，回退查库并重新同步
+    redis.data.clear()
+    cache._revoked.clear()
+    assert await cache.is_revoked("j3", db) is True
+    assert "auth:revoked:j3" in redis.data
+
+    # Redis 出错后恢复: 重新同步前不信任未命中
+    cache._mark_redis_down(ConnectionError("boom"))
+    cache._redis_down_until = 0.0
+    redis.data.pop("auth:revoked:j3")
+    cache._revoked.clear()
+    assert await cache.is_revoked("j3", db) is True
+    assert "auth:revoked:j3" in redis.data
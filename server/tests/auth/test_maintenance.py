@@ -0,0 +1,37 @@
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from auth import models
+from auth.maintenance import purge_expired_revoked_tokens
+from models import Base
+
+
+def test_purge_expired_revoked_tokens_in_batches():
+    """分批删除已过期的撤销记录，保留未过期记录。"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+
+    @contextmanager
+    def scope():
+        with SessionLocal() as session:
+            yield session
+            session.commit()
+
+    now = datetime(2026, 1, 1, 12, 0)
+    with scope() as db:
+        user_id = uuid.uuid4()
+        for i in range(5):
+            db.add(models.RevokedToken(jti=f"old-{i}", user_id=user_id, expires_at=now - timedelta(hours=1)))
+        db.add(models.RevokedToken(jti="live", user_id=user_id, expires_at=now + timedelta(hours=1)))
+
+    stats = purge_expired_revoked_tokens(batch_size=2, now=now, session_factory=scope)
+
+    assert stats.deleted == 5
+    assert stats.batches == 3
+    with scope() as db:
+        assert db.scalar(select(func.count()).select_from(models.RevokedToken)) == 1
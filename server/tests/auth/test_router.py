@@ -185,3 +185,17 @@ async def test_expired_access_token_returns_token_expired_code(client: AsyncClie
     assert response.status_code == 401
     data = response.json()
     assert data["code"] == exceptions.ErrorCode.TOKEN_EXPIRED.value
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/files/metrics", "/metrics/db"])
+async def test_metrics_require_admin(client: AsyncClient, auth_headers, test_user, monkeypatch, path):
+    from auth.config import auth_settings
+
+    response = await client.get(path, headers=auth_headers)
+    assert response.status_code == 403
+    assert response.json()["code"] == exceptions.ErrorCode.FORBIDDEN.value
+
+    monkeypatch.setattr(auth_settings, "admin_phones", [test_user.phone])
+    response = await client.get(path, headers=auth_headers)
+    assert response.status_code == 200
@@ -32,3 +32,11 @@ def test_settings_has_required_fields():
     
     # 验证文档配置
     assert hasattr(settings.doc, "enabled")
+
+
+def test_debug_channels_default_off():
+    """可能泄露内部信息的调试通道默认关闭。"""
+    from config import AgentConfig
+
+    assert AgentConfig().sse_debug_allowed is False
+    assert AgentConfig().sse_debug_sample_rate == 0.0
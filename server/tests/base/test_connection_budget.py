@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine
+
+from config import settings
+from connection_budget import ROLE_API, ROLE_WORKER, ConnectionBudget, sqlalchemy_probe
+
+
+def test_plan_splits_budget_between_roles_and_pools(monkeypatch):
+    """API 与 Worker 按份额与进程数分配，进程内按权重分配且每个池至少 1 个连接。"""
+    conf = settings.db_budget
+    monkeypatch.setattr(conf, "max_connections", 110)
+    monkeypatch.setattr(conf, "reserved_connections", 10)
+    monkeypatch.setattr(conf, "api_processes", 2)
+    monkeypatch.setattr(conf, "worker_processes", 4)
+    monkeypatch.setattr(conf, "api_share", 0.6)
+    monkeypatch.setattr(conf, "api_weights", {"app": 3, "kb": 1, "agent": 1})
+    monkeypatch.setattr(conf, "worker_weights", {"app": 1, "kb": 1})
+
+    api = ConnectionBudget(ROLE_API)
+    assert api.per_process() == 30
+    assert api.plan() == {"app": 18, "kb": 6, "agent": 6}
+    assert api.limit("app", cap=10) == 10
+    assert api.limit("unknown") == 1
+
+    worker = ConnectionBudget(ROLE_WORKER)
+    assert worker.per_process() == 10
+    assert worker.engine_kwargs("kb") == {"pool_size": 5, "max_overflow": 0, "pool_pre_ping": True}
+    total = api.per_process() * conf.api_processes + worker.per_process() * conf.worker_processes
+    assert total <= conf.max_connections - conf.reserved_connections
+
+
+def test_snapshot_reports_saturation(tmp_path):
+    budget = ConnectionBudget(ROLE_API)
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=2, max_overflow=0)
+    budget.register("app_sync", sqlalchemy_probe(engine))
+
+    with engine.connect():
+        pools = budget.snapshot()["pools"]
+    assert pools["app_sync"] == {"max": 2, "in_use": 1, "idle": 0, "saturation": 0.5}
+    engine.dispose()
+
+
+def test_celery_sets_worker_role_before_importing_tasks(monkeypatch):
+    """Worker 的角色由 Celery 导入任务模块前的信号指定，与启动命令名无关。"""
+    import connection_budget
+    from celery.signals import import_modules
+    from knowledgebase.worker.celery_app import celery_app
+
+    budget = ConnectionBudget()
+    monkeypatch.setattr(connection_budget, "connection_budget", budget)
+    monkeypatch.setattr(connection_budget.sys, "argv", ["/usr/bin/python", "-m", "celery"])
+
+    import_modules.send(sender=celery_app)
+    assert budget.role == ROLE_WORKER
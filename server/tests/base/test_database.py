@@ -20,3 +20,25 @@ def test_sync_session_dependency():
     session = next(session_generator)
     assert session is not None
     session.close()
+
+
+def test_pgbouncer_connect_args(monkeypatch):
+    """事务池模式下不使用 options 启动参数；PgBouncer 不支持预编译语句时关闭语句缓存。"""
+    from config import settings
+
+    async_uri = "postgresql+asyncpg://u:p@localhost:6432/axiom_app"
+    sync_uri = "postgresql+psycopg://u:p@localhost:6432/axiom_app"
+    assert "options" in database.get_sync_connect_args(sync_uri)
+
+    monkeypatch.setattr(settings.db, "pgbouncer", True)
+    monkeypatch.setattr(settings.db, "pgbouncer_prepared_statements", True)
+    assert database.get_sync_connect_args(sync_uri) == {}
+    assert "statement_cache_size" not in database.get_async_connect_args(async_uri)
+
+    monkeypatch.setattr(settings.db, "pgbouncer_prepared_statements", False)
+    args = database.get_async_connect_args(async_uri)
+    assert args["statement_cache_size"] == 0 and args["prepared_statement_cache_size"] == 0
+    assert args["prepared_statement_name_func"]() != args["prepared_statement_name_func"]()
+    assert database.get_sync_connect_args(sync_uri) == {"prepare_threshold": None}
+    assert database.get_psycopg_pool_kwargs() == {"autocommit": True, "prepare_threshold": None}
+    assert database.asyncpg_statement_args(256) == {"statement_cache_size": 0}
@@ -1,5 +1,10 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
 import pytest
 import pagination
+from exceptions import AppError
 
 def test_page_data_shape():
     """分页数据包含 items 与 total 字段。"""
@@ -18,3 +23,19 @@ def test_page_response_shape():
     assert result["msg"] == "ok"
     assert result["data"]["items"] == items
     assert result["data"]["total"] == 1
+
+def test_cursor_roundtrip():
+    """游标可还原 (created_at, id)，非法游标抛出 AppError。"""
+    created_at = datetime(2026, 1, 1, 8, 30, tzinfo=timezone.utc)
+    item_id = uuid.uuid4()
+    assert pagination.decode_cursor(pagination.encode_cursor(created_at, item_id)) == (created_at, item_id)
+    with pytest.raises(AppError):
+        pagination.decode_cursor("not-a-cursor")
+
+def test_split_keyset_page():
+    """多取的一条用于生成下一页游标。"""
+    rows = [SimpleNamespace(created_at=datetime(2026, 1, i, tzinfo=timezone.utc), id=uuid.uuid4()) for i in (3, 2, 1)]
+    items, next_cursor = pagination.split_keyset_page(rows, limit=2)
+    assert items == rows[:2]
+    assert pagination.decode_cursor(next_cursor) == (rows[1].created_at, rows[1].id)
+    assert pagination.split_keyset_page(rows, limit=3) == (rows, None)
@@ -12,3 +12,69 @@ def test_client_has_required_methods():
     )
     for method_name in ("upload", "download", "delete", "presign"):
         assert hasattr(client, method_name)
+
+
+def test_upload_stream_reads_in_parts():
+    """流式上传按分片读取，并返回大小与 SHA-256。"""
+    import hashlib
+    import io
+    from unittest.mock import MagicMock
+
+    client = rustfs_client.RustfsClient(endpoint="localhost:9000", access_key="test", secret_key="test")
+    reads = []
+
+    def put_object(bucket, name, data, length, part_size, content_type):
+        assert length == -1
+        while chunk := data.read(part_size):
+            reads.append(len(chunk))
+        return MagicMock(bucket_name=bucket, object_name=name, etag="e", version_id=None)
+
+    client.client = MagicMock(put_object=put_object)
+    content = b"x" * 25
+    result = client.upload_stream("a.txt", io.BytesIO(content), part_size=10)
+
+    assert reads == [10, 10, 5]
+    assert result["size"] == 25
+    assert result["sha256"] == hashlib.sha256(content).hexdigest()
+
+
+def test_parse_range():
+    """Range 头解析: 普通 / 开放 / 后缀 / 不可满足。"""
+    from rustfs.utils import parse_range
+
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+
+def test_etag_matches():
+    from rustfs.utils import etag_matches
+
+    assert etag_matches('"abc"', "abc")
+    assert etag_matches('W/"abc", "def"', "abc")
+    assert not etag_matches('"def"', "abc")
+
+
+async def test_async_calls_run_in_executor_and_record_metrics():
+    """异步接口在线程池中执行，并记录次数与失败数。"""
+    from unittest.mock import MagicMock
+
+    client = rustfs_client.RustfsClient(
+        endpoint="localhost:9000", access_key="test", secret_key="test", max_workers=2
+    )
+    client.client = MagicMock()
+    client.client.remove_object.side_effect = [None, RuntimeError("boom")]
+
+    assert await client.adelete("a.txt") is True
+    with pytest.raises(Exception):
+        await client.adelete("b.txt")
+
+    snapshot = client.metrics.snapshot()
+    assert snapshot["in_flight"] == 0
+    assert snapshot["ops"]["delete"]["count"] == 2
+    assert snapshot["ops"]["delete"]["errors"] == 1
+    client.close()
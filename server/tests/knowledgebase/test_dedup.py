@@ -0,0 +1,36 @@
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from knowledgebase.models import KBBlob
+from knowledgebase.services.kb_service import KBService
+
+
+@pytest_asyncio.fixture
+async def service():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(KBBlob.__table__.create)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield KBService(session)
+    await engine.dispose()
+
+
+async def test_same_content_shares_one_object(service):
+    """相同内容复用首个对象，引用计数归零后才返回待删除对象。"""
+    sha = "a" * 64
+    assert await service.acquire_blob(sha, "kb/1/a.txt", 10) == "kb/1/a.txt"
+    assert await service.acquire_blob(sha, "kb/2/b.txt", 10) == "kb/1/a.txt"
+    await service.db.commit()
+
+    assert await service.release_blobs([sha]) == []
+    assert await service.release_blobs([sha]) == ["kb/1/a.txt"]
+    await service.db.commit()
+    assert await service.db.get(KBBlob, sha) is None
+
+
+async def test_release_counts_repeated_hashes(service):
+    """删除知识库时同一内容的多个文档一次性释放。"""
+    sha = "b" * 64
+    for key in ("k1", "k2", "k3"):
+        await service.acquire_blob(sha, key, 1)
+    assert await service.release_blobs([sha, sha, sha]) == ["k1"]
@@ -0,0 +1,88 @@
+import pytest
+
+from knowledgebase.core.embedding import EmbeddingService
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(("documents", texts))
+        return [[0.0] for _ in texts]
+
+    def embed_query(self, text):
+        self.calls.append(("query", text))
+        return [0.0]
+
+
+def test_warm_up_reports_readiness(monkeypatch):
+    """预热执行一次向量化，失败的模型不影响其他模型并体现在健康状态中。"""
+    fake = FakeEmbeddings()
+
+    def get_embeddings(model_name=None):
+        if model_name == "broken":
+            raise RuntimeError("download failed")
+        return fake
+
+    monkeypatch.setattr(EmbeddingService, "get_embeddings", get_embeddings)
+    monkeypatch.setattr(EmbeddingService, "_status", {})
+    monkeypatch.setattr(EmbeddingService, "configured_models", staticmethod(lambda: ["ok", "broken"]))
+
+    assert EmbeddingService.readiness()["ready"] is False
+    status = EmbeddingService.warm_up()
+
+    assert [kind for kind, _ in fake.calls] == ["documents", "query"]
+    assert status["ok"]["ready"] is True
+    assert status["broken"] == {"ready": False, "error": "download failed"}
+    assert EmbeddingService.readiness()["ready"] is False
+
+    monkeypatch.setattr(EmbeddingService, "configured_models", staticmethod(lambda: ["ok"]))
+    assert EmbeddingService.readiness()["ready"] is True
+
+
+def test_profiles_pass_runtime_options_and_register_quantized_model(monkeypatch):
+    """运行时参数传给 FastEmbed；量化参数注册并使用 int8 模型，实例按 (模型, 参数) 缓存。"""
+    from knowledgebase.core import embedding
+
+    created, registered = [], []
+    monkeypatch.setattr(embedding, "FastEmbedEmbeddings", lambda **kwargs: created.append(kwargs) or kwargs)
+    monkeypatch.setattr(embedding.TextEmbedding, "add_custom_model", lambda **kwargs: registered.append(kwargs))
+    monkeypatch.setattr(EmbeddingService, "_models", {})
+    monkeypatch.setattr(EmbeddingService, "_registered", set())
+    monkeypatch.setattr(EmbeddingService, "_profile", "api")
+
+    model = "BAAI/bge-small-zh-v1.5"
+    api = EmbeddingService.get_embeddings(model)
+    assert (api["model_name"], api["threads"], api["batch_size"]) == (model, 2, 32)
+
+    EmbeddingService.use_profile("worker")
+    assert EmbeddingService.get_embeddings(model)["threads"] == 1
+    assert EmbeddingService.get_embeddings(model, "api") is api
+
+    EmbeddingService.get_embeddings(model, "api-int8")
+    EmbeddingService._models.clear()
+    quantized = EmbeddingService.get_embeddings(model, "api-int8")
+    assert quantized["model_name"] == f"{model}-int8"
+    assert len(registered) == 1 and registered[0]["model_file"] == "onnx/model_quantized.onnx"
+    assert len(created) == 4
+
+    with pytest.raises(ValueError):
+        EmbeddingService.use_profile("missing")
+
+
+async def test_embed_uses_requested_profile(monkeypatch):
+    """异步向量化按传入的运行时参数取模型实例。"""
+    fake = FakeEmbeddings()
+    requested = []
+
+    def get_embeddings(model_name=None, profile=None):
+        requested.append((model_name, profile))
+        return fake
+
+    monkeypatch.setattr(EmbeddingService, "get_embeddings", get_embeddings)
+
+    assert await EmbeddingService.embed_documents(["a", "b"], "m", profile="bulk") == [[0.0], [0.0]]
+    assert await EmbeddingService.embed_documents(["c"], "m") == [[0.0]]
+    assert await EmbeddingService.embed_query("q", "m", profile="api") == [0.0]
+    assert requested == [("m", "bulk"), ("m", None), ("m", "api")]
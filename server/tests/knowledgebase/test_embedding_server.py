@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from config import settings
+from knowledgebase.core import embedding_server
+from knowledgebase.core.embedding import EmbeddingService
+from knowledgebase.core.embedding_client import RemoteEmbeddings
+from knowledgebase.core.embedding_protocol import EmbeddingProtocolError
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 0.0]
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    fake = FakeEmbeddings()
+
+    def get_embeddings(model_name=None, profile=None):
+        if model_name == "missing":
+            raise ValueError("unknown model")
+        return fake
+
+    monkeypatch.setattr(settings.embedding_server, "enabled", True)
+    monkeypatch.setattr(settings.embedding_server, "socket_path", str(tmp_path / "embedding.sock"))
+    monkeypatch.setattr(settings.embedding_server, "max_wait_ms", 50.0)
+    monkeypatch.setattr(embedding_server.EmbeddingService, "get_embeddings", get_embeddings)
+    return fake
+
+
+async def test_requests_from_clients_are_batched(server):
+    """并发客户端的文档请求合并为一批推理，结果按请求拆分；错误返回给对应客户端。"""
+    instance = embedding_server.EmbeddingServer()
+    await instance.start()
+    try:
+        first, second = await asyncio.gather(
+            RemoteEmbeddings("m").aembed_documents(["a", "bb"]),
+            RemoteEmbeddings("m").aembed_documents(["ccc"]),
+        )
+        assert first == [[1.0, 1.0], [2.0, 1.0]]
+        assert second == [[3.0, 1.0]]
+        assert server.batches == [["a", "bb", "ccc"]]
+
+        assert await RemoteEmbeddings("m").aembed_query("查询") == [2.0, 0.0]
+        assert await asyncio.to_thread(RemoteEmbeddings("m").embed_documents, ["dddd"]) == [[4.0, 1.0]]
+        with pytest.raises(EmbeddingProtocolError, match="unknown model"):
+            await RemoteEmbeddings("missing").aembed_documents(["x"])
+    finally:
+        await instance.close()
+
+
+def test_service_becomes_client_when_enabled(monkeypatch):
+    monkeypatch.setattr(settings.embedding_server, "enabled", True)
+    monkeypatch.setattr(EmbeddingService, "_models", {})
+    monkeypatch.setattr(EmbeddingService, "_local", False)
+
+    assert isinstance(EmbeddingService.get_embeddings("m"), RemoteEmbeddings)
+
+
+async def test_probe_remote_is_rate_limited(server, monkeypatch):
+    """健康检查探测用短超时 ping，按间隔限频；服务启动后标记就绪。"""
+    monkeypatch.setattr(settings.kb, "warmup_models", ["m"])
+    monkeypatch.setattr(settings.embedding_server, "probe_interval", 60.0)
+    monkeypatch.setattr(EmbeddingService, "_status", {})
+    monkeypatch.setattr(EmbeddingService, "_last_probe", None)
+
+    # 服务未启动: 探测失败，不抛出
+    await EmbeddingService.probe_remote()
+    assert EmbeddingService.readiness()["ready"] is False
+
+    instance = embedding_server.EmbeddingServer()
+    await instance.start()
+    try:
+        # 间隔内不再探测
+        await EmbeddingService.probe_remote()
+        assert EmbeddingService.readiness()["ready"] is False
+
+        monkeypatch.setattr(EmbeddingService, "_last_probe", None)
+        await EmbeddingService.probe_remote()
+        assert EmbeddingService.readiness()["ready"] is True
+    finally:
+        await instance.close()
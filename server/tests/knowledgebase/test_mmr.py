@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from knowledgebase.core.mmr import mmr_select
+from knowledgebase.services.retriever_factory import MergedRetriever, MMRRetriever, RetrieverFactory
+from knowledgebase.services.vector_store import VectorStoreService
+from knowledgebase.core.embedding import EmbeddingService
+
+
+QUERY = np.array([1.0, 0.0, 0.0])
+CANDIDATES = np.array([
+    [1.0, 0.0, 0.0],    # 0 最相关
+    [0.99, 0.01, 0.0],  # 1 与 0 近乎重复
+    [0.8, 0.6, 0.0],    # 2
+    [0.7, 0.0, 0.7],    # 3 与 2 方向不同
+])
+
+
+def test_mmr_prefers_diverse_results():
+    assert mmr_select(QUERY, CANDIDATES, 3, lambda_mult=1.0) == [0, 1, 2]
+    assert mmr_select(QUERY, CANDIDATES, 3, lambda_mult=0.3) == [0, 3, 2]
+
+
+def test_dedup_and_per_doc_cap():
+    """近重复候选被排除；单文档达到上限后其余分块不再入选。"""
+    assert mmr_select(QUERY, CANDIDATES, 4, lambda_mult=1.0, dedup_threshold=0.99) == [0, 2, 3]
+
+    doc_ids = ["a", "a", "a", "b"]
+    assert mmr_select(QUERY, CANDIDATES, 4, lambda_mult=1.0, doc_ids=doc_ids, max_per_doc=2) == [0, 1, 3]
+    assert mmr_select(QUERY, np.empty((0, 3)), 4) == []
+
+
+async def test_mmr_retriever_reranks_candidates(monkeypatch):
+    calls = {}
+
+    async def embed_query(text, model_name=None, profile=None):
+        return QUERY.tolist()
+
+    async def fetch_candidates(query_vector, filter, fetch_k, embedding_model=None, collection_name=None):
+        calls.update(filter=filter, fetch_k=fetch_k)
+        docs = [Document(page_content=str(i), metadata={"doc_id": "a" if i < 3 else "b"}) for i in range(4)]
+        distances = 1 - CANDIDATES @ QUERY / np.linalg.norm(CANDIDATES, axis=1)
+        return docs, CANDIDATES, distances
+
+    monkeypatch.setattr(EmbeddingService, "embed_query", embed_query)
+    monkeypatch.setattr(VectorStoreService, "fetch_candidates", fetch_candidates)
+
+    retriever = RetrieverFactory.create_multi_kb_retriever(
+        ["kb1", "kb2"], search_type="mmr", k=2, fetch_k=50, lambda_mult=1.0, max_per_doc=1,
+    )
+    assert isinstance(retriever, MMRRetriever)
+    docs = await retriever.ainvoke("q")
+
+    assert calls == {"filter": {"kb_id": {"$in": ["kb1", "kb2"]}}, "fetch_k": 50}
+    assert [doc.page_content for doc in docs] == ["0", "3"]
+    assert docs[0].metadata["score"] == 1.0
+
+
+def test_retrievers_reject_sync_invocation():
+    """向量存储只有异步引擎，同步调用给出明确错误而不是在新事件循环中复用连接。"""
+    retriever = RetrieverFactory.create_retriever("kb1", search_type="mmr")
+    merged = MergedRetriever(retrievers=[retriever])
+    for item in (retriever, merged):
+        with pytest.raises(NotImplementedError, match="ainvoke"):
+            item.invoke("q")
+
+
+async def test_merged_retriever_orders_similarity_groups_by_score(monkeypatch):
+    """非 MMR 分组经 fetch_candidates 取回并写入 score，合并时按分数排序并应用阈值。"""
+    hits = {
+        "m1": [("a1", 0.9), ("a2", 0.5)],
+        "m2": [("b1", 0.8), ("b2", 0.7)],
+    }
+    calls = []
+
+    async def embed_query(text, model_name=None, profile=None):
+        return [1.0, 0.0]
+
+    async def fetch_candidates(query_vector, filter, fetch_k, embedding_model=None, collection_name=None):
+        calls.append((embedding_model, filter, fetch_k))
+        rows = hits[embedding_model][:fetch_k]
+        docs = [Document(page_content=text) for text, _ in rows]
+        return docs, np.zeros((len(rows), 2)), [1 - score for _, score in rows]
+
+    monkeypatch.setattr(EmbeddingService, "embed_query", embed_query)
+    monkeypatch.setattr(VectorStoreService, "fetch_candidates", fetch_candidates)
+
+    scopes = {("m1", "c1"): ["kb1"], ("m2", "c2"): ["kb2"]}
+    retriever = RetrieverFactory.create_scoped_retriever(scopes, k=3, search_type="similarity")
+    docs = await retriever.ainvoke("q")
+    assert [(doc.page_content, doc.metadata["score"]) for doc in docs] == [("a1", 0.9), ("b1", 0.8), ("b2", 0.7)]
+    assert calls[0] == ("m1", {"kb_id": {"$in": ["kb1"]}}, 3)
+
+    retriever = RetrieverFactory.create_scoped_retriever(
+        scopes, k=3, search_type="similarity_score_threshold", score_threshold=0.75
+    )
+    assert [doc.page_content for doc in await retriever.ainvoke("q")] == ["a1", "b1"]
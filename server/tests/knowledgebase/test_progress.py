@@ -0,0 +1,73 @@
+import json
+import uuid
+from unittest.mock import AsyncMock
+
+from knowledgebase.constants import ProcessingStage
+from knowledgebase.services.progress import ProgressPublisher, format_sse_event, progress_channel
+
+
+async def test_publish_to_kb_channel():
+    """进度发布到知识库频道，EMBED 阶段按批次推进百分比。"""
+    kb_id, doc_id = uuid.uuid4(), uuid.uuid4()
+    client = AsyncMock()
+    publisher = ProgressPublisher(kb_id, doc_id, client=client)
+
+    await publisher.publish(ProcessingStage.SPLIT)
+    await publisher.embed_progress(1, 2)
+
+    channel, raw = client.publish.await_args_list[0].args
+    assert channel == progress_channel(kb_id)
+    assert json.loads(raw) == {"kb_id": str(kb_id), "doc_id": str(doc_id), "stage": "split", "percent": 20}
+    embed = json.loads(client.publish.await_args_list[1].args[1])
+    assert embed["stage"] == "embed"
+    assert 30 < embed["percent"] < 95
+
+
+async def test_publish_failure_is_swallowed():
+    """Redis 不可用时不影响文档处理。"""
+    client = AsyncMock()
+    client.publish.side_effect = ConnectionError("down")
+    await ProgressPublisher(uuid.uuid4(), uuid.uuid4(), client=client).publish(ProcessingStage.DONE)
+
+
+def test_format_sse_event():
+    assert format_sse_event("progress", {"stage": "done"}) == 'event: progress\ndata: {"stage": "done"}\n\n'
+
+
+async def test_add_documents_embeds_before_insert(monkeypatch):
+    """先分批向量化并推进 EMBED 进度，全部完成后才回调 on_insert 并写入。"""
+    from langchain_core.documents import Document
+
+    from knowledgebase.services.vector_store import VectorStoreService
+
+    events = []
+
+    class FakeEmbeddings:
+        async def aembed_documents(self, texts):
+            events.append(("embed", len(texts)))
+            return [[0.0] for _ in texts]
+
+    class FakeStore:
+        embeddings = FakeEmbeddings()
+
+        async def aadd_embeddings(self, texts, embeddings, metadatas):
+            events.append(("write", len(texts)))
+            return [meta["doc_id"] for meta in metadatas]
+
+    monkeypatch.setattr(VectorStoreService, "get_vector_store", lambda collection_name=None, embedding_model=None: FakeStore())
+
+    async def on_progress(done, total):
+        events.append(("progress", done))
+
+    async def on_insert():
+        events.append(("insert",))
+
+    docs = [Document(page_content=f"chunk {i}") for i in range(3)]
+    ids = await VectorStoreService.add_documents(
+        docs, uuid.uuid4(), uuid.uuid4(), uuid.uuid4(), batch_size=2, on_progress=on_progress, on_insert=on_insert
+    )
+    assert len(ids) == 3
+    assert events == [
+        ("embed", 2), ("progress", 2), ("embed", 1), ("progress", 3),
+        ("insert",), ("write", 2), ("write", 1),
+    ]
@@ -0,0 +1,185 @@
+import uuid
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import auth.models  # noqa: F401  注册 users 表，knowledge_bases 外键依赖
+from knowledgebase.exceptions import KBException
+from knowledgebase.models import KBReembedJob, KnowledgeBase, ReembedStatus
+from knowledgebase.services import reembed
+from knowledgebase.services.reembed import ReembedService, throttle_delay
+from knowledgebase.services.vector_store import DEFAULT_COLLECTION, collection_for_model
+
+
+class FakeVectors:
+    """按集合保存 {向量ID: (文本, 元数据, 模型)}"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def rows(self, collection):
+        return self.collections.setdefault(collection, {})
+
+    async def fetch_chunks(self, metadata, after_id=None, limit=None, embedding_model=None, collection_name=DEFAULT_COLLECTION):
+        items = sorted(
+            (vid, text, meta) for vid, (text, meta, _) in self.rows(collection_name).items()
+            if metadata.items() <= meta.items() and (after_id is None or vid > after_id)
+        )
+        return items[:limit] if limit else items
+
+    async def count_by_doc(self, kb_id, embedding_model=None, collection_name=DEFAULT_COLLECTION):
+        counts = {}
+        for _, meta, _ in self.rows(collection_name).values():
+            if meta["kb_id"] == str(kb_id):
+                counts[meta["doc_id"]] = counts.get(meta["doc_id"], 0) + 1
+        return counts
+
+    async def upsert_embeddings(self, ids, texts, embeddings, metadatas, embedding_model=None, collection_name=DEFAULT_COLLECTION):
+        for vid, text, meta in zip(ids, texts, metadatas):
+            self.rows(collection_name)[vid] = (text, meta, embedding_model)
+        return len(ids)
+
+    async def delete_by_metadata(self, metadata, embedding_model=None, collection_name=DEFAULT_COLLECTION):
+        rows = self.rows(collection_name)
+        for vid in [vid for vid, (_, meta, _) in rows.items() if metadata.items() <= meta.items()]:
+            del rows[vid]
+
+    async def delete_by_kb_id(self, kb_id, embedding_model=None, collection_name=DEFAULT_COLLECTION):
+        await self.delete_by_metadata({"kb_id": str(kb_id)}, embedding_model, collection_name)
+        return True
+
+
+@pytest.fixture
+def vectors(monkeypatch):
+    fake = FakeVectors()
+    store = reembed.VectorStoreService
+    monkeypatch.setattr(store, "fetch_chunks", fake.fetch_chunks)
+    monkeypatch.setattr(store, "count_by_doc", fake.count_by_doc)
+    monkeypatch.setattr(store, "upsert_embeddings", fake.upsert_embeddings)
+    monkeypatch.setattr(store, "_delete_by_metadata", fake.delete_by_metadata)
+    monkeypatch.setattr(store, "delete_by_kb_id", fake.delete_by_kb_id)
+
+    async def embed_documents(texts, model_name=None, profile=None):
+        return [[float(len(text))] for text in texts]
+
+    monkeypatch.setattr(reembed.EmbeddingService, "embed_documents", embed_documents)
+    monkeypatch.setattr(reembed.settings.kb, "reembed_batch_size", 2)
+    monkeypatch.setattr(reembed.settings.kb, "reembed_max_rate", 0.0)
+    monkeypatch.setattr(reembed.settings.kb, "warmup_models", ["old-model", "new-model", "other-model"])
+    return fake
+
+
+@pytest_asyncio.fixture
+async def service():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(KnowledgeBase.__table__.create)
+        await conn.run_sync(KBReembedJob.__table__.create)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield ReembedService(session)
+    await engine.dispose()
+
+
+async def _kb(service, vectors, chunks=5):
+    kb = KnowledgeBase(
+        user_id=uuid.uuid4(), name="kb", embedding_model="old-model",
+        vector_collection=DEFAULT_COLLECTION, chunk_size=500, chunk_overlap=50,
+    )
+    service.db.add(kb)
+    await service.db.commit()
+    for i in range(chunks):
+        meta = {"kb_id": str(kb.id), "doc_id": f"doc-{i % 2}"}
+        vectors.rows(DEFAULT_COLLECTION)[f"v{i}"] = (f"chunk {i}", meta, "old-model")
+    return kb
+
+
+def test_throttle_delay():
+    assert throttle_delay(100, 0.2, 200.0) == pytest.approx(0.3)
+    assert throttle_delay(100, 1.0, 200.0) == 0.0
+    assert throttle_delay(100, 0.0, 0.0) == 0.0
+
+
+async def test_backfill_resumes_from_checkpoint_and_flips(service, vectors):
+    """时长用完后保留检查点，再次执行从检查点继续，完成时切换模型并清理原集合。"""
+    kb = await _kb(service, vectors)
+    job = await service.start(kb, "new-model")
+    target = collection_for_model("new-model")
+    assert job.target_collection == target
+
+    assert await service.run(job, time_budget=0) == ReembedStatus.RUNNING
+    assert (job.cursor, job.processed, job.total) == ("v1", 2, 5)
+
+    assert await service.run(job) == ReembedStatus.COMPLETED
+    assert job.processed == 5
+    assert {model for _, _, model in vectors.rows(target).values()} == {"new-model"}
+    assert len(vectors.rows(target)) == 5
+    assert not vectors.rows(DEFAULT_COLLECTION)
+    assert (kb.embedding_model, kb.vector_collection) == ("new-model", target)
+
+
+async def test_dual_write_and_reconcile_do_not_duplicate(service, vectors):
+    """双写与回填写入同一分块时 ID 相同；回填期间删除的文档在切换前从目标集合清除。"""
+    kb = await _kb(service, vectors)
+    job = await service.start(kb, "new-model")
+    target = job.target_collection
+
+    vectors.rows(DEFAULT_COLLECTION)["v9"] = ("late chunk", {"kb_id": str(kb.id), "doc_id": "doc-2"}, "old-model")
+    assert await service.sync_document(kb.id, "doc-2", DEFAULT_COLLECTION) == 1
+    await service.run(job, time_budget=0)
+    await vectors.delete_by_metadata({"doc_id": "doc-0"}, collection_name=DEFAULT_COLLECTION)
+
+    assert await service.run(job) == ReembedStatus.COMPLETED
+    docs = sorted(meta["doc_id"] for _, meta, _ in vectors.rows(target).values())
+    assert docs == ["doc-1", "doc-1", "doc-2"]
+
+
+async def test_job_controls(service, vectors):
+    kb = await _kb(service, vectors)
+    with pytest.raises(KBException):
+        await service.start(kb, "old-model")
+    # 未配置的模型不登记任务
+    with pytest.raises(KBException, match="Unsupported"):
+        await service.start(kb, "someone/arbitrary-model")
+    assert await service.get_latest_job(kb.id) is None
+
+    job = await service.start(kb, "new-model")
+    with pytest.raises(KBException):
+        await service.start(kb, "other-model")
+
+    await service.run(job, time_budget=0)
+    assert (await service.pause(job)).status == ReembedStatus.PAUSED
+    assert await service.run(job) == ReembedStatus.PAUSED
+    assert job.processed == 2
+    assert (await service.resume(job)).status == ReembedStatus.PENDING
+
+    await service.cancel(job)
+    assert job.status == ReembedStatus.CANCELLED
+    assert not vectors.rows(job.target_collection)
+    assert kb.embedding_model == "old-model"
+    assert await service.get_active_job(kb.id) is None
+
+
+async def test_cancel_during_reconcile_keeps_source(service, vectors, monkeypatch):
+    """补齐期间任务被取消时不切换知识库，也不清理原集合。"""
+    kb = await _kb(service, vectors)
+    job = await service.start(kb, "new-model")
+    reconcile = service.reconcile
+
+    async def cancelled_during_reconcile(job):
+        count = await reconcile(job)
+        # 模拟 API 进程取消: 直接更新任务行并清空目标集合
+        await service.db.execute(
+            update(KBReembedJob).where(KBReembedJob.id == job.id).values(status=ReembedStatus.CANCELLED)
+        )
+        await service.db.commit()
+        await vectors.delete_by_kb_id(kb.id, collection_name=job.target_collection)
+        return count
+
+    monkeypatch.setattr(service, "reconcile", cancelled_during_reconcile)
+    assert await service.run(job) == ReembedStatus.CANCELLED
+    assert (kb.embedding_model, kb.vector_collection) == ("old-model", DEFAULT_COLLECTION)
+    assert len(vectors.rows(DEFAULT_COLLECTION)) == 5
+    with pytest.raises(KBException):
+        await service.cancel(job)
@@ -0,0 +1,123 @@
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import settings
+import auth.models  # noqa: F401  注册 users 表，knowledge_bases 外键依赖
+from knowledgebase import exceptions, router
+from knowledgebase.maintenance import purge_abandoned_uploads
+from knowledgebase.models import DocumentStatus, KBBlob, KBDocument, KBReembedJob, KnowledgeBase
+from knowledgebase.schemas import DocumentUploadCompleteRequest
+from knowledgebase.services.kb_service import KBService
+
+
+TABLES = [KnowledgeBase.__table__, KBDocument.__table__, KBBlob.__table__, KBReembedJob.__table__]
+
+
+class FakeStorage:
+    def __init__(self, size: int = 0):
+        self.size = size
+        self.deleted = []
+
+    def delete(self, file_key):
+        self.deleted.append(file_key)
+        return True
+
+    async def adelete(self, file_key):
+        return self.delete(file_key)
+
+    async def astat(self, file_key):
+        return {"size": self.size}
+
+
+def _kb() -> KnowledgeBase:
+    return KnowledgeBase(
+        id=uuid.uuid4(), user_id=uuid.uuid4(), name="kb", embedding_model="m",
+        vector_collection="c", chunk_size=500, chunk_overlap=50,
+    )
+
+
+def _doc(kb: KnowledgeBase, key: str, status: DocumentStatus, created_at=None) -> KBDocument:
+    return KBDocument(
+        kb_id=kb.id, title=key, file_key=key, file_type="txt", file_size=0,
+        status=status, created_at=created_at,
+    )
+
+
+def test_purge_abandoned_uploads(monkeypatch):
+    """超过有效期 + 宽限期仍为 UPLOADING 的文档分批删除，并删除对应对象。"""
+    engine = create_engine("sqlite://")
+    for table in TABLES:
+        table.create(engine)
+    SessionLocal = sessionmaker(bind=engine)
+
+    @contextmanager
+    def scope():
+        with SessionLocal() as session:
+            yield session
+            session.commit()
+
+    monkeypatch.setattr(settings.kb, "presign_upload_expires", 900)
+    monkeypatch.setattr(settings.kb, "upload_purge_grace", 300)
+    now = datetime(2026, 1, 1, 12, 0)
+    old = now - timedelta(hours=1)
+    with scope() as db:
+        kb = _kb()
+        db.add(kb)
+        for i in range(3):
+            db.add(_doc(kb, f"old-{i}", DocumentStatus.UPLOADING, old))
+        db.add(_doc(kb, "fresh", DocumentStatus.UPLOADING, now - timedelta(minutes=5)))
+        db.add(_doc(kb, "indexed", DocumentStatus.INDEXED, old))
+
+    storage = FakeStorage()
+    stats = purge_abandoned_uploads(batch_size=2, now=now, session_factory=scope, client=storage)
+
+    assert stats.deleted == 3
+    assert stats.batches == 2
+    assert sorted(storage.deleted) == ["old-0", "old-1", "old-2"]
+    with scope() as db:
+        assert sorted(db.scalars(select(KBDocument.file_key))) == ["fresh", "indexed"]
+
+
+@pytest_asyncio.fixture
+async def service():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        for table in TABLES:
+            await conn.run_sync(table.create)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield KBService(session)
+    await engine.dispose()
+
+
+async def test_complete_rejects_oversized_upload(service, monkeypatch):
+    """直传完成时校验实际大小，超限则删除对象与文档记录，不触发处理任务。"""
+    kb = _kb()
+    doc = _doc(kb, "kb/big.txt", DocumentStatus.UPLOADING)
+    service.db.add_all([kb, doc])
+    await service.db.commit()
+
+    storage = FakeStorage(size=2048)
+    queued = []
+
+    async def delete_by_doc_id(doc_id, embedding_model=None, collection_name=None):
+        return True
+
+    monkeypatch.setattr(router, "get_rustfs_client", lambda: storage)
+    monkeypatch.setattr(settings.kb, "max_upload_size", 1024)
+    monkeypatch.setattr(router.process_document, "delay", queued.append)
+    monkeypatch.setattr(router.VectorStoreService, "delete_by_doc_id", delete_by_doc_id)
+
+    user = auth.models.User(id=kb.user_id, phone="13800000000")
+    with pytest.raises(exceptions.DocumentTooLarge):
+        await router.complete_document_upload(DocumentUploadCompleteRequest(doc_id=doc.id), user, service)
+
+    assert storage.deleted == ["kb/big.txt"]
+    assert await service.get_document(doc.id) is None
+    assert queued == []
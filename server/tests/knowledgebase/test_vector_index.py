@@ -0,0 +1,57 @@
+import pytest
+from pgvector.sqlalchemy import VECTOR
+from sqlalchemy import Column, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import declarative_base
+
+from knowledgebase.core import vector_index
+
+
+class EmbeddingStore(declarative_base()):
+    __tablename__ = vector_index.TABLE
+    id = Column(String, primary_key=True)
+    collection_id = Column(String)
+    document = Column(String)
+    cmetadata = Column(JSONB)
+    embedding = Column(VECTOR())
+
+
+def compile_sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_index_ddl_matches_query_expression():
+    """索引表达式与查询中的量化距离一致，部分索引的维度条件以字面量出现在查询中。"""
+    ddl = vector_index.create_index_sql("binary", 512)
+    assert "CONCURRENTLY" in ddl and "WHERE vector_dims(embedding) = 512" in ddl
+    assert "((binary_quantize(embedding))::bit(512)) bit_hamming_ops" in ddl
+    assert vector_index.drop_index_sql("halfvec", 512).endswith(vector_index.index_name("halfvec", 512))
+    with pytest.raises(ValueError):
+        vector_index.create_index_sql("pq", 512)
+
+    query = [0.1] * 512
+    where = [EmbeddingStore.collection_id == "c"]
+    sql = compile_sql(vector_index.candidate_query(EmbeddingStore, query, 10, where, mode="binary", rerank_factor=4))
+    assert "CAST(binary_quantize(langchain_pg_embedding.embedding) AS BIT(512)) <~>" in sql
+    assert "vector_dims(langchain_pg_embedding.embedding) = 512" in sql
+    # 内层按量化距离取 40 条，外层按全精度余弦距离重排
+    assert sql.count("LIMIT") == 2 and "candidates.embedding <=>" in sql
+
+    sql = compile_sql(vector_index.candidate_query(EmbeddingStore, query, 10, where, mode="halfvec"))
+    assert "CAST(langchain_pg_embedding.embedding AS HALFVEC(512)) <=>" in sql
+
+    sql = compile_sql(vector_index.candidate_query(EmbeddingStore, query, 10, where, mode="none"))
+    assert sql.count("LIMIT") == 1 and "vector_dims" not in sql
+
+
+def test_ef_search_covers_rerank_candidates(monkeypatch):
+    """ef_search 不小于内层取回的候选数，并受 pgvector 上限约束。"""
+    from config import settings
+
+    monkeypatch.setattr(settings.kb, "hnsw_ef_search", 200)
+    monkeypatch.setattr(settings.kb, "rerank_factor", 4)
+    assert vector_index.ef_search(100) == 400
+    assert vector_index.ef_search(10) == 200
+    assert vector_index.ef_search(500) == vector_index.MAX_EF_SEARCH
+    assert vector_index.session_settings(100)[0] == "SET LOCAL hnsw.ef_search = 400"
@@ -0,0 +1,32 @@
+import uuid
+from datetime import datetime, timezone
+
+from llm_usage.rollup import build_rollups, hour_bucket, hour_ceil
+
+
+def test_build_rollups_groups_by_hour():
+    """同一用户 / 模型 / 小时的明细合并为一个增量。"""
+    user_id = uuid.uuid4()
+    rows = [
+        {"user_id": user_id, "model_name": "m", "prompt_tokens": 1, "total_tokens": 3,
+         "created_at": datetime(2026, 1, 1, 8, 5, tzinfo=timezone.utc)},
+        {"user_id": user_id, "model_name": "m", "prompt_tokens": 2, "completion_tokens": 4,
+         "created_at": datetime(2026, 1, 1, 8, 55, tzinfo=timezone.utc)},
+        {"user_id": user_id, "model_name": "m", "total_tokens": 5,
+         "created_at": datetime(2026, 1, 1, 9, 0, tzinfo=timezone.utc)},
+    ]
+    rollups = sorted(build_rollups(rows), key=lambda r: r["bucket"])
+
+    assert [r["bucket"].hour for r in rollups] == [8, 9]
+    assert rollups[0]["request_count"] == 2
+    assert rollups[0]["prompt_tokens"] == 3
+    assert rollups[0]["completion_tokens"] == 4
+    assert rollups[0]["total_tokens"] == 3
+
+
+def test_hour_boundaries():
+    """时间取整到小时，无时区按 UTC。"""
+    dt = datetime(2026, 1, 1, 8, 30)
+    assert hour_bucket(dt) == datetime(2026, 1, 1, 8, tzinfo=timezone.utc)
+    assert hour_ceil(dt) == datetime(2026, 1, 1, 9)
+    assert hour_ceil(datetime(2026, 1, 1, 9)) == datetime(2026, 1, 1, 9)
@@ -0,0 +1,95 @@
+import uuid
+from contextlib import asynccontextmanager
+from unittest.mock import MagicMock
+
+from llm_usage.sink import UsageSink
+
+
+class _FakeSession:
+    def __init__(self, calls: list):
+        self.calls = calls
+        self.bind = type("Bind", (), {"dialect": type("Dialect", (), {"name": "postgresql"})()})()
+
+    async def execute(self, stmt):
+        params = stmt.compile().params
+        self.calls.append(params)
+        result = MagicMock()
+        result.scalars.return_value.all.return_value = [
+            value for key, value in params.items() if key.startswith("id_m")
+        ]
+        return result
+
+
+def _scope(calls: list):
+    @asynccontextmanager
+    async def scope():
+        yield _FakeSession(calls)
+
+    return scope
+
+
+def _row(request_id: str) -> dict:
+    return {"id": uuid.uuid4(), "user_id": "u1", "model_name": "m", "request_id": request_id, "total_tokens": 1}
+
+
+async def test_stop_drains_queue_in_one_batch():
+    """关闭时排空队列，按 request_id 去重后一次写入并累加预聚合。"""
+    calls: list = []
+    sink = UsageSink(batch_size=10, flush_interval=5, queue_size=10, session_scope=_scope(calls))
+    await sink.start()
+    assert sink.submit(_row("r1"))
+    assert sink.submit(_row("r1"))
+    assert sink.submit(_row("r2"))
+    await sink.stop()
+
+    insert_params, rollup_params = calls
+    assert rollup_params["request_count_m0"] == 2
+    assert sink.written == 2
+    assert not sink.running
+
+
+async def test_submit_overflows_when_queue_full():
+    """队列满时拒绝入队并计数 (由调用方直接写库)，未启动时不入队。"""
+    sink = UsageSink(batch_size=10, flush_interval=5, queue_size=1, session_scope=_scope([]))
+    assert sink.submit(_row("r0")) is False
+
+    await sink.start()
+    sink._task.cancel()
+    assert sink.submit(_row("r1"))
+    assert sink.submit(_row("r2")) is False
+    assert sink.overflow_inline == 1
+
+
+def _flaky_scope(calls: list, failures: list):
+    """按顺序消费 failures: True 表示本次写库失败"""
+    @asynccontextmanager
+    async def scope():
+        if failures and failures.pop(0):
+            raise ConnectionError("db down")
+        yield _FakeSession(calls)
+
+    return scope
+
+
+async def test_failed_flush_is_retried():
+    """写库失败后按退避重试整批，不丢记录。"""
+    calls: list = []
+    sink = UsageSink(
+        batch_size=10, flush_interval=5, queue_size=10, retry_backoff=0,
+        session_scope=_flaky_scope(calls, [True, True]),
+    )
+    await sink._flush_with_retry([_row("r1"), _row("r2")])
+    assert sink.written == 2
+    assert sink.dropped == 0
+
+
+async def test_flush_falls_back_to_single_records():
+    """重试用尽后逐条写入，只丢弃写不进的记录。"""
+    calls: list = []
+    sink = UsageSink(
+        batch_size=10, flush_interval=5, queue_size=10, flush_retries=1, retry_backoff=0,
+        session_scope=_flaky_scope(calls, [True, True, False, True]),
+    )
+    await sink._flush_with_retry([_row("r1"), _row("r2")])
+    assert sink.written == 1
+    assert sink.dropped == 1
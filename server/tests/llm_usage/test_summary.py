@@ -0,0 +1,63 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest_asyncio
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import auth.models  # noqa: F401  注册 users 表，llm_usage 外键依赖
+from llm_usage.models import LLMUsage, LLMUsageHourly
+from llm_usage.rollup import upsert_rollups
+from llm_usage.service import summary_usage
+
+
+USER_ID = uuid.uuid4()
+
+
+def _at(hour: int, minute: int) -> datetime:
+    return datetime(2026, 1, 1, hour, minute, tzinfo=timezone.utc)
+
+
+@pytest_asyncio.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(LLMUsage.__table__.create)
+        await conn.run_sync(LLMUsageHourly.__table__.create)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        # 每条明细的 total_tokens 取不同的 2 的幂，汇总值即可看出包含了哪些记录
+        rows = [
+            {
+                "id": uuid.uuid4(), "user_id": USER_ID, "model_name": "m",
+                "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": tokens,
+                "created_at": created_at, "meta": {},
+            }
+            for created_at, tokens in [
+                (_at(8, 1), 1), (_at(8, 10), 2), (_at(8, 45), 4), (_at(9, 30), 8),
+                (_at(10, 20), 16), (_at(10, 40), 32),
+            ]
+        ]
+        session.add_all(LLMUsage(**row) for row in rows)
+        await upsert_rollups(session, rows)
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+async def _total(db, start_at, end_at) -> int:
+    items = await summary_usage(db, USER_ID, start_at, end_at, None, "model")
+    return sum(item["total_tokens"] for item in items)
+
+
+async def test_partial_hours_at_both_ends(db):
+    """两端不足一小时的部分读明细，中间整小时读预聚合，边界小时不重复计算。"""
+    # 删除 9 点的明细：结果仍包含它，说明整小时来自预聚合
+    await db.execute(delete(LLMUsage).where(LLMUsage.total_tokens == 8))
+
+    assert await _total(db, _at(8, 5), _at(10, 30)) == 2 + 4 + 8 + 16
+
+
+async def test_range_under_one_hour(db):
+    """不足一小时的区间全部读明细，包括跨越整点的情况。"""
+    assert await _total(db, _at(8, 5), _at(8, 50)) == 2 + 4
+    assert await _total(db, _at(8, 40), _at(9, 35)) == 4 + 8
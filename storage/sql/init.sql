@@ -4,6 +4,7 @@
 -- 1) 该脚本会在容器首次初始化数据目录时自动执行
 -- 2) 负责创建 axiom_app / axiom_kb / axiom_agent 三个数据库，并初始化所需扩展
 -- 3) 设计为可重复执行（幂等）：扩展使用 IF NOT EXISTS
+-- 4) 创建 SQL Agent 使用的只读角色 axiom_readonly；表由迁移创建，迁移后重新执行本脚本授予 SELECT 权限
 -- =========================================================
 
 -- 1) 创建数据库（PostgreSQL 不支持 CREATE DATABASE IF NOT EXISTS，使用 \gexec 兼容写法）
@@ -30,4 +31,36 @@ CREATE EXTENSION IF NOT EXISTS pgcrypto;
 -- 4) 初始化 axiom_agent（Agent 数据库，需要 pgcrypto 扩展）
 \connect axiom_agent
 
-CREATE EXTENSION IF NOT EXISTS pgcrypto;
\ No newline at end of file
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- 5) SQL Agent 只读角色（server 配置 sql_agent.uri 使用该角色连接 axiom_app）
+--    默认口令仅用于开发，生产环境执行 ALTER ROLE axiom_readonly PASSWORD '...' 修改
+SELECT 'CREATE ROLE axiom_readonly LOGIN PASSWORD ''axiom_readonly'''
+WHERE NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'axiom_readonly')\gexec
+
+-- 会话默认只读事务（SQL Agent 连接层面另行强制只读事务）
+ALTER ROLE axiom_readonly SET default_transaction_read_only = on;
+
+\connect axiom_app
+
+GRANT CONNECT ON DATABASE axiom_app TO axiom_readonly;
+GRANT USAGE ON SCHEMA public TO axiom_readonly;
+
+-- 只授予列出的表的 SELECT 权限（不使用 ALL TABLES / DEFAULT PRIVILEGES，新表默认不可读，
+-- pg_stats 示例值也只对有 SELECT 权限的表可见）
+-- 表由 alembic 迁移创建，首次初始化时尚不存在（跳过），迁移后重新执行本脚本补齐授权
+-- alembic_version: 表结构缓存据此检测迁移版本
+-- 业务表: 与 server 配置 sql_agent.allowed_tables 保持一致；查询结果不按用户过滤，
+--         只应加入不含用户私有数据的表、按用户过滤的视图或启用 RLS 的表
+DO $$
+DECLARE
+    readonly_tables text[] := ARRAY['public.alembic_version'];
+    t text;
+BEGIN
+    FOREACH t IN ARRAY readonly_tables LOOP
+        IF to_regclass(t) IS NOT NULL THEN
+            EXECUTE format('GRANT SELECT ON %s TO axiom_readonly', to_regclass(t));
+        END IF;
+    END LOOP;
+END
+$$;
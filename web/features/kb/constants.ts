@@ -109,6 +109,12 @@ export function getStatusConfig(status: string): {
   className: string;
 } {
   switch (status) {
+    case 'uploading':
+      return { 
+        label: '上传中', 
+        variant: 'outline',
+        className: 'bg-gray-100 text-gray-800 dark:bg-gray-900 dark:text-gray-300'
+      };
     case 'processing':
       return { 
         label: '处理中', 
@@ -7,7 +7,7 @@
 
 export type KBVisibility = 'private' | 'public';
 
-export type DocumentStatus = 'processing' | 'indexed' | 'failed';
+export type DocumentStatus = 'uploading' | 'processing' | 'indexed' | 'failed';
 
 // ==================== 知识库相关 ====================
 
@@ -42,7 +42,8 @@ export interface KBDeleteRequest {
 
 export interface KBListResponse {
   items: KnowledgeBase[];
-  total: number;
+  total: number | null;
+  next_cursor?: string | null;
 }
 
 // ==================== 文档相关 ====================
@@ -79,7 +80,8 @@ export interface DocumentRetryRequest {
 
 export interface DocumentListResponse {
   items: KBDocument[];
-  total: number;
+  total: number | null;
+  next_cursor?: string | null;
 }
 
 // ==================== 检索相关 ====================